@@ -0,0 +1,161 @@
+"""
+Startup-time benchmark for the backend.
+
+Measures, in fresh interpreters per run:
+- import_s:        time to import main (and build the app + services)
+- first_request_s: latency of the first /api/extract-songs request on a cold
+                   server, which loads langchain and creates the LLM client
+- warmup_s:        time for POST /api/warmup, i.e. what the first real
+                   request would otherwise pay to load LLM clients and yt-dlp
+- warm_request_s:  latency of the same first request right after the warm-up
+
+The OpenAI API is replaced by a local stub server answering with a canned
+completion, so the numbers cover lazy initialization rather than network or
+model latency. Each interpreter runs in a temporary directory with its own
+state and downloads directories, so the backend's real library is never
+scanned or touched.
+
+Results are appended to benchmarks/startup_history.jsonl so regressions
+show up over time.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HISTORY_FILE = Path(__file__).resolve().parent / "startup_history.jsonl"
+
+METRICS = ("import_s", "first_request_s", "warmup_s", "warm_request_s")
+
+# Stub OpenAI server, started before anything is timed. The canned answer
+# names a song so extract-songs runs its whole parsing path.
+STUB_SNIPPET = """
+import http.server, json, os, threading
+
+COMPLETION = json.dumps({
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "gpt-4",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {
+        "role": "assistant",
+        "content": json.dumps({"intent": "download", "songs": [{"title": "Baby", "artist": "Justin Bieber"}], "suggestion": None})
+    }}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}).encode()
+
+class StubOpenAI(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+stub = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAI)
+threading.Thread(target=stub.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{stub.server_port}/v1"
+os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = base_url
+os.environ["OPENAI_API_KEY"] = "bench"
+"""
+
+RUN_SNIPPET = STUB_SNIPPET + """
+import sys, time
+warm = sys.argv[1] == "warm"
+
+start = time.perf_counter()
+import main
+import_s = time.perf_counter() - start
+
+from fastapi.testclient import TestClient
+client = TestClient(main.app)
+result = {"import_s": import_s}
+
+if warm:
+    start = time.perf_counter()
+    client.post("/api/warmup").raise_for_status()
+    result["warmup_s"] = time.perf_counter() - start
+
+start = time.perf_counter()
+client.post("/api/extract-songs", json={"query": "download Baby by Justin Bieber"}).raise_for_status()
+result["warm_request_s" if warm else "first_request_s"] = time.perf_counter() - start
+
+print(json.dumps(result))
+"""
+
+
+def run_once(mode: str) -> dict:
+    """Run one measurement in a fresh interpreter ("cold" or "warm")"""
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir:
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(BACKEND_DIR), os.getenv("PYTHONPATH")])),
+            # Relative to the temporary working directory, like downloads/
+            "COORDINATION_DIR": ".state",
+            # Timed explicitly in warm runs; must not race the cold request
+            "WARMUP_ON_STARTUP": "0",
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", RUN_SNIPPET, mode],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+    # The app prints progress lines; the measurement is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend cold start")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh-interpreter runs")
+    parser.add_argument("--no-record", action="store_true", help="Don't append to the history file")
+    args = parser.parse_args()
+
+    runs = [{**run_once("cold"), **run_once("warm")} for _ in range(args.runs)]
+    summary = {
+        metric: round(statistics.median(run[metric] for run in runs), 4)
+        for metric in METRICS
+    }
+
+    print(f"Median over {args.runs} run(s):")
+    for metric, value in summary.items():
+        print(f"  {metric:16} {value * 1000:9.1f} ms")
+
+    if not args.no_record:
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "runs": args.runs,
+            **summary,
+        }
+        with open(HISTORY_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Recorded in {HISTORY_FILE}")
+
+
+if __name__ == "__main__":
+    main()
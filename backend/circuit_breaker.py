@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Error-rate / latency circuit breaker for one download backend.
+
+    - closed:    calls go through; outcomes are kept in a sliding window
+    - open:      too many recent failures (or slow calls); calls are skipped
+                 until `open_seconds` have passed
+    - half_open: one trial (or a background probe) decides whether to close
+                 again or re-open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 300,
+        slow_call_seconds: float = 60
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)   # True = success
+        self._latency = None                     # EWMA of call latency, seconds
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def ready_for_trial(self) -> bool:
+        """True once an open circuit has waited out its open period"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds
+
+    def allow_request(self) -> bool:
+        """Whether a real call may go to this backend now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: let exactly one trial call through
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def start_probe(self) -> bool:
+        """Claim the half-open trial for a background probe"""
+        with self._lock:
+            if self.state != OPEN or time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        """Give up a claimed half-open trial without recording an outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self._opened_at = time.monotonic() - self.open_seconds
+                self._trial_in_flight = False
+
+    def record_success(self, latency: float):
+        if latency > self.slow_call_seconds:
+            self.record_failure(latency)
+            return
+        with self._lock:
+            self._observe_latency(latency)
+            self._outcomes.append(True)
+            if self.state == HALF_OPEN:
+                print(f"   ✅ Circuit '{self.name}' closed again")
+                self.state = CLOSED
+                self._outcomes.clear()
+                self._trial_in_flight = False
+
+    def record_failure(self, latency: Optional[float] = None):
+        with self._lock:
+            if latency is not None:
+                self._observe_latency(latency)
+            self._outcomes.append(False)
+
+            if self.state == HALF_OPEN:
+                self._open()
+            elif self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        print(f"   🔌 Circuit '{self.name}' opened for {self.open_seconds:.0f}s")
+
+    def _observe_latency(self, latency: float):
+        self._latency = latency if self._latency is None else 0.7 * self._latency + 0.3 * latency
+
+    def success_rate(self) -> float:
+        """Recent success rate; untried backends get the benefit of the doubt"""
+        with self._lock:
+            if not self._outcomes:
+                return 1.0
+            return self._outcomes.count(True) / len(self._outcomes)
+
+    def stats(self) -> dict:
+        rate = self.success_rate()
+        with self._lock:
+            return {
+                "state": self.state,
+                "success_rate": round(rate, 3),
+                "calls": len(self._outcomes),
+                "avg_latency": round(self._latency, 3) if self._latency is not None else None,
+            }
+
+
+class CircuitBreakerRegistry:
+    """
+    Breakers for every download backend, with fallback ordering by recent
+    success (behind the primary) and background half-open probes for
+    backends that have probes.
+    """
+
+    def __init__(self, open_seconds: Optional[float] = None, probe_interval: float = 30):
+        self.open_seconds = open_seconds or float(os.getenv("BREAKER_OPEN_SECONDS", "300"))
+        self.probe_interval = probe_interval
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._probes: Dict[str, Callable[[], bool]] = {}
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, open_seconds=self.open_seconds)
+            return self._breakers[name]
+
+    def register_probe(self, name: str, probe: Callable[[], bool]):
+        """
+        Health check for a backend. Open circuits with a probe are tested in
+        the background instead of spending a user's request on the trial.
+        """
+        self._probes[name] = probe
+        self.get(name)
+        with self._lock:
+            if self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+                self._prober.start()
+
+    def _available(self, name: str) -> bool:
+        breaker = self.get(name)
+        if name in self._probes and breaker.state != CLOSED:
+            return False  # the background prober decides when it's back
+        return breaker.state != OPEN or breaker.ready_for_trial()
+
+    def ordered(self, names: List[str]) -> List[str]:
+        """
+        Backends whose circuit allows a call. The first name is the primary
+        and stays first while its circuit isn't open: a few failures don't
+        make a fallback better. The fallbacks follow, best recent success
+        first; equal success rates go to the faster backend, then to the
+        given order.
+        """
+        primary, fallbacks = names[:1], names[1:]
+        candidates = []
+        for position, name in enumerate(fallbacks):
+            if not self._available(name):
+                continue
+            breaker = self.get(name)
+            latency = breaker.stats()["avg_latency"] or 0
+            candidates.append((-breaker.success_rate(), latency, position, name))
+        ranked = [name for *_, name in sorted(candidates)]
+        return [name for name in primary if self._available(name)] + ranked
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            for name, probe in list(self._probes.items()):
+                breaker = self.get(name)
+                if not breaker.start_probe():
+                    continue
+
+                start = time.monotonic()
+                try:
+                    healthy = probe()
+                except Exception:
+                    healthy = False
+                if healthy:
+                    breaker.record_success(time.monotonic() - start)
+                else:
+                    breaker.record_failure()
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
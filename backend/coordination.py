@@ -0,0 +1,523 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from deadline import Deadline, DeadlineExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Library changes kept in the log; a worker further behind rescans the library
+LIBRARY_CHANGE_LOG_SIZE = 10000
+
+# Longest wait between attempts to take a busy lock (seconds)
+LOCK_POLL_INTERVAL = 0.2
+
+
+class SharedStore:
+    """
+    Coordination state shared by every worker process on the host.
+
+    Backed by a SQLite database in WAL mode (many concurrent readers, one
+    writer at a time, safe across processes) plus a directory of lock files
+    for per-song download locks. Provides:
+    - a key/value cache with TTLs, namespaced (e.g. "resolve")
+    - a job registry for batch/stream jobs
+    - exclusive download locks keyed by song
+    - per-file access records and pins used by the storage manager
+    - per-item checkpoints for bulk playlist imports
+    - a queue of search/download tasks for download workers (see task_queue)
+    - a log of library files added and removed, so each worker's library
+      index and quota totals can follow changes without rescanning
+    """
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self.state_dir = Path(state_dir or os.getenv("COORDINATION_DIR", ".state"))
+        self.lock_dir = self.state_dir / "locks"
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.state_dir / "coordination.db"
+
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections aren't thread-safe"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT,
+                result TEXT,
+                owner_pid INTEGER,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+            CREATE TABLE IF NOT EXISTS file_access (
+                filename TEXT PRIMARY KEY,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS file_pins (
+                filename TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (filename, owner)
+            );
+            CREATE TABLE IF NOT EXISTS import_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                youtube_url TEXT,
+                file_path TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS task_queue (
+                task_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                cost REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                deadline_at REAL,
+                result TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS task_queue_next ON task_queue (status, priority, cost, created_at);
+            CREATE TABLE IF NOT EXISTS library_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                removed INTEGER NOT NULL,
+                changed_at REAL NOT NULL
+            );
+        """)
+
+    # --- Cache ---
+
+    def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+
+        if row is None:
+            return None
+        if row["expires_at"] is not None and row["expires_at"] < time.time():
+            self.cache_delete(namespace, key)
+            return None
+        return json.loads(row["value"])
+
+    def cache_set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a JSON-serializable value, optionally expiring after ttl seconds"""
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at)
+        )
+
+    def cache_update(self, namespace: str, key: str, update: Callable[[dict], Any]) -> Any:
+        """
+        Atomic read-modify-write of a dict entry, across all processes
+
+        `update` gets the current dict (empty if missing or expired), changes
+        it in place, and returns what cache_update should return. The entry
+        is written back, without a TTL, in the same write transaction.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+            expired = row is None or (row["expires_at"] is not None and row["expires_at"] < time.time())
+            value = {} if expired else json.loads(row["value"])
+            result = update(value)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, NULL)",
+                (namespace, key, json.dumps(value))
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def cache_delete(self, namespace: str, key: str):
+        self._connect().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        )
+
+    # --- Job registry ---
+
+    def register_job(self, job_id: str, kind: str, payload: Any = None, status: str = "running"):
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO jobs "
+            "(job_id, kind, status, payload, result, owner_pid, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+            (job_id, kind, status, json.dumps(payload), os.getpid(), now, now)
+        )
+
+    def update_job(self, job_id: str, status: Optional[str] = None, result: Any = None):
+        """Update a job's status and/or result (fields left as None are unchanged)"""
+        conn = self._connect()
+        if status is not None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (status, time.time(), job_id)
+            )
+        if result is not None:
+            conn.execute(
+                "UPDATE jobs SET result = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self._job_to_dict(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> list:
+        if status:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                (status, limit)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._job_to_dict(row) for row in rows]
+
+    @staticmethod
+    def _job_to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # --- File access / pins ---
+
+    def touch_file(self, filename: str):
+        """Record an access to a library file"""
+        self._connect().execute(
+            "INSERT INTO file_access (filename, last_access, hits) VALUES (?, ?, 1) "
+            "ON CONFLICT(filename) DO UPDATE SET last_access = excluded.last_access, hits = hits + 1",
+            (filename, time.time())
+        )
+
+    def file_access_times(self) -> dict:
+        """Map of filename -> last access time for every recorded file"""
+        rows = self._connect().execute("SELECT filename, last_access FROM file_access").fetchall()
+        return {row["filename"]: row["last_access"] for row in rows}
+
+    def forget_file(self, filename: str):
+        self._connect().execute("DELETE FROM file_access WHERE filename = ?", (filename,))
+
+    def pin_file(self, filename: str, owner: str, ttl: float = 3600):
+        """
+        Protect a file from eviction until the owner releases it. Pins expire
+        after ttl seconds so a crashed worker can't pin files forever.
+        """
+        self._connect().execute(
+            "INSERT OR REPLACE INTO file_pins (filename, owner, expires_at) VALUES (?, ?, ?)",
+            (filename, owner, time.time() + ttl)
+        )
+
+    def release_pins(self, owner: str):
+        self._connect().execute("DELETE FROM file_pins WHERE owner = ?", (owner,))
+
+    def pinned_files(self) -> set:
+        """Filenames with at least one unexpired pin"""
+        conn = self._connect()
+        conn.execute("DELETE FROM file_pins WHERE expires_at < ?", (time.time(),))
+        rows = conn.execute("SELECT DISTINCT filename FROM file_pins").fetchall()
+        return {row["filename"] for row in rows}
+
+    # --- Import checkpoints ---
+
+    def add_import_items(self, job_id: str, songs: list):
+        """Record every song of an import as pending, in order"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO import_items (job_id, idx, title, artist, status, updated_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(job_id, idx, song.title, song.artist, now) for idx, song in enumerate(songs)]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update_import_item(
+        self,
+        job_id: str,
+        idx: int,
+        status: str,
+        youtube_url: Optional[str] = None,
+        file_path: Optional[str] = None
+    ):
+        self._connect().execute(
+            "UPDATE import_items SET status = ?, youtube_url = COALESCE(?, youtube_url), "
+            "file_path = COALESCE(?, file_path), updated_at = ? WHERE job_id = ? AND idx = ?",
+            (status, youtube_url, file_path, time.time(), job_id, idx)
+        )
+
+    def import_items(self, job_id: str, statuses: Optional[list] = None) -> list:
+        """Items of an import in order, optionally only those with the given statuses"""
+        query = "SELECT * FROM import_items WHERE job_id = ?"
+        params = [job_id]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        rows = self._connect().execute(query + " ORDER BY idx", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_counts(self, job_id: str) -> dict:
+        """Map of item status -> count for one import"""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS n FROM import_items WHERE job_id = ? GROUP BY status",
+            (job_id,)
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    # --- Task queue ---
+
+    def enqueue_task(
+        self,
+        task_id: str,
+        kind: str,
+        payload: Any,
+        priority: int,
+        cost: float = 0.0,
+        deadline_at: Optional[float] = None
+    ):
+        """Queue a task for any worker; deadline_at is a wall-clock time"""
+        self._connect().execute(
+            "INSERT INTO task_queue (task_id, kind, payload, priority, cost, status, deadline_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (task_id, kind, json.dumps(payload), priority, cost, deadline_at, time.time())
+        )
+
+    def claim_task(self, worker: str, kinds: list, lease: float, max_attempts: int) -> Optional[dict]:
+        """
+        Take the most urgent queued task of the given kinds (priority, then
+        cost, then age) and lease it to a worker for `lease` seconds. Tasks
+        whose worker let the lease lapse are queued again, or failed once
+        they have been tried max_attempts times.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE task_queue SET status = 'done', result = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (json.dumps({"error": "Worker lost the task too many times"}), now, max_attempts)
+            )
+            conn.execute(
+                "UPDATE task_queue SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND lease_until < ?",
+                (now,)
+            )
+            row = conn.execute(
+                f"SELECT * FROM task_queue WHERE status = 'queued' AND kind IN ({', '.join('?' * len(kinds))}) "
+                "ORDER BY priority, cost, created_at LIMIT 1",
+                kinds
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE task_queue SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "lease_until = ? WHERE task_id = ?",
+                    (worker, now + lease, row["task_id"])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        return task
+
+    def renew_task(self, task_id: str, worker: str, lease: float) -> bool:
+        """Extend a running task's lease; False if the worker no longer holds it"""
+        cursor = self._connect().execute(
+            "UPDATE task_queue SET lease_until = ? WHERE task_id = ? AND worker = ? AND status = 'running'",
+            (time.time() + lease, task_id, worker)
+        )
+        return cursor.rowcount > 0
+
+    def finish_task(self, task_id: str, worker: str, result: Any):
+        """Record a task's result (ignored if its lease was lost to another worker)"""
+        self._connect().execute(
+            "UPDATE task_queue SET status = 'done', result = ? "
+            "WHERE task_id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result), task_id, worker)
+        )
+
+    def release_task(self, task_id: str, worker: str):
+        """Hand a claimed task back to the queue, e.g. when a worker shuts down"""
+        self._connect().execute(
+            "UPDATE task_queue SET status = 'queued', worker = NULL, attempts = attempts - 1 "
+            "WHERE task_id = ? AND worker = ? AND status = 'running'",
+            (task_id, worker)
+        )
+
+    def task_result(self, task_id: str) -> tuple:
+        """(status, result); status is None once the task is gone"""
+        row = self._connect().execute(
+            "SELECT status, result FROM task_queue WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        return row["status"], json.loads(row["result"]) if row["result"] else None
+
+    def cancel_task(self, task_id: str) -> bool:
+        """Drop a task that no worker has claimed yet"""
+        cursor = self._connect().execute(
+            "DELETE FROM task_queue WHERE task_id = ? AND status = 'queued'", (task_id,)
+        )
+        return cursor.rowcount > 0
+
+    def delete_task(self, task_id: str):
+        self._connect().execute("DELETE FROM task_queue WHERE task_id = ?", (task_id,))
+
+    def task_counts(self) -> dict:
+        """Map of task status -> count"""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS n FROM task_queue GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    # --- Library change log ---
+
+    def record_library_change(self, filename: str, removed: bool = False):
+        """Log a library file added (or replaced, or moved) or removed"""
+        conn = self._connect()
+        seq = conn.execute(
+            "INSERT INTO library_changes (filename, removed, changed_at) VALUES (?, ?, ?)",
+            (filename, int(removed), time.time())
+        ).lastrowid
+        conn.execute("DELETE FROM library_changes WHERE seq <= ?", (seq - LIBRARY_CHANGE_LOG_SIZE,))
+
+    def library_change_seq(self) -> int:
+        """Sequence number of the latest library change (0 if none yet)"""
+        row = self._connect().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'library_changes'"
+        ).fetchone()
+        return row["seq"] if row else 0
+
+    def library_changes(self, after: int) -> Optional[list]:
+        """
+        Library changes logged after sequence number `after`, oldest first
+
+        Returns:
+            Dicts with seq, filename and removed; None if some of those
+            changes have already been pruned (the caller must rescan)
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT seq, filename, removed FROM library_changes WHERE seq > ? ORDER BY seq",
+            (after,)
+        ).fetchall()
+        if rows and rows[0]["seq"] > after + 1:
+            return None
+        if not rows and self.library_change_seq() > after:
+            return None
+        return [
+            {"seq": row["seq"], "filename": row["filename"], "removed": bool(row["removed"])}
+            for row in rows
+        ]
+
+    # --- Download locks ---
+
+    @contextmanager
+    def download_lock(self, key: str, deadline: Optional[Deadline] = None):
+        """
+        Exclusive cross-process lock for one song, so two workers never
+        download into the same file at the same time (also used for other
+        one-at-a-time work, e.g. "import:{job_id}"). Waits until acquired or
+        the deadline runs out (no deadline: waits as long as it takes).
+
+        Raises:
+            DeadlineExceeded: if the lock is still held elsewhere when the
+                deadline runs out
+        """
+        deadline = deadline or Deadline()
+        digest = hashlib.sha1(key.lower().encode("utf-8")).hexdigest()
+        lock_path = self.lock_dir / f"{digest}.lock"
+
+        with open(lock_path, "a+b") as lock_file:
+            delay = 0.01
+            while not self._try_lock(lock_file):
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceeded(f"Deadline exceeded waiting for lock {key}")
+                time.sleep(min(delay, remaining) if remaining is not None else delay)
+                delay = min(delay * 2, LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _try_lock(lock_file) -> bool:
+        """Take an exclusive lock on the file without waiting; False if it's held"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
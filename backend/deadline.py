@@ -0,0 +1,63 @@
+import os
+import time
+from typing import Optional
+
+# Upper bound on any request's time budget (seconds); 0 disables the default
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "600"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's time budget has run out"""
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request must finish.
+
+    One deadline is created per request and handed down through every stage
+    (extraction, search query, YouTube search, download); each stage asks for
+    the remaining budget instead of using its own fixed timeout, so the
+    request as a whole can never run past it. A Deadline with no budget
+    never expires.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    @classmethod
+    def for_request(cls, requested: Optional[float] = None) -> "Deadline":
+        """
+        Deadline for an incoming request: the client's budget, capped by
+        REQUEST_DEADLINE_SECONDS
+        """
+        budget = REQUEST_DEADLINE_SECONDS or None
+        if requested and requested > 0:
+            budget = min(requested, budget) if budget else requested
+        return cls(budget)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None if unbounded"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self, stage: str = "request"):
+        """Raise DeadlineExceeded if the budget has run out"""
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded during {stage}")
+
+    def timeout(self, cap: Optional[float] = None, stage: str = "request") -> Optional[float]:
+        """
+        Timeout to give one blocking call: the remaining budget, no more than
+        cap. None means "no limit" (unbounded deadline and no cap).
+        """
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(remaining, cap)
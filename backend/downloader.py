@@ -1,43 +1,434 @@
+import hashlib
 import os
-import requests
 import time
-import yt_dlp
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+
+from circuit_breaker import CircuitBreakerRegistry
+from coordination import SharedStore
+from deadline import Deadline, DeadlineExceeded
+from rate_limiter import youtube_rate_limiter
+from singleflight import SingleFlight
+from ytdlp_pool import ytdlp_pool
+
+AUDIO_EXTENSIONS = ['.m4a', '.webm', '.opus', '.ogg', '.mp4', '.mp3']
+
+# Web conversion APIs used as fallbacks for yt-dlp
+WEB_APIS = {
+    "vevioz": "https://api.vevioz.com/api/button/mp3/{video_id}",
+    "yt1s": "https://www.yt1s.com/api/ajaxSearch/mp3/{video_id}",
+}
+
+WEB_API_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+# Video the health probes ask a failing web API to convert (short and
+# long-lived: "Me at the zoo")
+PROBE_VIDEO_ID = os.getenv("PROBE_VIDEO_ID", "jNQXAC9IVRw")
+
+# All download backends: the primary (yt-dlp) first, then the fallbacks
+DOWNLOAD_BACKENDS = ["ytdlp", *WEB_APIS]
+
+# Longest video (seconds) that will be downloaded; 0 disables the limit
+MAX_SONG_DURATION = int(os.getenv("MAX_SONG_DURATION", "1200"))
+
+# Assumed length of a song whose duration is unknown when planning a batch
+TYPICAL_SONG_DURATION = 240
+
+
+# Audio quality profiles -> yt-dlp format selectors, each with a bitrate
+# ceiling (kbps) and a fallback for videos with no format under it ("best"
+# has no ceiling: plain bestaudio, whatever the container)
+QUALITY_PROFILES = {
+    "preview": "bestaudio[abr<=64][ext=m4a]/bestaudio[abr<=64]/worstaudio[ext=m4a]/worstaudio",
+    "standard": "bestaudio[abr<=160][ext=m4a]/bestaudio[abr<=160]/bestaudio[ext=m4a]/bestaudio",
+    "best": "bestaudio",
+}
+
+# Profile used when a request doesn't pick one
+DEFAULT_QUALITY = os.getenv("DEFAULT_QUALITY", "standard")
+
+# Profile of files named plainly "Artist - Title.ext" (the whole library from
+# before profiles existed); other profiles add a " [profile]" suffix
+PLAIN_QUALITY = "standard"
+
+# Hex digits of a song id's hash naming its shard directory under downloads/
+# (2 -> 256 shards, a few hundred files each at 100k files)
+SHARD_WIDTH = 2
+
+
+def _download_link(data: dict) -> Optional[str]:
+    """The download URL in a web API's JSON answer, under any of its names"""
+    return data.get('dlink') or data.get('url') or data.get('download_url')
+
+
+def quality_of(filename: str) -> str:
+    """Quality profile of a library file, from its name"""
+    stem = Path(filename).stem
+    for quality in QUALITY_PROFILES:
+        if quality != PLAIN_QUALITY and stem.endswith(f" [{quality}]"):
+            return quality
+    return PLAIN_QUALITY
+
+
+def is_too_long(duration: Optional[float]) -> bool:
+    """True if a known duration is over MAX_SONG_DURATION"""
+    return bool(MAX_SONG_DURATION and duration and duration > MAX_SONG_DURATION)
+
+
+def song_id(filename: str) -> str:
+    """
+    Canonical id of the song a library file holds: its normalized
+    "artist - title", without extension or quality suffix, so every quality
+    variant of a song shares an id (and a shard)
+    """
+    name = Path(filename).name
+    # Only strip a real audio extension: "Artist - Title [best]" has none
+    stem = Path(name).stem if Path(name).suffix.lower() in AUDIO_EXTENSIONS else name
+    quality = quality_of(stem + ".m4a")
+    if quality != PLAIN_QUALITY:
+        stem = stem[:-len(f" [{quality}]")]
+    return " ".join(stem.lower().split())
+
+
+def shard_of(filename: str) -> str:
+    """Shard directory name of a library file"""
+    return hashlib.sha1(song_id(filename).encode("utf-8")).hexdigest()[:SHARD_WIDTH]
+
+
+def library_path(root: Path, filename: str, create: bool = False) -> Path:
+    """
+    Where a library file lives in the sharded layout, found from its name
+    alone (no directory scan)
+    
+    Args:
+        root: Library root (the downloads directory)
+        filename: File name (or a stem, for an output template)
+        create: Create the shard directory
+    """
+    shard = Path(root) / shard_of(filename)
+    if create:
+        shard.mkdir(parents=True, exist_ok=True)
+    return shard / Path(filename).name
+
+
+def locate(root: Path, filename: str) -> Optional[Path]:
+    """
+    Existing path of a library file: its shard, else the flat layout of a
+    library that hasn't been migrated yet. At most two stats.
+    """
+    for path in (library_path(root, filename), Path(root) / Path(filename).name):
+        if path.is_file():
+            return path
+    return None
+
+
+def iter_library(root: Path) -> Iterator[Path]:
+    """
+    Every audio file in the library, sharded or flat. Walks the whole tree,
+    so it's for background work (indexing, quotas, fingerprints), not requests.
+    """
+    root = Path(root)
+    if not root.exists():
+        return
+    for entry in root.iterdir():
+        if entry.is_dir() and len(entry.name) == SHARD_WIDTH:
+            for f in entry.iterdir():
+                if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS:
+                    yield f
+        elif entry.is_file() and entry.suffix.lower() in AUDIO_EXTENSIONS:
+            yield entry
+
+
+def library_changed(store: Optional[SharedStore], filename: str, removed: bool = False):
+    """
+    Log a library file added (or replaced, or moved) or removed, so every
+    worker's library index and quota totals apply just that change. Without
+    a shared store there is nobody to tell.
+    """
+    if store is not None:
+        store.record_library_change(filename, removed)
+
+
+# Downloads in progress in this process (file stem -> .part path), when
+# there's no shared store to record them in
+_local_partials = {}
+
+# Shared stores by state directory, opened once per process (yt-dlp workers
+# open their own to record .part files)
+_stores = {}
+
+
+def _set_partial(state_dir: Optional[str], stem: str, part_path: str):
+    if state_dir is None:
+        _local_partials[stem] = part_path
+        return
+    if state_dir not in _stores:
+        _stores[state_dir] = SharedStore(state_dir)
+    # Expires on its own if this worker dies mid-download
+    _stores[state_dir].cache_set("partial", stem, part_path, ttl=3600)
+
+
+def _clear_partial(state_dir: Optional[str], stem: str):
+    if state_dir is None:
+        _local_partials.pop(stem, None)
+    elif state_dir in _stores:
+        _stores[state_dir].cache_delete("partial", stem)
+
+
+def fetch_audio(
+    youtube_url: str,
+    output_template: str,
+    quality: str,
+    time_left: Optional[float],
+    state_dir: Optional[str] = None
+) -> dict:
+    """
+    Run one yt-dlp audio download to output_template (plus the extension).
+    Module-level so it can run in a yt-dlp worker process; it returns only
+    what the caller needs, never yt-dlp's full info dict.
+    
+    Args:
+        youtube_url: Video to fetch
+        output_template: Library path of the file, without extension
+        quality: Quality profile name
+        time_left: Seconds left of the request's budget (None for no limit)
+        state_dir: Shared store directory to record the .part file in while
+            downloading (None: recorded in this process only)
+    
+    Returns:
+        Dict with too_long, title, duration, file_path (None if yt-dlp
+        didn't report it) and elapsed (seconds spent in yt-dlp)
+    
+    Raises:
+        DeadlineExceeded: if the budget ran out mid-transfer
+    """
+    import yt_dlp
+    
+    deadline = Deadline(time_left)
+    stem = Path(output_template).name
+    
+    # yt-dlp knows the real duration before fetching any audio
+    rejected = []
+    
+    def duration_filter(info, *, incomplete=False):
+        if is_too_long(info.get('duration')):
+            rejected.append(info['duration'])
+            return f"longer than {MAX_SONG_DURATION}s"
+        return None
+    
+    registered = []
+    
+    def track_progress(progress):
+        # Abort mid-transfer once the request's deadline has passed
+        deadline.check("download")
+        # Let players follow the file while it is still being written
+        if progress['status'] == 'downloading' and not registered and progress.get('tmpfilename'):
+            registered.append(progress['tmpfilename'])
+            _set_partial(state_dir, stem, progress['tmpfilename'])
+    
+    # First, try WITHOUT any post-processing (no FFmpeg needed)
+    ydl_opts = {
+        'format': QUALITY_PROFILES[quality],  # Prefer m4a under the profile's bitrate ceiling
+        'outtmpl': output_template + '.%(ext)s',
+        'quiet': False,
+        'no_warnings': False,
+        'progress_hooks': [track_progress],
+        'match_filter': duration_filter,
+    }
+    socket_timeout = deadline.timeout(stage="download")
+    if socket_timeout is not None:
+        ydl_opts['socket_timeout'] = socket_timeout
+    
+    start = time.monotonic()
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=True)
+    finally:
+        if registered:
+            _clear_partial(state_dir, stem)
+    elapsed = time.monotonic() - start
+    
+    if rejected:
+        return {'too_long': True, 'duration': rejected[0], 'title': None, 'file_path': None, 'elapsed': elapsed}
+    
+    requested = (info or {}).get('requested_downloads') or [{}]
+    return {
+        'too_long': False,
+        'title': (info or {}).get('title'),
+        'duration': (info or {}).get('duration'),
+        'file_path': requested[0].get('filepath'),
+        'elapsed': elapsed
+    }
 
 
 class MP3Downloader:
     """Service to download YouTube videos as MP3 - tries multiple methods"""
     
-    def __init__(self, download_path: str = "downloads"):
+    def __init__(self, download_path: str = "downloads", store: Optional[SharedStore] = None):
         self.download_path = Path(download_path)
         self.download_path.mkdir(exist_ok=True)
+        self.store = store
+        self._flights = SingleFlight()
+        if store:
+            # In-process downloads record their .part files through this same store
+            _stores.setdefault(str(store.state_dir), store)
+        
+        # Per-backend health: failing backends are skipped instead of
+        # costing every song their full timeouts
+        self.breakers = CircuitBreakerRegistry()
+        for name, api_url in WEB_APIS.items():
+            self.breakers.register_probe(name, self._make_probe(api_url))
     
-    def download_as_mp3(self, youtube_url: str, song_title: str, artist: str) -> dict:
+    def download_as_mp3(
+        self,
+        youtube_url: str,
+        song_title: str,
+        artist: str,
+        deadline: Optional[Deadline] = None,
+        quality: Optional[str] = None
+    ) -> dict:
         """
         Download YouTube video as MP3 - tries web API first, then yt-dlp
         
+        Concurrent calls for the same video in this process share one
+        download. When a shared store is configured, the download also runs
+        under a per-song lock so concurrent workers never write the same file;
+        a worker that waited on the lock reuses the file the other one produced.
+        
         Args:
             youtube_url: YouTube video URL
             song_title: Song title for filename
             artist: Artist name for filename
+            deadline: Request deadline; every network call is given only what
+                is left of it, and a download still running when it expires
+                is cancelled
+            quality: Quality profile (see QUALITY_PROFILES); each profile
+                is stored as its own file
             
         Returns:
-            Dictionary with status and file path
+            Dictionary with status and file path ('timed_out' is set when
+            the deadline ran out)
         """
-        print(f"\n🎵 Starting download: {song_title} by {artist}")
+        quality = quality or DEFAULT_QUALITY
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown quality profile: {quality}")
+        
+        deadline = deadline or Deadline()
+        key = f"{self._extract_video_id(youtube_url) or youtube_url}:{quality}"
+        # A download cut short by another caller's deadline is retried by
+        # callers whose own deadline still has time left
+        result = self._flights.do(
+            key, self._download_locked, youtube_url, song_title, artist, deadline, quality,
+            rerun=lambda outcome: isinstance(outcome, dict) and outcome.get('timed_out') and not deadline.expired
+        )
+        # Callers annotate the result dict, so each one gets its own copy
+        return dict(result)
+    
+    def _download_locked(
+        self,
+        youtube_url: str,
+        song_title: str,
+        artist: str,
+        deadline: Deadline,
+        quality: str
+    ) -> dict:
+        """Download under the per-song lock, reusing an existing file"""
+        safe_filename = self.variant_name(artist, song_title, quality)
+        lock = self.store.download_lock(safe_filename, deadline) if self.store else nullcontext()
+        
+        try:
+            with lock:
+                existing = self.find_existing(safe_filename)
+                if existing:
+                    print(f"\n📂 Already downloaded: {existing}")
+                    return {
+                        'success': True,
+                        'file_path': str(existing),
+                        'title': song_title,
+                        'duration': 0
+                    }
+                
+                return self._download(youtube_url, song_title, artist, deadline, quality)
+        except DeadlineExceeded:
+            # Mostly: another worker was still downloading it
+            print(f"   ⏱️ Deadline reached downloading {safe_filename}")
+            return {
+                'success': False,
+                'error': 'Deadline exceeded',
+                'file_path': None,
+                'timed_out': True
+            }
+    
+    def find_existing(self, safe_filename: str) -> Optional[Path]:
+        """Return an already-downloaded audio file for this song, if any"""
+        for ext in AUDIO_EXTENSIONS:
+            path = locate(self.download_path, f"{safe_filename}{ext}")
+            if path:
+                return path
+        
+        # The song may have been merged into an identical recording
+        if self.store:
+            alias = self.store.cache_get("alias", safe_filename)
+            if alias:
+                return locate(self.download_path, alias)
+        return None
+    
+    def _download(
+        self,
+        youtube_url: str,
+        song_title: str,
+        artist: str,
+        deadline: Deadline,
+        quality: str
+    ) -> dict:
+        """Try each download method in turn"""
+        print(f"\n🎵 Starting download: {song_title} by {artist} ({quality})")
         print(f"   URL: {youtube_url}")
         
-        # Method 1: Try using yt-dlp to download audio directly (no conversion needed)
-        result = self._download_with_ytdlp_audio_only(youtube_url, song_title, artist)
-        if result['success']:
-            return result
+        # yt-dlp first (no conversion needed) unless its circuit is open, then
+        # the web APIs that aren't open, by recent success
+        backends = self.breakers.ordered(DOWNLOAD_BACKENDS)
+        for attempt, backend in enumerate(backends):
+            if deadline.expired:
+                break
+            breaker = self.breakers.get(backend)
+            if not breaker.allow_request():
+                continue
+            if attempt > 0:
+                print("   ⚠️ Trying alternative download method...")
+            
+            start = time.monotonic()
+            if backend == "ytdlp":
+                result = self._download_with_ytdlp_audio_only(youtube_url, song_title, artist, deadline, quality)
+            else:
+                result = self._download_with_web_api(backend, youtube_url, song_title, artist, deadline, quality)
+            # yt-dlp reports the call's own time: waiting on the rate limiter
+            # or the worker pool is our backoff, not the backend being slow
+            latency = result['latency'] if 'latency' in result else time.monotonic() - start
+            
+            if result['success'] or result.get('too_long'):
+                # Refusing an over-long video is the backend working correctly
+                breaker.record_success(latency)
+                if result['success']:
+                    library_changed(self.store, Path(result['file_path']).name)
+                return result
+            if deadline.expired:
+                # Cut short by our own budget; not the backend's fault
+                breaker.release_trial()
+                break
+            breaker.record_failure(latency)
         
-        # Method 2: Try web API (y2mate or similar)
-        print("   ⚠️ Trying alternative download method...")
-        result = self._download_with_web_api(youtube_url, song_title, artist)
-        if result['success']:
-            return result
+        if deadline.expired:
+            print(f"   ⏱️ Deadline reached, giving up on {song_title}")
+            return {
+                'success': False,
+                'error': 'Deadline exceeded',
+                'file_path': None,
+                'timed_out': True
+            }
         
         # All methods failed
         return {
@@ -46,61 +437,92 @@ class MP3Downloader:
             'file_path': None
         }
     
-    def _download_with_ytdlp_audio_only(self, youtube_url: str, song_title: str, artist: str) -> dict:
+    def _download_with_ytdlp_audio_only(
+        self,
+        youtube_url: str,
+        song_title: str,
+        artist: str,
+        deadline: Deadline,
+        quality: str = PLAIN_QUALITY
+    ) -> dict:
         """
         Download using yt-dlp - downloads best audio format directly (m4a, opus, etc)
         No conversion needed, so no FFmpeg required!
+        
+        The transfer itself runs in a yt-dlp worker process when the pool is
+        enabled (see ytdlp_pool); pacing and the result checks stay here.
         """
+        safe_filename = self.variant_name(artist, song_title, quality)
+        state_dir = str(self.store.state_dir) if self.store else None
+        # Length of the last attempt, for when it fails (None: never started)
+        attempt = {'latency': None}
+        
         try:
-            safe_filename = self._sanitize_filename(f"{artist} - {song_title}")
-            output_template = str(self.download_path / safe_filename)
-            
-            # First, try WITHOUT any post-processing (no FFmpeg needed)
-            ydl_opts = {
-                'format': 'bestaudio[ext=m4a]/bestaudio',  # Prefer m4a, fallback to best audio
-                'outtmpl': output_template + '.%(ext)s',
-                'quiet': False,
-                'no_warnings': False,
-            }
+            output_template = str(library_path(self.download_path, safe_filename, create=True))
+            
+            def fetch():
+                start = time.monotonic()
+                try:
+                    # Read the budget per attempt, so a throttled retry gets only what's left
+                    return ytdlp_pool.run(
+                        fetch_audio, youtube_url, output_template, quality, deadline.remaining(), state_dir
+                    )
+                finally:
+                    attempt['latency'] = time.monotonic() - start
             
             print("   ⬇️ Downloading audio (no conversion)...")
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=True)
-                
-                # Find the downloaded file
-                possible_extensions = ['.m4a', '.webm', '.opus', '.ogg', '.mp4']
+            # Paced by the shared YouTube limiter; retried if throttled
+            fetched = youtube_rate_limiter.call(fetch, timeout=deadline.remaining())
+            
+            if fetched['too_long']:
+                print(f"   ⏭️ Skipped: {fetched['duration']:.0f}s is over the {MAX_SONG_DURATION}s limit")
+                return {
+                    'success': False,
+                    'error': f'Longer than {MAX_SONG_DURATION}s',
+                    'file_path': None,
+                    'too_long': True,
+                    'latency': fetched['elapsed']
+                }
+            
+            # Find the downloaded file (yt-dlp usually says where it is)
+            final_path = fetched['file_path']
+            if not (final_path and Path(final_path).exists()):
                 final_path = None
+                possible_extensions = ['.m4a', '.webm', '.opus', '.ogg', '.mp4']
                 
                 for ext in possible_extensions:
                     test_path = Path(output_template + ext)
                     if test_path.exists():
                         final_path = str(test_path)
                         break
+            
+            # If still not found, search for any file with the base name
+            if not final_path:
+                # (not glob: "[preview]" in a name would read as a pattern)
+                for file in Path(output_template).parent.iterdir():
+                    if (file.name.startswith(safe_filename) and file.suffix in AUDIO_EXTENSIONS
+                            and quality_of(file.name) == quality):
+                        final_path = str(file)
+                        break
+            
+            if final_path:
+                file_size = Path(final_path).stat().st_size / (1024 * 1024)
+                file_ext = Path(final_path).suffix
+                print("   ✅ Downloaded successfully!")
+                print(f"   📁 Format: {file_ext.upper()} audio")
+                print(f"   💾 Size: {file_size:.2f} MB")
+                print(f"   📂 Location: {final_path}")
                 
-                # If still not found, search for any file with the base name
-                if not final_path:
-                    for file in self.download_path.glob(f"{safe_filename}*"):
-                        if file.suffix in ['.m4a', '.webm', '.opus', '.ogg', '.mp4', '.mp3']:
-                            final_path = str(file)
-                            break
-                
-                if final_path:
-                    file_size = Path(final_path).stat().st_size / (1024 * 1024)
-                    file_ext = Path(final_path).suffix
-                    print(f"   ✅ Downloaded successfully!")
-                    print(f"   📁 Format: {file_ext.upper()} audio")
-                    print(f"   💾 Size: {file_size:.2f} MB")
-                    print(f"   📂 Location: {final_path}")
-                    
-                    return {
-                        'success': True,
-                        'file_path': final_path,
-                        'title': info.get('title', song_title),
-                        'duration': info.get('duration', 0)
-                    }
-                else:
-                    raise Exception("Download completed but file not found")
+                return {
+                    'success': True,
+                    'file_path': final_path,
+                    'title': fetched['title'] or song_title,
+                    'duration': fetched['duration'] or 0,
+                    'latency': fetched['elapsed']
+                }
+            else:
+                raise Exception("Download completed but file not found")
                 
         except Exception as e:
             error_msg = str(e)
@@ -112,66 +534,104 @@ class MP3Downloader:
             return {
                 'success': False,
                 'error': str(e),
-                'file_path': None
+                'file_path': None,
+                'latency': attempt['latency']
             }
     
-    def _download_with_web_api(self, youtube_url: str, song_title: str, artist: str) -> dict:
+    def partial_download(self, stem: str) -> Optional[Path]:
+        """The .part file of a download of this song still in progress, if any"""
+        part_path = self.store.cache_get("partial", stem) if self.store else _local_partials.get(stem)
+        return Path(part_path) if part_path else None
+    
+    def _download_with_web_api(
+        self,
+        api_name: str,
+        youtube_url: str,
+        song_title: str,
+        artist: str,
+        deadline: Deadline,
+        quality: str = PLAIN_QUALITY
+    ) -> dict:
         """
-        Download using web conversion API as fallback
+        Download using a web conversion API as fallback (the API picks the
+        bitrate, so quality profiles only affect the file name)
         """
+        import requests
+        
         try:
             # Extract video ID
             video_id = self._extract_video_id(youtube_url)
             if not video_id:
                 return {'success': False, 'error': 'Invalid URL', 'file_path': None}
             
-            # Try multiple APIs
-            apis = [
-                f"https://api.vevioz.com/api/button/mp3/{video_id}",
-                f"https://www.yt1s.com/api/ajaxSearch/mp3/{video_id}",
-            ]
+            api_url = WEB_APIS[api_name].format(video_id=video_id)
             
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
+            headers = WEB_API_HEADERS
             
-            for api_url in apis:
-                try:
-                    print(f"   📡 Trying API: {api_url[:50]}...")
-                    response = requests.get(api_url, headers=headers, timeout=15)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        download_url = data.get('dlink') or data.get('url') or data.get('download_url')
+            print(f"   📡 Trying API: {api_url[:50]}...")
+            response = requests.get(
+                api_url, headers=headers, timeout=deadline.timeout(cap=15, stage="download")
+            )
+            
+            if response.status_code == 200:
+                download_url = _download_link(response.json())
+                
+                if download_url:
+                    # Download the file
+                    mp3_response = requests.get(
+                        download_url, headers=headers,
+                        timeout=deadline.timeout(cap=60, stage="download")
+                    )
+                    if mp3_response.status_code == 200:
+                        safe_filename = self.variant_name(artist, song_title, quality)
+                        file_path = library_path(self.download_path, f"{safe_filename}.mp3", create=True)
+                        
+                        with open(file_path, 'wb') as f:
+                            f.write(mp3_response.content)
                         
-                        if download_url:
-                            # Download the file
-                            mp3_response = requests.get(download_url, headers=headers, timeout=60)
-                            if mp3_response.status_code == 200:
-                                safe_filename = self._sanitize_filename(f"{artist} - {song_title}")
-                                file_path = self.download_path / f"{safe_filename}.mp3"
-                                
-                                with open(file_path, 'wb') as f:
-                                    f.write(mp3_response.content)
-                                
-                                file_size = file_path.stat().st_size / (1024 * 1024)
-                                print(f"   ✅ Downloaded via API! Size: {file_size:.2f} MB")
-                                
-                                return {
-                                    'success': True,
-                                    'file_path': str(file_path),
-                                    'title': song_title,
-                                    'duration': 0
-                                }
-                except Exception as e:
-                    print(f"   ⚠️ API failed: {e}")
-                    continue
-            
-            return {'success': False, 'error': 'All APIs failed', 'file_path': None}
+                        file_size = file_path.stat().st_size / (1024 * 1024)
+                        print(f"   ✅ Downloaded via API! Size: {file_size:.2f} MB")
+                        
+                        return {
+                            'success': True,
+                            'file_path': str(file_path),
+                            'title': song_title,
+                            'duration': 0
+                        }
+            
+            return {'success': False, 'error': f'{api_name} API failed', 'file_path': None}
             
         except Exception as e:
+            print(f"   ⚠️ API failed: {e}")
             return {'success': False, 'error': str(e), 'file_path': None}
     
+    @staticmethod
+    def _make_probe(api_url: str):
+        """
+        Health check for a web API: does the conversion endpoint itself still
+        hand out a download link (for PROBE_VIDEO_ID)? A site whose front page
+        loads while its API is broken must stay open.
+        """
+        probe_url = api_url.format(video_id=PROBE_VIDEO_ID)
+        
+        def probe() -> bool:
+            import requests
+            response = requests.get(probe_url, headers=WEB_API_HEADERS, timeout=10)
+            if response.status_code != 200:
+                return False
+            try:
+                return bool(_download_link(response.json()))
+            except ValueError:
+                return False
+        
+        return probe
+    
+    @staticmethod
+    def warm_up():
+        """Import the download libraries ahead of the first download"""
+        import requests  # noqa: F401
+        import yt_dlp  # noqa: F401
+    
     def _extract_video_id(self, youtube_url: str) -> Optional[str]:
         """Extract video ID from YouTube URL"""
         import re
@@ -189,6 +649,11 @@ class MP3Downloader:
         
         return None
     
+    def variant_name(self, artist: str, song_title: str, quality: str) -> str:
+        """File name (without extension) of one quality variant of a song"""
+        safe_filename = self._sanitize_filename(f"{artist} - {song_title}")
+        return safe_filename if quality == PLAIN_QUALITY else f"{safe_filename} [{quality}]"
+    
     @staticmethod
     def _sanitize_filename(filename: str) -> str:
         """Remove invalid characters from filename"""
@@ -197,38 +662,75 @@ class MP3Downloader:
             filename = filename.replace(char, '')
         return filename.strip()
     
-    def download_batch(self, songs_data: list) -> list:
+    def download_batch(
+        self,
+        songs_data: list,
+        deadline: Optional[Deadline] = None,
+        quality: Optional[str] = None
+    ) -> list:
         """
-        Download multiple songs
+        Download multiple songs, shortest first
+        
+        Songs are ordered by their known duration (the search result's
+        length, a proxy for audio bytes) so one long track doesn't delay
+        every short one, and songs over MAX_SONG_DURATION are rejected
+        without being fetched.
         
         Args:
-            songs_data: List of dicts with youtube_url, title, and artist
+            songs_data: List of dicts with youtube_url, title, artist and
+                optionally duration (seconds)
+            deadline: Deadline for the whole batch; songs not reached in
+                time are returned as timed out
+            quality: Quality profile for every song in the batch
             
         Returns:
-            List of download results
+            List of download results, in the order of songs_data
         """
-        results = []
+        deadline = deadline or Deadline()
+        results = [None] * len(songs_data)
+        plan = sorted(
+            range(len(songs_data)),
+            key=lambda i: songs_data[i].get('duration') or TYPICAL_SONG_DURATION
+        )
         
-        for song in songs_data:
+        for i in plan:
+            song = songs_data[i]
+            if deadline.expired:
+                results[i] = {
+                    'success': False,
+                    'title': song.get('title'),
+                    'error': 'Deadline exceeded',
+                    'timed_out': True
+                }
+                continue
+            
             if not song.get('youtube_url'):
-                results.append({
+                results[i] = {
                     'success': False,
                     'title': song.get('title'),
                     'error': 'No YouTube URL provided'
-                })
+                }
+                continue
+            
+            if is_too_long(song.get('duration')):
+                results[i] = {
+                    'success': False,
+                    'title': song.get('title'),
+                    'error': f'Longer than {MAX_SONG_DURATION}s',
+                    'too_long': True
+                }
                 continue
             
             result = self.download_as_mp3(
                 youtube_url=song['youtube_url'],
                 song_title=song['title'],
-                artist=song['artist']
+                artist=song['artist'],
+                deadline=deadline,
+                quality=quality
             )
             
             result['original_title'] = song['title']
             result['artist'] = song['artist']
-            results.append(result)
-            
-            # Small delay between downloads
-            time.sleep(1)
+            results[i] = result
         
         return results
\ No newline at end of file
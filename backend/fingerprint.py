@@ -0,0 +1,476 @@
+import importlib.util
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+# NumPy is optional and slow to import; it is only loaded once a file is
+# actually fingerprinted, so a server with fingerprinting off never pays for it
+if TYPE_CHECKING:
+    import numpy as np
+
+from coordination import SharedStore
+from downloader import iter_library, library_changed, locate, quality_of
+
+# Spectrogram / peak-pairing parameters
+SAMPLE_RATE = 11025
+N_FFT = 1024
+HOP = 512                   # ~46 ms per frame
+PEAK_FREQ_SIZE = 15         # neighbourhood (bins) a peak must dominate
+PEAK_TIME_SIZE = 11         # neighbourhood (frames) a peak must dominate
+PEAK_PERCENTILE = 95        # only the loudest 5% of cells can be peaks
+PEAKS_PER_FRAME = 5         # keep the strongest few peaks of each frame
+FAN_OUT = 5                 # pairs formed from each anchor peak
+MIN_DT, MAX_DT = 1, 63      # target zone in frames (fits in 6 bits)
+
+# How many time-aligned hash hits make two files the same recording
+MIN_MATCHES = int(os.getenv("FINGERPRINT_MIN_MATCHES", "25"))
+MIN_MATCH_RATIO = float(os.getenv("FINGERPRINT_MIN_MATCH_RATIO", "0.05"))
+
+# SQLite caps the number of bound parameters per statement
+QUERY_BATCH = 500
+
+
+def decode_audio(path: str):
+    """Decode any audio file to mono float32 samples at SAMPLE_RATE using ffmpeg"""
+    import numpy as np
+    
+    cmd = [
+        "ffmpeg", "-v", "quiet", "-i", str(path),
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"
+    ]
+    raw = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _max_filter(a, size: int, axis: int):
+    """Sliding maximum of width `size` along one axis (same shape as `a`)"""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    pad = size // 2
+    pad_width = [(0, 0)] * a.ndim
+    pad_width[axis] = (pad, pad)
+    padded = np.pad(a, pad_width, mode="constant", constant_values=-np.inf)
+    return sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+
+def fingerprint_samples(samples) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Spectral peak hashing: pick local maxima of the log spectrogram, pair each
+    anchor peak with the next FAN_OUT peaks and hash (f1, f2, dt).
+
+    Returns:
+        (hashes, offsets) - int64 hash per pair and the anchor's frame index
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    if len(samples) < N_FFT:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    window = np.hanning(N_FFT).astype(np.float32)
+    frames = sliding_window_view(samples, N_FFT)[::HOP] * window
+    spec = np.abs(np.fft.rfft(frames, axis=1)).T.astype(np.float32)  # (freq, time)
+    spec = 20 * np.log10(spec + 1e-10)
+
+    # A rectangular max filter is separable: filter frequency, then time
+    local_max = _max_filter(_max_filter(spec, PEAK_FREQ_SIZE, axis=0), PEAK_TIME_SIZE, axis=1)
+    threshold = np.percentile(spec, PEAK_PERCENTILE)
+    freqs, times = np.nonzero((spec == local_max) & (spec > threshold))
+
+    # Sort by frame, strongest first, and drop all but the top peaks per frame
+    order = np.lexsort((-spec[freqs, times], times))
+    freqs = freqs[order].astype(np.int64)
+    times = times[order].astype(np.int64)
+    if len(times):
+        first_in_frame = np.r_[0, np.flatnonzero(np.diff(times)) + 1]
+        rank = np.arange(len(times)) - np.repeat(first_in_frame, np.diff(np.r_[first_in_frame, len(times)]))
+        keep = rank < PEAKS_PER_FRAME
+        freqs, times = freqs[keep], times[keep]
+
+    hashes, offsets = [], []
+    for k in range(1, FAN_OUT + 1):
+        dt = times[k:] - times[:-k]
+        ok = (dt >= MIN_DT) & (dt <= MAX_DT)
+        hashes.append((freqs[:-k][ok] << 16) | (freqs[k:][ok] << 6) | dt[ok])
+        offsets.append(times[:-k][ok])
+
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+
+def compute_fingerprint(path: str) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Decode and fingerprint one file (runs inside the process pool)"""
+    return fingerprint_samples(decode_audio(path))
+
+
+class FingerprintIndex:
+    """Inverted index hash -> (track, offset), stored in SQLite next to the shared store"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS fp_tracks (
+                track_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                n_hashes INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fp_hashes (
+                hash INTEGER NOT NULL,
+                track_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS fp_hashes_hash ON fp_hashes (hash);
+            CREATE INDEX IF NOT EXISTS fp_hashes_track ON fp_hashes (track_id);
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def is_indexed(self, path: Path) -> bool:
+        """True if the file is indexed and hasn't changed since"""
+        stat = path.stat()
+        row = self._connect().execute(
+            "SELECT size, mtime FROM fp_tracks WHERE filename = ?", (path.name,)
+        ).fetchone()
+        return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def add(self, path: Path, hashes, offsets):
+        conn = self._connect()
+        stat = path.stat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove(conn, path.name)
+            cursor = conn.execute(
+                "INSERT INTO fp_tracks (filename, size, mtime, n_hashes) VALUES (?, ?, ?, ?)",
+                (path.name, stat.st_size, stat.st_mtime, len(hashes))
+            )
+            track_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO fp_hashes (hash, track_id, offset) VALUES (?, ?, ?)",
+                ((int(h), track_id, int(o)) for h, o in zip(hashes, offsets))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, filename: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        self._remove(conn, filename)
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, filename: str):
+        row = conn.execute("SELECT track_id FROM fp_tracks WHERE filename = ?", (filename,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM fp_hashes WHERE track_id = ?", (row[0],))
+            conn.execute("DELETE FROM fp_tracks WHERE track_id = ?", (row[0],))
+
+    def filenames(self) -> List[str]:
+        return [row[0] for row in self._connect().execute("SELECT filename FROM fp_tracks")]
+
+    def hashes_for(self, filename: str):
+        import numpy as np
+
+        rows = self._connect().execute(
+            "SELECT h.hash, h.offset FROM fp_hashes h "
+            "JOIN fp_tracks t ON t.track_id = h.track_id WHERE t.filename = ?",
+            (filename,)
+        ).fetchall()
+        data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def match(self, hashes, offsets, exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Find indexed tracks sharing time-aligned hashes with the query
+
+        Returns:
+            (filename, aligned hit count) for duplicate candidates, best first
+        """
+        import numpy as np
+
+        if len(hashes) == 0:
+            return []
+
+        query_offsets: Dict[int, List[int]] = {}
+        for h, o in zip(hashes.tolist(), offsets.tolist()):
+            query_offsets.setdefault(h, []).append(o)
+
+        conn = self._connect()
+        unique_hashes = list(query_offsets)
+        tracks, deltas = [], []
+        for i in range(0, len(unique_hashes), QUERY_BATCH):
+            batch = unique_hashes[i:i + QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            for h, track_id, offset in conn.execute(
+                f"SELECT hash, track_id, offset FROM fp_hashes WHERE hash IN ({placeholders})", batch
+            ):
+                for query_offset in query_offsets[h]:
+                    tracks.append(track_id)
+                    deltas.append(offset - query_offset)
+
+        if not tracks:
+            return []
+
+        # The same recording lines up at one constant offset difference
+        pairs, counts = np.unique(np.stack([tracks, deltas], axis=1), axis=0, return_counts=True)
+        best: Dict[int, int] = {}
+        for (track_id, _), count in zip(pairs.tolist(), counts.tolist()):
+            best[track_id] = max(best.get(track_id, 0), count)
+
+        names = dict(conn.execute("SELECT track_id, filename FROM fp_tracks").fetchall())
+        min_hits = max(MIN_MATCHES, int(MIN_MATCH_RATIO * len(hashes)))
+        matches = [
+            (names[track_id], count)
+            for track_id, count in best.items()
+            if count >= min_hits and names.get(track_id) not in (None, exclude)
+        ]
+        return sorted(matches, key=lambda m: -m[1])
+
+
+class FingerprintService:
+    """
+    Acoustic deduplication of the downloads directory.
+
+    Fingerprints are computed in a background process pool and stored in an
+    inverted hash index. New downloads are checked against the index, and
+    duplicates are handled according to the dedupe mode:
+    - "report": only log them (default)
+    - "link":   replace the duplicate with a hard link to the kept file
+    - "merge":  delete the duplicate and alias its name to the kept file
+    """
+
+    def __init__(
+        self,
+        store: SharedStore,
+        download_path: str = "downloads",
+        workers: Optional[int] = None,
+        dedupe_mode: Optional[str] = None
+    ):
+        self.store = store
+        self.download_path = Path(download_path)
+        self.workers = workers or int(os.getenv("FINGERPRINT_WORKERS", "2"))
+        self.dedupe_mode = dedupe_mode or os.getenv("FINGERPRINT_DEDUPE", "report")
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Matching and deduping a fresh download, one at a time, off the
+        # process pool's result-handling thread
+        self._matcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fingerprint-match")
+        self._index = None
+
+    @property
+    def available(self) -> bool:
+        """Fingerprinting needs NumPy and an ffmpeg binary for decoding"""
+        return importlib.util.find_spec("numpy") is not None and shutil.which("ffmpeg") is not None
+
+    @property
+    def index(self) -> FingerprintIndex:
+        if self._index is None:
+            self._index = FingerprintIndex(self.store.state_dir / "fingerprints.db")
+        return self._index
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: forking a threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=get_context("spawn")
+                )
+            return self._executor
+
+    def _library_files(self) -> List[Path]:
+        return list(iter_library(self.download_path))
+
+    def index_library(self) -> int:
+        """
+        Fingerprint every library file that isn't indexed yet
+
+        Returns:
+            Number of files indexed
+        """
+        pending = [f for f in self._library_files() if not self.index.is_indexed(f)]
+        if not pending:
+            return 0
+
+        print(f"🔎 Fingerprinting {len(pending)} file(s)...")
+        futures = {f: self._pool().submit(compute_fingerprint, str(f)) for f in pending}
+
+        indexed = 0
+        for path, future in futures.items():
+            try:
+                hashes, offsets = future.result()
+                self.index.add(path, hashes, offsets)
+                indexed += 1
+            except Exception as e:
+                print(f"   ⚠️ Could not fingerprint {path.name}: {e}")
+        print(f"✅ Fingerprinted {indexed} file(s)")
+        return indexed
+
+    def start_background_index(self) -> threading.Thread:
+        thread = threading.Thread(target=self.index_library, daemon=True)
+        thread.start()
+        return thread
+
+    def submit_new_download(self, file_path: str) -> Optional[Future]:
+        """Fingerprint a fresh download in the background and dedupe it against the library"""
+        path = Path(file_path)
+        if not path.exists() or self.index.is_indexed(path):
+            return None
+
+        future = self._pool().submit(compute_fingerprint, str(path))
+        # Done-callbacks run on the pool's management thread; hand the
+        # SQLite work off so it doesn't hold up every other result
+        future.add_done_callback(lambda f: self._matcher.submit(self._on_fingerprinted, path, f))
+        return future
+
+    def _on_fingerprinted(self, path: Path, future: Future):
+        try:
+            hashes, offsets = future.result()
+        except Exception as e:
+            print(f"   ⚠️ Could not fingerprint {path.name}: {e}")
+            return
+
+        start = time.perf_counter()
+        matches = self.index.match(hashes, offsets, exclude=path.name)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Other quality profiles of the same song are kept on purpose
+        existing = [
+            (name, hits) for name, hits in matches
+            if locate(self.download_path, name) and quality_of(name) == quality_of(path.name)
+        ]
+        if not existing:
+            self.index.add(path, hashes, offsets)
+            return
+
+        canonical = existing[0][0]
+        print(f"🔁 {path.name} duplicates {canonical} ({existing[0][1]} hits, matched in {elapsed_ms:.0f} ms)")
+        action = "reported"
+        if self.dedupe_mode != "report":
+            action = self._dedupe_file(path, locate(self.download_path, canonical), self.dedupe_mode)
+        if action in ("reported", "skipped-pinned"):
+            # Still indexed, so a later dedupe run can handle it
+            self.index.add(path, hashes, offsets)
+
+    def find_duplicates(self) -> List[List[str]]:
+        """
+        Group indexed library files that are the same recording
+
+        Returns:
+            Groups of filenames, each with at least two members
+        """
+        groups: List[List[str]] = []
+        seen = set()
+        for filename in self.index.filenames():
+            if filename in seen:
+                continue
+            hashes, offsets = self.index.hashes_for(filename)
+            group = [filename] + [
+                name for name, _ in self.index.match(hashes, offsets, exclude=filename)
+                if quality_of(name) == quality_of(filename)
+            ]
+            seen.update(group)
+            if len(group) > 1:
+                groups.append(group)
+        return groups
+
+    def dedupe(self, mode: Optional[str] = None) -> List[dict]:
+        """
+        Deduplicate the whole library, keeping the largest file of each group
+
+        Returns:
+            One record per duplicate that was handled
+        """
+        mode = mode or self.dedupe_mode
+        self.index_library()
+
+        actions = []
+        for group in self.find_duplicates():
+            paths = [p for p in (locate(self.download_path, name) for name in group) if p]
+            if len(paths) < 2:
+                continue
+            paths.sort(key=lambda p: p.stat().st_size, reverse=True)
+            canonical = paths[0]
+            for dupe in paths[1:]:
+                action = self._dedupe_file(dupe, canonical, mode)
+                actions.append({"duplicate": dupe.name, "kept": canonical.name, "action": action})
+        return actions
+
+    def _dedupe_file(self, dupe: Path, canonical: Path, mode: str) -> str:
+        """Apply the dedupe mode to one duplicate; returns the action taken"""
+        if mode == "report":
+            print(f"   🔁 {dupe.name} == {canonical.name}")
+            return "reported"
+
+        try:
+            if os.path.samefile(dupe, canonical):
+                return "already-linked"
+        except OSError:
+            pass
+
+        # A job still holds it (e.g. a download being served); leave it alone
+        if dupe.name in self.store.pinned_files():
+            print(f"   📌 {dupe.name} is pinned; not touching it")
+            return "skipped-pinned"
+
+        # A hard link would serve e.g. m4a bytes under a .webm name; alias instead
+        if mode == "link" and dupe.suffix.lower() == canonical.suffix.lower():
+            tmp = dupe.with_name(dupe.name + ".linktmp")
+            os.link(canonical, tmp)
+            os.replace(tmp, dupe)
+            # Same name, but it now shares the kept file's bytes
+            library_changed(self.store, dupe.name)
+            action = "linked"
+        else:
+            dupe.unlink()
+            library_changed(self.store, dupe.name, removed=True)
+            self.store.forget_file(dupe.name)
+            # Requests for the duplicate's name now resolve to the kept file
+            self.store.cache_set("alias", dupe.stem, canonical.name)
+            action = "merged"
+
+        self.index.remove(dupe.name)
+        print(f"   🔗 {action}: {dupe.name} -> {canonical.name}")
+        return action
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fingerprint and deduplicate the audio library")
+    parser.add_argument("command", choices=["index", "duplicates", "dedupe"])
+    parser.add_argument("--mode", choices=["report", "link", "merge"], default="report")
+    parser.add_argument("--downloads", default="downloads")
+    args = parser.parse_args()
+
+    service = FingerprintService(SharedStore(), download_path=args.downloads, dedupe_mode=args.mode)
+    if not service.available:
+        raise SystemExit("Fingerprinting needs numpy and ffmpeg installed")
+
+    if args.command == "index":
+        service.index_library()
+    elif args.command == "duplicates":
+        service.index_library()
+        for group in service.find_duplicates():
+            print(" == ".join(group))
+    else:
+        for action in service.dedupe(args.mode):
+            print(f"{action['action']}: {action['duplicate']} -> {action['kept']}")
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from coordination import SharedStore
+from deadline import Deadline
+
+# When library tracks are cut into HLS segments: "off", "lazy" (on the first
+# request for a track) or "eager" (in the background after each download;
+# older tracks are still packaged on first request)
+HLS_PACKAGING = os.getenv("HLS_PACKAGING", "off").lower()
+
+# Target length of each segment (seconds)
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+
+# Where packages are written (outside downloads/, so library scans skip them)
+HLS_DIR = os.getenv("HLS_DIR", "hls")
+
+# How long a playlist request waits for a lazy packaging run before
+# answering 202 (the client retries; packaging carries on meanwhile)
+HLS_WAIT_SECONDS = float(os.getenv("HLS_WAIT_SECONDS", "20"))
+
+# AAC sources are remuxed as-is; anything else is encoded to AAC
+COPY_EXTENSIONS = (".m4a", ".mp4")
+AAC_BITRATE = "160k"
+
+MANIFEST = "index.m3u8"
+
+# Longest one ffmpeg packaging run may take (seconds); a worker waiting for
+# another's run of the same package gives up after as long
+PACKAGE_TIMEOUT = 300
+
+# The only names a package contains; checked before anything is served
+PACKAGE_ID = re.compile(r"^[0-9a-f]{16}$")
+PACKAGE_FILE = re.compile(r"^(index\.m3u8|init\.mp4|seg_\d{5}\.m4s)$")
+
+
+def package_id(path: Path) -> str:
+    """
+    Version id of a track's package. It changes whenever the file does, so
+    everything under it can be cached as immutable.
+    """
+    stat = path.stat()
+    return hashlib.sha1(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:16]
+
+
+class HLSPackager:
+    """
+    Cuts library tracks into fixed-duration fMP4 segments with a VOD
+    playlist, for HLS playback through edge caches.
+
+    Each package lives in its own directory named by package_id() and is
+    written to a temporary directory first, then renamed into place, so a
+    playlist is never visible before all of its segments. Packaging runs on
+    a small thread pool (ffmpeg does the work in a subprocess) and under a
+    cross-process lock, so each version of a track is packaged once.
+    """
+
+    def __init__(
+        self,
+        store: SharedStore,
+        output_path: Optional[str] = None,
+        segment_seconds: Optional[int] = None,
+        workers: int = 1
+    ):
+        self.store = store
+        self.output_path = Path(output_path or HLS_DIR)
+        self.segment_seconds = segment_seconds or HLS_SEGMENT_SECONDS
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    @property
+    def available(self) -> bool:
+        """Packaging needs an ffmpeg binary"""
+        return shutil.which("ffmpeg") is not None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Called with self._lock held
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hls")
+        return self._executor
+
+    def packaged(self, path: Path) -> Optional[str]:
+        """Package id of the track's current version, if it's already packaged"""
+        pid = package_id(path)
+        return pid if (self.output_path / pid / MANIFEST).exists() else None
+
+    def submit(self, path: Path) -> Future:
+        """Package a track in the background; concurrent calls share one run"""
+        pid = package_id(path)
+        with self._lock:
+            future = self._in_flight.get(pid)
+            started = future is None
+            if started:
+                future = self._pool().submit(self._package, path, pid)
+                self._in_flight[pid] = future
+        if started:
+            # Outside the lock: runs right here if the future is already done
+            future.add_done_callback(lambda _: self._done(pid))
+        return future
+
+    def _done(self, pid: str):
+        with self._lock:
+            self._in_flight.pop(pid, None)
+
+    def ensure(self, path: Path, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Package id of the track, packaging it first if needed
+
+        Returns:
+            None if packaging didn't finish within the timeout (it keeps
+            running) or failed
+        """
+        pid = self.packaged(path)
+        if pid:
+            return pid
+        try:
+            return self.submit(path).result(timeout=timeout)
+        except FutureTimeout:
+            return None
+        except Exception as e:
+            print(f"   ⚠️ Could not package {path.name}: {e}")
+            return None
+
+    def _package(self, path: Path, pid: str) -> str:
+        final = self.output_path / pid
+        with self.store.download_lock(f"hls:{pid}", Deadline(PACKAGE_TIMEOUT)):
+            if (final / MANIFEST).exists():
+                return pid  # another worker got here first
+
+            tmp = self.output_path / f".{pid}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            codec = ["-c:a", "copy"] if path.suffix.lower() in COPY_EXTENSIONS else ["-c:a", "aac", "-b:a", AAC_BITRATE]
+            try:
+                subprocess.run(
+                    [
+                        "ffmpeg", "-v", "error", "-y", "-i", str(path),
+                        "-map", "0:a:0", *codec,
+                        "-f", "hls",
+                        "-hls_time", str(self.segment_seconds),
+                        "-hls_playlist_type", "vod",
+                        "-hls_segment_type", "fmp4",
+                        "-hls_fmp4_init_filename", "init.mp4",
+                        "-hls_segment_filename", str(tmp / "seg_%05d.m4s"),
+                        str(tmp / MANIFEST),
+                    ],
+                    check=True, capture_output=True, timeout=PACKAGE_TIMEOUT
+                )
+                # Which track this package belongs to, for prune()
+                (tmp / "source.json").write_text(json.dumps({"filename": path.name}))
+                shutil.rmtree(final, ignore_errors=True)  # a half-written leftover
+                os.replace(tmp, final)
+            except subprocess.CalledProcessError as e:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise RuntimeError(e.stderr.decode(errors="replace").strip() or "ffmpeg failed") from e
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+
+        segments = sum(1 for f in final.iterdir() if f.suffix == ".m4s")
+        print(f"   🎞️ Packaged {path.name}: {segments} segment(s) of {self.segment_seconds}s")
+        return pid
+
+    def file(self, pid: str, name: str) -> Optional[Path]:
+        """Path of one file of a package (playlist, init or segment), if it exists"""
+        if not PACKAGE_ID.match(pid) or not PACKAGE_FILE.match(name):
+            return None
+        path = self.output_path / pid / name
+        return path if path.is_file() else None
+
+    def prune(self, resolve: Callable[[str], Optional[Path]]) -> int:
+        """
+        Delete packages of tracks that were evicted or replaced
+
+        Args:
+            resolve: Library path of a filename, or None if it's gone
+
+        Returns:
+            Number of packages deleted
+        """
+        if not self.output_path.exists():
+            return 0
+
+        pruned = 0
+        for package in self.output_path.iterdir():
+            if package.name.endswith(".tmp") and time.time() - package.stat().st_mtime > 3600:
+                shutil.rmtree(package, ignore_errors=True)  # left by a crashed run
+                continue
+            if not package.is_dir() or not PACKAGE_ID.match(package.name):
+                continue
+            try:
+                source = json.loads((package / "source.json").read_text())["filename"]
+            except (OSError, ValueError, KeyError):
+                continue
+            path = resolve(source)
+            if path is None or package_id(path) != package.name:
+                shutil.rmtree(package, ignore_errors=True)
+                pruned += 1
+
+        if pruned:
+            print(f"🧹 Removed {pruned} stale HLS package(s)")
+        return pruned
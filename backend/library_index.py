@@ -0,0 +1,258 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from coordination import SharedStore
+from downloader import PLAIN_QUALITY, iter_library, locate, quality_of
+
+# Minimum artist similarity for a library file to count as the requested song
+LIBRARY_ARTIST_THRESHOLD = float(os.getenv("LIBRARY_ARTIST_THRESHOLD", "0.7"))
+
+# Minimum title similarity; strict, since "What Do You Want" must never pass
+# for "What Do You Mean" by the same artist
+LIBRARY_TITLE_THRESHOLD = float(os.getenv("LIBRARY_TITLE_THRESHOLD", "0.85"))
+
+# Titles this short (letters and digits) only match exactly: one letter
+# more ("Gold" / "Golden") is a different song, not a typo
+SHORT_TITLE_LENGTH = 8
+
+# Words that say nothing about which recording it is
+NOISE_WORDS = {"official", "audio", "video", "lyrics", "lyric", "hd", "hq", "music", "the"}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents, punctuation and noise words"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"\(.*?\)|\[.*?\]", " ", text)   # "(Official Video)", "[HD]"
+    text = re.sub(r"\b(feat|ft)\b.*", " ", text)    # featured artists
+    words = re.sub(r"[^\w\s]", " ", text).split()
+    return " ".join(w for w in words if w not in NOISE_WORDS)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of each word, padded so short words still count"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def compact(text: str) -> str:
+    """Normalized text without spaces ("Your Self" equals "Yourself")"""
+    return normalize(text).replace(" ", "")
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Dice coefficient of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class LibraryIndex:
+    """
+    In-memory trigram index over the normalized artist and title of every
+    library file ("Artist - Title.ext"), for typo-tolerant lookups.
+
+    The library is scanned once, on first use; after that each lookup
+    applies just the files added and removed since, from the shared store's
+    library change log (so files downloaded or evicted by other workers are
+    picked up too). It also records where each file lives, so requests
+    never scan the library.
+    """
+
+    def __init__(self, download_path: str = "downloads", store: Optional[SharedStore] = None):
+        self.download_path = Path(download_path)
+        self.store = store
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        # Last library change applied; None until the first scan
+        self._seq = None
+
+    @staticmethod
+    def _parse(path: Path) -> dict:
+        filename = path.name
+        stem = Path(filename).stem
+        quality = quality_of(filename)
+        if quality != PLAIN_QUALITY:
+            stem = stem[:-len(f" [{quality}]")]
+        artist, sep, title = stem.partition(" - ")
+        if not sep:
+            artist, title = "", stem
+
+        artist_grams = trigrams(normalize(artist))
+        title_grams = trigrams(normalize(title))
+        return {
+            "filename": filename,
+            "path": str(path),
+            "artist": artist.strip(),
+            "title": title.strip(),
+            "compact_title": compact(title),
+            "quality": quality,
+            "artist_grams": artist_grams,
+            "title_grams": title_grams,
+            "grams": artist_grams | title_grams,
+        }
+
+    def add(self, path: Path):
+        """Index a library file (re-indexing it if the name is already known)"""
+        entry = self._parse(path)
+        with self._lock:
+            self._remove(entry["filename"])
+            self._entries[entry["filename"]] = entry
+            for gram in entry["grams"]:
+                self._postings.setdefault(gram, set()).add(entry["filename"])
+
+    def remove(self, filename: str):
+        with self._lock:
+            self._remove(filename)
+
+    def _remove(self, filename: str):
+        entry = self._entries.pop(filename, None)
+        if entry is None:
+            return
+        for gram in entry["grams"]:
+            names = self._postings.get(gram)
+            if names is not None:
+                names.discard(filename)
+                if not names:
+                    del self._postings[gram]
+
+    def refresh(self, force: bool = False):
+        """Scan the library on first use (or when forced), then apply logged changes"""
+        with self._refresh_lock:
+            changes = None
+            if self._seq is not None and not force:
+                if self.store is None:
+                    return
+                changes = self.store.library_changes(self._seq)
+
+            if changes is None:
+                self._rebuild()
+                if self.store is None:
+                    return
+                # Changes logged during the scan are applied again (harmless)
+                changes = self.store.library_changes(self._seq) or []
+
+            for change in changes:
+                path = None if change["removed"] else locate(self.download_path, change["filename"])
+                if path is None:
+                    self.remove(change["filename"])
+                else:
+                    self.add(path)
+                self._seq = change["seq"]
+
+    def _rebuild(self):
+        seq = self.store.library_change_seq() if self.store is not None else 0
+        entries, postings = {}, {}
+        for f in iter_library(self.download_path):
+            entry = self._parse(f)
+            entries[f.name] = entry
+            for gram in entry["grams"]:
+                postings.setdefault(gram, set()).add(f.name)
+
+        with self._lock:
+            self._entries, self._postings = entries, postings
+        self._seq = seq
+
+    def _candidates(self, grams: Set[str]) -> Counter:
+        """Filenames sharing at least one trigram with the query, with shared counts"""
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._postings.get(gram, ()))
+        return counts
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Rank library files against a free-text query
+
+        Returns:
+            Up to `limit` results with filename, artist, title and score
+        """
+        self.refresh()
+        grams = trigrams(normalize(query))
+
+        with self._lock:
+            results = []
+            for filename, shared in self._candidates(grams).most_common(limit * 5):
+                entry = self._entries[filename]
+                score = 2 * shared / (len(grams) + len(entry["grams"]))
+                results.append({
+                    "filename": filename,
+                    "path": entry["path"],
+                    "artist": entry["artist"],
+                    "title": entry["title"],
+                    "quality": entry["quality"],
+                    "score": round(score, 3),
+                })
+
+        results.sort(key=lambda r: -r["score"])
+        return results[:limit]
+
+    @staticmethod
+    def _title_matches(wanted: str, title_score: float, entry: dict) -> bool:
+        if wanted == entry["compact_title"]:
+            return True
+        if len(wanted) < SHORT_TITLE_LENGTH:
+            return False
+        return title_score >= LIBRARY_TITLE_THRESHOLD
+
+    def best_match(
+        self,
+        artist: str,
+        title: str,
+        quality: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        Find the library file for a song, tolerating spelling variants
+
+        Artist and title must each pass their own threshold, the title's
+        strict (and exact for short titles), so that another song by the
+        same artist never passes for the requested one. With `quality`,
+        only files of that quality profile count.
+
+        Returns:
+            The best match, or None
+        """
+        self.refresh()
+        artist_grams = trigrams(normalize(artist))
+        title_grams = trigrams(normalize(title))
+        wanted = compact(title)
+
+        best = None
+        with self._lock:
+            for filename in self._candidates(title_grams):
+                entry = self._entries[filename]
+                if quality and entry["quality"] != quality:
+                    continue
+                title_score = similarity(title_grams, entry["title_grams"])
+                artist_score = similarity(artist_grams, entry["artist_grams"])
+                if artist_score < LIBRARY_ARTIST_THRESHOLD or not self._title_matches(wanted, title_score, entry):
+                    continue
+                score = 0.4 * artist_score + 0.6 * title_score
+                if best is None or score > best["score"]:
+                    best = {
+                        "filename": filename,
+                        "path": entry["path"],
+                        "artist": entry["artist"],
+                        "title": entry["title"],
+                        "score": round(score, 3),
+                    }
+        return best
+
+    def files(self) -> List[dict]:
+        """Filename, path and quality of every library file"""
+        self.refresh()
+        with self._lock:
+            return [
+                {"filename": name, "path": entry["path"], "quality": entry["quality"]}
+                for name, entry in self._entries.items()
+            ]
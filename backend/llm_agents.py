@@ -1,26 +1,74 @@
 import os
 import json
-from typing import List
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from typing import Optional
+from deadline import Deadline, DeadlineExceeded
 from models import Song
-from dotenv import load_dotenv
 
-load_dotenv()
+# langchain / langchain_openai are imported on first use so that importing
+# this module (and the API) stays fast; see the `llm` properties below.
+
+# Most of a request's budget the search-query LLM call may use (seconds); if
+# it runs out a plain query is used so the YouTube search still gets time
+SEARCH_QUERY_TIMEOUT = float(os.getenv("SEARCH_QUERY_TIMEOUT", "15"))
+
+
+def _chat_model(model: str, max_retries: int = 2):
+    """
+    OpenAI chat client. Deadline-bound calls use max_retries=0: the client
+    retries with the full timeout each time, so a bound timeout would only
+    limit one attempt and the call could run ~3x past the deadline.
+    """
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=model,
+        temperature=0,
+        max_retries=max_retries,
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+
+def _is_timeout(error: Exception) -> bool:
+    """True for client-side timeouts (openai raises its own APITimeoutError)"""
+    return isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
 
 
 class SongExtractionAgent:
     """Agent 1: Extracts song information from user query using GPT-4"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4",
-            temperature=0,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self._llm = None
+        self._single_attempt_llm = None
+    
+    @property
+    def llm(self):
+        """GPT-4 client, created on first use"""
+        if self._llm is None:
+            self._llm = _chat_model("gpt-4")
+        return self._llm
+    
+    @property
+    def single_attempt_llm(self):
+        """GPT-4 client without retries, for deadline-bound calls"""
+        if self._single_attempt_llm is None:
+            self._single_attempt_llm = _chat_model("gpt-4", max_retries=0)
+        return self._single_attempt_llm
+    
+    def _llm_within(self, timeout: Optional[float]):
+        """Client for one call that must finish within timeout seconds (None: no limit)"""
+        if timeout is None:
+            return self.llm
+        return self.single_attempt_llm.bind(timeout=timeout)
+        
+    def extract_songs(self, query: str, deadline: Optional[Deadline] = None) -> dict:
+        """
+        Extract songs from natural language query and detect intent
+        
+        Raises:
+            DeadlineExceeded: if the deadline ran out before GPT-4 answered
+        """
+        from langchain_core.prompts import ChatPromptTemplate
         
-    def extract_songs(self, query: str) -> dict:
-        """Extract songs from natural language query and detect intent"""
+        deadline = deadline or Deadline()
         
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a music information extraction expert. 
@@ -106,8 +154,14 @@ class SongExtractionAgent:
             ("user", "{query}")
         ])
         
-        chain = prompt | self.llm
-        response = chain.invoke({"query": query})
+        timeout = deadline.timeout(stage="song extraction")
+        chain = prompt | self._llm_within(timeout)
+        try:
+            response = chain.invoke({"query": query})
+        except Exception as e:
+            if deadline.expired or _is_timeout(e):
+                raise DeadlineExceeded("Deadline exceeded during song extraction") from e
+            raise
         
         try:
             # Parse the JSON response
@@ -175,14 +229,39 @@ class DownloadAgent:
     """Agent 2: Handles YouTube search and download coordination using GPT-3.5-turbo"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self._llm = None
+        self._single_attempt_llm = None
+    
+    @property
+    def llm(self):
+        """GPT-3.5 client, created on first use"""
+        if self._llm is None:
+            self._llm = _chat_model("gpt-3.5-turbo")
+        return self._llm
+    
+    @property
+    def single_attempt_llm(self):
+        """GPT-3.5 client without retries, for deadline-bound calls"""
+        if self._single_attempt_llm is None:
+            self._single_attempt_llm = _chat_model("gpt-3.5-turbo", max_retries=0)
+        return self._single_attempt_llm
+    
+    def _llm_within(self, timeout: Optional[float]):
+        """Client for one call that must finish within timeout seconds (None: no limit)"""
+        if timeout is None:
+            return self.llm
+        return self.single_attempt_llm.bind(timeout=timeout)
     
-    def generate_search_query(self, song: Song) -> str:
-        """Generate optimized YouTube search query"""
+    def generate_search_query(self, song: Song, deadline: Optional[Deadline] = None) -> str:
+        """
+        Generate optimized YouTube search query
+        
+        The LLM gets at most SEARCH_QUERY_TIMEOUT of the remaining budget; if
+        it times out a plain "title artist official audio" query is returned.
+        """
+        from langchain_core.prompts import ChatPromptTemplate
+        
+        deadline = deadline or Deadline()
         
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a YouTube search optimization expert.
@@ -196,8 +275,16 @@ class DownloadAgent:
             ("user", "Song: {title} by {artist}")
         ])
         
-        chain = prompt | self.llm
-        response = chain.invoke({"title": song.title, "artist": song.artist})
+        timeout = deadline.timeout(cap=SEARCH_QUERY_TIMEOUT, stage="search query generation")
+        chain = prompt | self._llm_within(timeout)
+        try:
+            response = chain.invoke({"title": song.title, "artist": song.artist})
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            deadline.check("search query generation")
+            print("⏱️ Search query generation timed out; using a plain query")
+            return f"{song.title} {song.artist} official audio"
         
         return response.content.strip()
     
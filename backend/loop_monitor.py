@@ -0,0 +1,217 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+# Watch the event loop for lag and blocking calls (cheap enough to leave on)
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "1") == "1"
+
+# How often the loop is asked to wake up; lag is how late it does (seconds)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+
+# A loop blocked this long counts as a stall and gets its stack recorded (seconds)
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.25"))
+
+# Stalls kept for /api/debug/event-loop
+LOOP_STALL_HISTORY = int(os.getenv("LOOP_STALL_HISTORY", "50"))
+
+# Innermost frames kept of a stalled stack
+STACK_DEPTH = 15
+
+# The request being handled, inherited by tasks it starts (e.g. response streaming)
+_current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and catches blocking calls.
+
+    A task on the loop sleeps for `interval` over and over and records how
+    late it wakes up. A watchdog thread notices when a wake-up is more than
+    `threshold` overdue, i.e. something is blocking the loop right now, and
+    records the loop thread's stack and the request being handled at that
+    moment. The stall's full length is filled in once the loop wakes up.
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        threshold: Optional[float] = None,
+        history: Optional[int] = None
+    ):
+        self.interval = interval or LOOP_LAG_INTERVAL
+        self.threshold = threshold or LOOP_STALL_THRESHOLD
+        self._lags = deque(maxlen=2000)
+        self._stalls = deque(maxlen=history or LOOP_STALL_HISTORY)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        self.samples = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.stall_count = 0
+
+        self._loop = None
+        self._loop_thread = None
+        self._beat = None
+        self._open_stall = None
+        self._requests = {}
+        self._ticker = None
+        self._watchdog = None
+
+    def start(self):
+        """Start watching the running event loop (call from a startup hook)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        with self._lock:
+            self._beat = time.monotonic()
+            self._open_stall = None
+        self._ticker = self._loop.create_task(self._tick())
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, daemon=True)
+            self._watchdog.start()
+
+    async def _tick(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+
+            with self._lock:
+                self._beat = now
+                self._lags.append(lag)
+                self.samples += 1
+                self.lag_total += lag
+                self.lag_max = max(self.lag_max, lag)
+                if self._open_stall is not None:
+                    self._open_stall["duration"] = round(lag, 3)
+                    self._open_stall = None
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval / 2)
+            with self._lock:
+                if self._beat is None or self._open_stall is not None:
+                    continue
+                blocked = time.monotonic() - self._beat - self.interval
+            if blocked >= self.threshold:
+                self._record_stall(blocked)
+
+    def _record_stall(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = [
+            f"{entry.filename}:{entry.lineno} in {entry.name}: {entry.line}"
+            for entry in traceback.extract_stack(frame)[-STACK_DEPTH:]
+        ] if frame is not None else []
+
+        stall = {
+            "id": next(self._ids),
+            "at": time.time(),
+            # Until the loop wakes up, how long it had been blocked when caught
+            "duration": None,
+            "blocked_when_seen": round(blocked, 3),
+            "request": self._request_of(asyncio.current_task(self._loop)),
+            "stack": stack,
+        }
+        with self._lock:
+            self._stalls.append(stall)
+            self._open_stall = stall
+            self.stall_count += 1
+        print(f"🐢 Event loop blocked for {blocked:.2f}s+ in {stall['request'] or 'no request'}: "
+              f"{stack[-1] if stack else 'stack unavailable'}")
+
+    def _request_of(self, task) -> Optional[str]:
+        if task is None:
+            return None
+        request = self._requests.get(task)
+        if request is None and hasattr(task, "get_context"):
+            # Python 3.12+: tasks spawned by the request carry its context
+            request = task.get_context().get(_current_request)
+        return request
+
+    def track(self, request: str):
+        """Note that the current task is handling this request"""
+        _current_request.set(request)
+        self._requests[asyncio.current_task()] = request
+
+    def untrack(self):
+        self._requests.pop(asyncio.current_task(), None)
+
+    @staticmethod
+    def _percentile(values, fraction: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+    def stats(self, since: int = 0) -> dict:
+        """
+        Lag percentiles over recent samples, totals since start, and the
+        recorded stalls (only those with an id above `since`)
+        """
+        with self._lock:
+            return {
+                "running": self._ticker is not None and not self._ticker.done(),
+                "interval": self.interval,
+                "threshold": self.threshold,
+                "samples": self.samples,
+                "lag_p50": self._percentile(self._lags, 0.5),
+                "lag_p99": self._percentile(self._lags, 0.99),
+                "lag_max": round(self.lag_max, 4),
+                "stall_count": self.stall_count,
+                "stalls": [dict(stall) for stall in self._stalls if stall["id"] > since],
+            }
+
+    def metrics(self) -> str:
+        """The same numbers in Prometheus text format"""
+        stats = self.stats()
+        lines = [
+            "# HELP event_loop_lag_seconds How late the event loop ran a scheduled wake-up",
+            "# TYPE event_loop_lag_seconds summary",
+        ]
+        for quantile, key in (("0.5", "lag_p50"), ("0.99", "lag_p99")):
+            value = stats[key]
+            if value is not None:
+                lines.append(f'event_loop_lag_seconds{{quantile="{quantile}"}} {value}')
+        with self._lock:
+            lines += [
+                f"event_loop_lag_seconds_sum {self.lag_total:.6f}",
+                f"event_loop_lag_seconds_count {self.samples}",
+            ]
+        lines += [
+            "# HELP event_loop_lag_max_seconds Longest event loop lag since start",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {stats['lag_max']}",
+            "# HELP event_loop_stalls_total Times the event loop was blocked past the stall threshold",
+            "# TYPE event_loop_stalls_total counter",
+            f"event_loop_stalls_total {stats['stall_count']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class LoopMonitorMiddleware:
+    """
+    ASGI middleware that tells the monitor which request each task is
+    handling, so stalls can be attributed to a handler
+    """
+
+    def __init__(self, app, monitor: LoopMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.monitor.track(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.untrack()
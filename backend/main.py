@@ -1,20 +1,81 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Literal, Optional
+from dotenv import load_dotenv
+import asyncio
+import json
 import os
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from urllib.parse import quote
 
 from models import (
     QueryRequest, 
     SongExtractionResponse, 
     DownloadRequest, 
     DownloadResponse,
+    ImportRequest,
     Song
 )
 from llm_agents import SongExtractionAgent, DownloadAgent
 from youtube_service import YouTubeService
-from downloader import MP3Downloader
+from downloader import (
+    AUDIO_EXTENSIONS,
+    MP3Downloader,
+    library_path,
+    locate,
+    DEFAULT_QUALITY,
+    MAX_SONG_DURATION,
+    TYPICAL_SONG_DURATION,
+    is_too_long
+)
+from coordination import SharedStore
+from singleflight import SingleFlight
+from storage import StorageManager
+from fingerprint import FingerprintService
+from library_index import LibraryIndex
+from hls_packaging import HLS_PACKAGING, HLS_WAIT_SECONDS, HLSPackager
+from rate_limiter import youtube_rate_limiter
+from deadline import Deadline, DeadlineExceeded
+from playlist_import import PlaylistImporter, parse_playlist
+from scheduler import Scheduler, INTERACTIVE, LIST, BULK
+from ytdlp_pool import ytdlp_pool
+from task_queue import make_task_queue
+from loop_monitor import LOOP_MONITOR, LoopMonitor, LoopMonitorMiddleware
+from profiler import ProfilerMiddleware, SamplingProfiler
+
+load_dotenv()
+
+# How long a song -> YouTube URL resolution stays cached (seconds)
+RESOLVE_CACHE_TTL = int(os.getenv("RESOLVE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Fingerprint the library in the background and dedupe new downloads against it
+FINGERPRINT_ENABLED = os.getenv("FINGERPRINT_ENABLED", "0") == "1"
+
+# Time budget for each song of a bulk import (seconds); songs that run out are retried on resume
+IMPORT_ITEM_TIMEOUT = float(os.getenv("IMPORT_ITEM_TIMEOUT", "300"))
+
+# Songs downloaded up front by a lazy (browse) request; the rest wait to be played
+LIST_PREFETCH = int(os.getenv("LIST_PREFETCH", "3"))
+
+# Time budget for a proxy-mode cache fill (seconds, 0 = unlimited); it isn't
+# tied to the listener's request, so REQUEST_DEADLINE_SECONDS doesn't apply
+CACHE_FILL_TIMEOUT = float(os.getenv("CACHE_FILL_TIMEOUT", "1800"))
+
+# Song statuses that mean there's nothing (left) to download
+FINAL_STATUSES = ("completed", "timed_out", "too_long", "failed")
+
+# Warm the lazily-loaded subsystems in the background as soon as the server starts
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+# Secret for the /api/admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 app = FastAPI(title="AI Playlist Downloader API")
 
@@ -27,11 +88,462 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Measures event-loop lag and records what was running when the loop stalled
+loop_monitor = LoopMonitor()
+if LOOP_MONITOR:
+    app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+
+# On-demand sampling profiler (admin only); counts requests for request-bounded runs
+profiler = SamplingProfiler()
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
 # Initialize services
+# These are cheap to construct: LLM clients, langchain, yt-dlp and requests are
+# only loaded on first use (or by warm_up below).
+# Per-process singletons; anything that must be consistent across uvicorn
+# workers (caches, download locks, jobs, the YouTube rate limit) lives in the
+# shared store
+shared_store = SharedStore()
+youtube_rate_limiter.share(shared_store)
 song_extraction_agent = SongExtractionAgent()
 download_agent = DownloadAgent()
 youtube_service = YouTubeService()
-mp3_downloader = MP3Downloader()
+mp3_downloader = MP3Downloader(store=shared_store)
+storage_manager = StorageManager(shared_store)
+fingerprint_service = FingerprintService(shared_store)
+hls_packager = HLSPackager(shared_store)
+library_index = LibraryIndex(store=shared_store)
+
+# Concurrent requests for the same song share one LLM query + YouTube search
+resolve_flights = SingleFlight()
+
+# Every search and download runs on this pool, by priority class and fairly
+# across clients
+scheduler = Scheduler()
+
+# ...and then either right there or on download workers (TASK_QUEUE)
+task_queue = make_task_queue(shared_store, mp3_downloader, youtube_service)
+
+
+def warm_up() -> dict:
+    """
+    Load the heavy subsystems now instead of on the first request
+    
+    Returns:
+        Seconds spent warming each subsystem
+    """
+    steps = {
+        "llm_agents": lambda: (
+            song_extraction_agent.llm, song_extraction_agent.single_attempt_llm,
+            download_agent.llm, download_agent.single_attempt_llm,
+        ),
+        "youtube_service": youtube_service.warm_up,
+        "downloader": mp3_downloader.warm_up,
+        "ytdlp_pool": ytdlp_pool.warm_up,
+        # The one full library scan each of these makes
+        "library_index": library_index.refresh,
+        "storage": storage_manager.usage,
+    }
+    
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        step()
+        timings[name] = round(time.perf_counter() - start, 3)
+    
+    print(f"🔥 Warm-up finished: {timings}")
+    return timings
+
+
+@app.on_event("startup")
+async def startup_warm_up():
+    if WARMUP_ON_STARTUP:
+        # Don't hold up startup; requests that arrive first just warm on demand
+        threading.Thread(target=warm_up, daemon=True).start()
+
+
+@app.on_event("startup")
+async def startup_loop_monitor():
+    if LOOP_MONITOR:
+        loop_monitor.start()
+
+
+@app.on_event("startup")
+async def startup_fingerprint_index():
+    if FINGERPRINT_ENABLED:
+        if fingerprint_service.available:
+            fingerprint_service.start_background_index()
+        else:
+            print("⚠️ FINGERPRINT_ENABLED is set but numpy/ffmpeg are missing; skipping")
+
+
+def _hls_enabled() -> bool:
+    return HLS_PACKAGING in ("lazy", "eager") and hls_packager.available
+
+
+def prune_hls_packages():
+    """Drop HLS packages of evicted or replaced tracks, in the background"""
+    if _hls_enabled():
+        resolve = partial(locate, mp3_downloader.download_path)
+        threading.Thread(target=hls_packager.prune, args=(resolve,), daemon=True).start()
+
+
+@app.on_event("startup")
+async def startup_hls_packaging():
+    if HLS_PACKAGING in ("lazy", "eager"):
+        if hls_packager.available:
+            prune_hls_packages()
+        else:
+            print("⚠️ HLS_PACKAGING is set but ffmpeg is missing; skipping")
+
+
+def _song_key(song: Song) -> str:
+    """Normalized song identity used as a cache key"""
+    return f"{' '.join(song.artist.lower().split())} - {' '.join(song.title.lower().split())}"
+
+
+def find_in_library(song: Song, quality: Optional[str] = None) -> bool:
+    """
+    Attach an already-downloaded file to the song if one matches closely
+    enough (spelling variants included), so no network fetch is needed.
+    Only files of the requested quality profile count.
+    """
+    match = library_index.best_match(song.artist, song.title, quality=quality or DEFAULT_QUALITY)
+    if not match:
+        return False
+    
+    print(f"📚 Library hit for {song.title} by {song.artist}: {match['filename']} (score {match['score']})")
+    song.file_path = match['path']
+    song.download_status = "completed"
+    return True
+
+
+def resolve_song(song: Song, deadline: Optional[Deadline] = None) -> Song:
+    """
+    Find the best YouTube match for a song and attach it to the song
+    (status "timed_out" if the deadline runs out first, "too_long" if the
+    match is over MAX_SONG_DURATION)
+    """
+    print(f"\n=== Processing song: {song.title} by {song.artist} ===")
+    
+    deadline = deadline or Deadline()
+    try:
+        # A search that timed out on another caller's deadline is retried
+        # by callers whose own deadline still has time left
+        match = resolve_flights.do(
+            _song_key(song), _resolve_video, song, deadline,
+            rerun=lambda outcome: isinstance(outcome, DeadlineExceeded) and not deadline.expired
+        )
+    except DeadlineExceeded as e:
+        print(f"⏱️ {e}: {song.title}")
+        song.download_status = "timed_out"
+        return song
+    
+    if not match:
+        song.download_status = "not_found"
+        return song
+    
+    song.youtube_url = match['url']
+    song.duration = match.get('duration')
+    if is_too_long(song.duration):
+        print(f"⏭️ {song.title} is {song.duration:.0f}s, over the {MAX_SONG_DURATION}s limit")
+        song.download_status = "too_long"
+    else:
+        song.download_status = "ready"
+    return song
+
+
+def _resolve_video(song: Song, deadline: Deadline) -> Optional[dict]:
+    """Look up (or search for) the YouTube URL and duration of a song"""
+    cached = shared_store.cache_get("resolve", _song_key(song))
+    if cached:
+        # Entries cached before durations were kept are bare URLs
+        match = cached if isinstance(cached, dict) else {'url': cached, 'duration': None}
+        print(f"Cached video URL: {match['url']}")
+        return match
+    
+    # Generate optimized search query using GPT-3.5
+    search_query = download_agent.generate_search_query(song, deadline)
+    print(f"Generated search query: {search_query}")
+    
+    # Search YouTube
+    try:
+        result = task_queue.run(
+            "search", {"query": search_query}, deadline, priority=scheduler.current_priority()
+        )["match"]
+    except RuntimeError as e:
+        # A worker's search failed outright (a search that finds nothing is None)
+        print(f"❌ Search task failed: {e}")
+        return None
+    print(f"Video URL found: {result['url'] if result else None}")
+    
+    if not result:
+        return None
+    match = {'url': result['url'], 'duration': result['duration']}
+    shared_store.cache_set("resolve", _song_key(song), match, ttl=RESOLVE_CACHE_TTL)
+    return match
+
+
+def _client_id(http_request: Request) -> str:
+    """Who capacity is shared fairly between: X-Client-Id, else the caller's address"""
+    client = http_request.headers.get("x-client-id")
+    if not client and http_request.client:
+        client = http_request.client.host
+    return client or "anonymous"
+
+
+def _priority(songs: List[Song]) -> int:
+    """A single song is interactive; anything longer is a list"""
+    return INTERACTIVE if len(songs) == 1 else LIST
+
+
+def scheduled_resolve(song: Song, deadline: Deadline, priority: int, client: str) -> Song:
+    """resolve_song on the scheduler's pool"""
+    try:
+        return scheduler.run(resolve_song, song, deadline, priority=priority, client=client, deadline=deadline)
+    except DeadlineExceeded:
+        song.download_status = "timed_out"
+        return song
+
+
+def _download_cost(song: Song) -> float:
+    """Expected download work: the song's length (audio bytes grow with it)"""
+    return song.duration or TYPICAL_SONG_DURATION
+
+
+def scheduled_download(
+    song: Song,
+    owner: str,
+    deadline: Deadline,
+    priority: int,
+    client: str,
+    quality: Optional[str] = None
+) -> Song:
+    """download_song on the scheduler's pool"""
+    try:
+        return scheduler.run(
+            download_song, song, owner, deadline, quality,
+            priority=priority, client=client, cost=_download_cost(song), deadline=deadline
+        )
+    except DeadlineExceeded:
+        song.download_status = "timed_out"
+        return song
+
+
+def scheduled_pipeline(
+    songs: Dict[int, Song],
+    owner: str,
+    deadline: Deadline,
+    priority: int,
+    client: str,
+    quality: Optional[str] = None,
+    prefetch: Optional[int] = None
+):
+    """
+    Search for and download songs on the scheduler, yielding
+    (event, index, song) as each step finishes:
+    - "resolved": the song has a YouTube match (or failed to get one);
+      songs that arrive with a URL are "resolved" right away
+    - "deferred": it would be downloaded, but `prefetch` downloads are
+      already queued (lazy lists)
+    - "completed": nothing more will happen to it (see download_status)
+    
+    All searches are queued at once and each download is queued as soon as
+    its song resolves, so downloads don't wait for the slowest search and
+    queued downloads still run shortest first. Work still queued when the
+    deadline passes (or the caller stops) is dropped.
+    """
+    futures = {}
+    pending = set()
+    downloads_queued = 0
+    
+    def queue(fn, *args, kind: str, index: int, cost: float = 0.0):
+        future = scheduler.submit(fn, *args, priority=priority, client=client, cost=cost)
+        futures[future] = (kind, index)
+        pending.add(future)
+    
+    def resolved(index: int, song: Song):
+        nonlocal downloads_queued
+        yield "resolved", index, song
+        if prefetch is not None and downloads_queued >= prefetch:
+            yield "deferred", index, song
+            return
+        downloads_queued += 1
+        queue(download_song, song, owner, deadline, quality, kind="download", index=index, cost=_download_cost(song))
+    
+    def finish(future):
+        kind, index = futures[future]
+        song = songs[index]
+        if future.cancelled():
+            song.download_status = "timed_out"
+        else:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Error {'searching for' if kind == 'resolve' else 'downloading'} {song.title}: {e}")
+                song.download_status = "failed"
+        
+        if kind == "resolve":
+            if song.download_status == "ready" and deadline.expired:
+                song.download_status = "timed_out"
+            if song.download_status == "ready":
+                yield from resolved(index, song)
+                return
+            yield "resolved", index, song
+        yield "completed", index, song
+    
+    try:
+        # Queue everything before yielding, so a slow reader can't hold it up.
+        # Split first: a queued search may set youtube_url before the loop ends
+        has_url = [index for index, song in songs.items() if song.youtube_url]
+        for index, song in songs.items():
+            if not song.youtube_url:
+                queue(resolve_song, song, deadline, kind="resolve", index=index)
+        events = [event for index in has_url for event in resolved(index, songs[index])]
+        yield from events
+        
+        while pending:
+            timeout = deadline.remaining()
+            if deadline.expired:
+                # Running work watches the deadline itself
+                for future in [f for f in pending if f.cancel()]:
+                    pending.discard(future)
+                    yield from finish(future)
+                timeout = None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield from finish(future)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def scheduled_downloads(
+    songs: Dict[int, Song],
+    owner: str,
+    deadline: Deadline,
+    priority: int,
+    client: str,
+    quality: Optional[str] = None
+):
+    """
+    Queue a batch of downloads at once so the scheduler runs the shortest
+    first, and yield (index, song) as each one finishes. Downloads still
+    queued when the deadline passes (or the caller stops) are dropped.
+    """
+    for event, index, song in scheduled_pipeline(songs, owner, deadline, priority, client, quality):
+        if event == "completed":
+            yield index, song
+
+
+def download_song(
+    song: Song,
+    owner: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+    quality: Optional[str] = None
+) -> Song:
+    """
+    Download a resolved song and record the outcome on the song
+    
+    Args:
+        song: Song with a youtube_url
+        owner: Job id to pin the downloaded file to, so quota eviction
+            leaves it alone until the job releases its pins
+        deadline: Request deadline; the song is "timed_out" if it runs out
+        quality: Quality profile to download (server default if None)
+    """
+    payload = {
+        "youtube_url": song.youtube_url,
+        "title": song.title,
+        "artist": song.artist,
+        "quality": quality
+    }
+    try:
+        result = task_queue.run(
+            "download", payload, deadline,
+            priority=scheduler.current_priority(), cost=_download_cost(song)
+        )
+    except DeadlineExceeded:
+        song.download_status = "timed_out"
+        return song
+    except RuntimeError as e:
+        print(f"❌ Download task failed: {e}")
+        song.download_status = "failed"
+        return song
+    
+    if result['success'] and task_queue.remote:
+        # Downloaded by a worker into the shared library; use this node's path to it
+        local_path = locate(mp3_downloader.download_path, result['artifact'])
+        if local_path is None:
+            print(f"❌ {result['artifact']} isn't in this node's library; is it shared with the workers?")
+            result = {'success': False}
+        else:
+            result['file_path'] = str(local_path)
+    
+    if result['success']:
+        song.download_status = "completed"
+        song.file_path = result['file_path']
+        _track_download(song.file_path, owner)
+        if storage_manager.enforce_quota():
+            prune_hls_packages()
+        if HLS_PACKAGING == "eager" and _hls_enabled():
+            hls_packager.submit(Path(song.file_path))
+    elif result.get('too_long'):
+        song.download_status = "too_long"
+    else:
+        song.download_status = "timed_out" if result.get('timed_out') else "failed"
+    return song
+
+
+def _track_download(file_path: str, owner: Optional[str]):
+    """Record a song's library file as recently used and pin it to its job"""
+    filename = Path(file_path).name
+    storage_manager.record_access(filename)
+    if owner:
+        storage_manager.pin(filename, owner)
+    if FINGERPRINT_ENABLED and fingerprint_service.available:
+        fingerprint_service.submit_new_download(file_path)
+
+
+def import_song(song: Song, job_id: str) -> Song:
+    """Library lookup, search and download for one song of a bulk import"""
+    if find_in_library(song):
+        _track_download(song.file_path, job_id)
+        return song
+    
+    # Imports only get the capacity interactive and list requests leave idle
+    deadline = Deadline(IMPORT_ITEM_TIMEOUT)
+    client = f"import:{job_id}"
+    if not song.youtube_url:
+        scheduled_resolve(song, deadline, BULK, client)
+    if song.youtube_url and song.download_status not in FINAL_STATUSES:
+        scheduled_download(song, job_id, deadline, BULK, client)
+    return song
+
+
+playlist_importer = PlaylistImporter(
+    shared_store, import_song, on_finished=storage_manager.release, track_run=profiler.track_job
+)
+
+
+def _library_file(filename: str) -> Path:
+    """
+    Path of a library file, following aliases left by duplicate merging.
+    Resolved from the name alone (see library_path); nothing is scanned.
+    """
+    root = mp3_downloader.download_path
+    file_path = locate(root, filename)
+    if not file_path:
+        alias = shared_store.cache_get("alias", Path(filename).stem)
+        if alias:
+            file_path = locate(root, alias)
+    return file_path or library_path(root, filename)
+
+
+def _stream_event(event: str, **fields) -> str:
+    """Encode one NDJSON event line"""
+    return json.dumps({"event": event, **fields}) + "\n"
 
 
 @app.get("/")
@@ -42,21 +554,37 @@ async def root():
             "extract_songs": "/api/extract-songs",
             "search_youtube": "/api/search-youtube",
             "download_songs": "/api/download-songs",
-            "download_file": "/api/download-file/{filename}"
+            "process_songs_stream": "/api/process-songs/stream",
+            "import": "/api/import",
+            "jobs": "/api/jobs",
+            "warmup": "/api/warmup",
+            "storage": "/api/storage",
+            "rate_limit": "/api/rate-limit",
+            "scheduler": "/api/scheduler",
+            "download_backends": "/api/download-backends",
+            "library_search": "/api/library/search?q=",
+            "download_file": "/api/download-file/{filename}",
+            "hls": "/api/hls/{filename}",
+            "event_loop": "/api/debug/event-loop",
+            "metrics": "/api/metrics"
         }
     }
 
 
 @app.post("/api/extract-songs", response_model=SongExtractionResponse)
-async def extract_songs(request: QueryRequest):
+def extract_songs(request: QueryRequest):
     """
     Extract song information from natural language query using GPT-4
     Detects if user wants to list or download songs
+    
+    A plain def: the LLM call blocks, so it runs in the threadpool instead
+    of stalling the event loop
     """
+    deadline = Deadline.for_request(request.timeout)
     try:
         print(f"\n📝 Received query: {request.query}")
         
-        result = song_extraction_agent.extract_songs(request.query)
+        result = song_extraction_agent.extract_songs(request.query, deadline)
         
         print(f"✅ Extraction result: intent={result.get('intent')}, songs={len(result.get('songs', []))}")
         
@@ -79,6 +607,9 @@ async def extract_songs(request: QueryRequest):
             suggestion=suggestion
         )
         
+    except DeadlineExceeded as e:
+        print(f"⏱️ {e}")
+        raise HTTPException(status_code=504, detail="Song extraction timed out, please try again")
     except Exception as e:
         import traceback
         print(f"❌ Error in extract_songs endpoint: {e}")
@@ -87,34 +618,43 @@ async def extract_songs(request: QueryRequest):
 
 
 @app.post("/api/search-youtube")
-async def search_youtube(songs: List[Song]):
+def search_youtube(
+    songs: List[Song],
+    http_request: Request,
+    timeout: Optional[float] = None,
+    quality: Optional[Literal["preview", "standard", "best"]] = None
+):
     """
     Search YouTube for each song and return URLs
+    
+    Songs not resolved before the deadline (?timeout=, capped by
+    REQUEST_DEADLINE_SECONDS) come back with status "timed_out".
+    Only library files of the ?quality= profile (the server default if
+    omitted) save a search, so pass the quality the songs will be
+    downloaded at: songs without a URL can't be downloaded later.
     """
+    deadline = Deadline.for_request(timeout)
+    priority, client = _priority(songs), _client_id(http_request)
     try:
         results = []
-        
         for song in songs:
-            print(f"\n=== Processing song: {song.title} by {song.artist} ===")
-            
-            # Generate optimized search query using GPT-3.5
-            search_query = download_agent.generate_search_query(song)
-            print(f"Generated search query: {search_query}")
-            
-            # Search YouTube
-            video_url = youtube_service.search_video(search_query)
-            print(f"Video URL found: {video_url}")
-            
-            song.youtube_url = video_url
-            song.download_status = "ready" if video_url else "not_found"
-            
-            results.append(song)
+            if find_in_library(song, quality):
+                results.append(song)
+            elif deadline.expired:
+                song.download_status = "timed_out"
+                results.append(song)
+            else:
+                results.append(scheduled_resolve(song, deadline, priority, client))
         
-        success_count = sum(1 for s in results if s.youtube_url)
+        success_count = sum(1 for s in results if s.youtube_url or s.download_status == "completed")
+        timed_out = sum(1 for s in results if s.download_status == "timed_out")
         
+        message = f"Found YouTube links for {success_count}/{len(results)} song(s)"
+        if timed_out:
+            message += f" ({timed_out} timed out)"
         return {
             "songs": results,
-            "message": f"Found YouTube links for {success_count}/{len(results)} song(s)"
+            "message": message
         }
         
     except Exception as e:
@@ -125,50 +665,49 @@ async def search_youtube(songs: List[Song]):
 
 
 @app.post("/api/download-songs", response_model=DownloadResponse)
-async def download_songs(request: DownloadRequest):
+def download_songs(request: DownloadRequest, http_request: Request):
     """
     Download songs as MP3 files
     """
+    deadline = Deadline.for_request(request.timeout)
+    priority, client = _priority(request.songs), _client_id(http_request)
     try:
-        songs_data = [
-            {
-                'youtube_url': song.youtube_url,
-                'title': song.title,
-                'artist': song.artist
-            }
-            for song in request.songs
-            if song.youtube_url
-        ]
-        
-        if not songs_data:
-            return DownloadResponse(
-                songs=request.songs,
-                success_count=0,
-                failed_count=len(request.songs),
-                message="No valid YouTube URLs to download"
-            )
+        batch_id = uuid.uuid4().hex
         
-        # Download all songs
-        download_results = mp3_downloader.download_batch(songs_data)
-        
-        # Update song objects with results
-        updated_songs = []
-        success_count = 0
-        failed_count = 0
-        
-        for song, result in zip(request.songs, download_results):
-            if result['success']:
-                song.download_status = "completed"
-                song.file_path = result['file_path']
-                success_count += 1
-            else:
-                song.download_status = "failed"
-                failed_count += 1
+        with profiler.track_job(batch_id, "batch"):
+            # Songs already in the library (by fuzzy match) need no download
+            to_download = []
+            for song in request.songs:
+                if find_in_library(song, request.quality):
+                    _track_download(song.file_path, batch_id)
+                elif is_too_long(song.duration):
+                    song.download_status = "too_long"
+                elif song.youtube_url:
+                    to_download.append(song)
+                else:
+                    song.download_status = "failed"
             
-            updated_songs.append(song)
+            if not to_download and not any(s.download_status == "completed" for s in request.songs):
+                return DownloadResponse(
+                    songs=request.songs,
+                    success_count=0,
+                    failed_count=len(request.songs),
+                    message="No valid YouTube URLs to download"
+                )
+            
+            # Download all songs, shortest first
+            batch = dict(enumerate(to_download))
+            for _ in scheduled_downloads(batch, batch_id, deadline, priority, client, request.quality):
+                pass
+            
+            storage_manager.enforce_quota()
+            storage_manager.release(batch_id)
+        
+        success_count = sum(1 for s in request.songs if s.download_status == "completed")
+        failed_count = len(request.songs) - success_count
         
         return DownloadResponse(
-            songs=updated_songs,
+            songs=request.songs,
             success_count=success_count,
             failed_count=failed_count,
             message=f"Downloaded {success_count} song(s), {failed_count} failed"
@@ -178,36 +717,466 @@ async def download_songs(request: DownloadRequest):
         raise HTTPException(status_code=500, detail=f"Error downloading songs: {str(e)}")
 
 
+def register_stream_source(song: Song, quality: Optional[str] = None) -> str:
+    """
+    Remember which video a resolved song's library file comes from, so the
+    song can later be played by name in proxy mode before it's downloaded
+    
+    Returns:
+        The file name (without extension) to play it by
+    """
+    quality = quality or DEFAULT_QUALITY
+    stem = mp3_downloader.variant_name(song.artist, song.title, quality)
+    shared_store.cache_set(
+        "source", stem, {"song": song.model_dump(), "quality": quality}, ttl=RESOLVE_CACHE_TTL
+    )
+    return stem
+
+
+def fill_cache(job_id: str, song: Song, quality: str) -> Song:
+    """
+    Download a song for a proxy-mode cache fill, as a job of its own: the
+    file is pinned to the job until the fill ends, like any job's downloads
+    """
+    status = "failed"
+    try:
+        with profiler.track_job(job_id, "fill"):
+            download_song(song, job_id, Deadline(CACHE_FILL_TIMEOUT or None), quality)
+        status = song.download_status
+        return song
+    finally:
+        storage_manager.release(job_id)
+        shared_store.update_job(job_id, status=status, result={"file_path": song.file_path})
+
+
+def start_cache_fill(stem: str, client: str) -> bool:
+    """
+    Start downloading a registered song into the library in the background.
+    The fill is not tied to the listener: it completes even if they leave
+    (within CACHE_FILL_TIMEOUT), and a fill that fails part-way resumes from
+    its .part file next time.
+    
+    Returns:
+        False if no source is known for this name
+    """
+    source = shared_store.cache_get("source", stem)
+    if not source:
+        return False
+    if mp3_downloader.partial_download(stem):
+        return True  # already filling
+    
+    song = Song(**source["song"])
+    print(f"   🔀 Proxy mode: filling {stem} from {song.youtube_url}")
+    job_id = uuid.uuid4().hex
+    shared_store.register_job(job_id, "fill", payload={"stem": stem})
+    # Someone is waiting to hear it, so it goes ahead of list/bulk work;
+    # concurrent fills of the same song share one download
+    scheduler.submit(
+        fill_cache, job_id, song, source["quality"],
+        priority=INTERACTIVE, client=client
+    )
+    return True
+
+
+@app.post("/api/process-songs/stream")
+async def process_songs_stream(request: DownloadRequest, http_request: Request):
+    """
+    Search for and download songs, streaming NDJSON events so the client
+    can show each song as soon as it resolves and as soon as it finishes
+    (completion order may differ from the list):
+    
+        {"event": "started", "job_id": "..."}
+        {"event": "resolved", "index": 0, "song": {...}, "stream_file": "..."}
+        ...
+        {"event": "completed", "index": 0, "song": {...}}
+        ...
+        {"event": "done", "success_count": 1, "failed_count": 0, "timed_out_count": 0, "deferred_count": 0}
+    
+    Once the deadline (request "timeout", capped by REQUEST_DEADLINE_SECONDS)
+    runs out, the remaining songs are reported as "timed_out" right away.
+    Songs over MAX_SONG_DURATION are reported as "too_long" and never fetched.
+    Songs about to be downloaded carry a "stream_file" name that can be
+    played with /api/stream-file/{stream_file}?follow=true (or ?proxy=true)
+    before they finish.
+    
+    Songs are searched concurrently and each download is queued as soon as
+    its song resolves (queued downloads run shortest first).
+    
+    With "lazy": true (browsing a list) only the first LIST_PREFETCH songs
+    to resolve are downloaded; the rest stop at "resolved" (status "ready")
+    and are fetched when played or downloaded with ?proxy=true.
+    """
+    deadline = Deadline.for_request(request.timeout)
+    priority, client = _priority(request.songs), _client_id(http_request)
+    job_id = uuid.uuid4().hex
+    shared_store.register_job(job_id, "stream", payload={"total": len(request.songs)})
+    
+    def event_stream():
+        processed = 0
+        success_count = 0
+        deferred = 0
+        status = "cancelled"
+        
+        def record_progress():
+            # Deferred songs (lazy) are left for later: the job is complete
+            # once processed + deferred == total
+            shared_store.update_job(job_id, result={
+                "processed": processed,
+                "deferred": deferred,
+                "total": len(request.songs),
+                "success_count": success_count
+            })
+        
+        def finished(index, song):
+            nonlocal processed, success_count
+            processed += 1
+            if song.download_status == "completed":
+                success_count += 1
+            record_progress()
+            return _stream_event("completed", index=index, song=song.model_dump())
+        
+        try:
+            yield _stream_event("started", job_id=job_id)
+            
+            with profiler.track_job(job_id, "stream"):
+                # 1. Songs that need no search or download finish here
+                to_process = {}
+                for index, song in enumerate(request.songs):
+                    try:
+                        if find_in_library(song, request.quality):
+                            _track_download(song.file_path, job_id)
+                        elif deadline.expired:
+                            song.download_status = "timed_out"
+                        elif song.youtube_url and is_too_long(song.duration):
+                            song.download_status = "too_long"
+                        elif not song.youtube_url or song.download_status not in FINAL_STATUSES:
+                            to_process[index] = song
+                            continue
+                    except Exception as e:
+                        print(f"❌ Error processing {song.title}: {e}")
+                        song.download_status = "failed"
+                    yield _stream_event("resolved", index=index, song=song.model_dump())
+                    yield finished(index, song)
+                
+                # 2. Search the rest concurrently; each download is queued as soon
+                # as its song resolves (shortest first among those queued)
+                prefetch = LIST_PREFETCH if request.lazy else None
+                pipeline = scheduled_pipeline(to_process, job_id, deadline, priority, client, request.quality, prefetch)
+                for event, index, song in pipeline:
+                    if event == "completed":
+                        yield finished(index, song)
+                    elif event == "deferred":
+                        deferred += 1
+                        record_progress()
+                    elif song.youtube_url and song.download_status not in FINAL_STATUSES:
+                        # Playable (via ?follow=true or ?proxy=true) before it's downloaded
+                        stream_name = register_stream_source(song, request.quality)
+                        yield _stream_event("resolved", index=index, song=song.model_dump(), stream_file=stream_name)
+                    else:
+                        yield _stream_event("resolved", index=index, song=song.model_dump())
+            
+            status = "completed"
+            yield _stream_event(
+                "done",
+                success_count=success_count,
+                failed_count=len(request.songs) - success_count - deferred,
+                timed_out_count=sum(1 for s in request.songs if s.download_status == "timed_out"),
+                deferred_count=deferred
+            )
+        finally:
+            # Client disconnects close the generator early; record that too
+            shared_store.update_job(job_id, status=status)
+            storage_manager.release(job_id)
+    
+    # A sync generator is iterated in the threadpool, so the blocking
+    # search/download calls don't stall the event loop
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/api/import")
+def import_playlist(request: ImportRequest):
+    """
+    Start a bulk import of a playlist export (CSV, M3U or "Artist - Title"
+    lines). Songs are searched and downloaded in the background; poll
+    /api/import/{job_id} for progress.
+    """
+    try:
+        songs, duplicates = parse_playlist(request.content, request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not songs:
+        raise HTTPException(status_code=400, detail="No songs found in the playlist")
+    
+    try:
+        job_id = playlist_importer.start(songs, source=request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    return {"job_id": job_id, "total": len(songs), "duplicates": duplicates}
+
+
+@app.get("/api/import/{job_id}")
+async def import_progress(job_id: str, items: bool = False):
+    """
+    Progress and throughput of a bulk import (with per-song results if ?items=true)
+    """
+    progress = playlist_importer.progress(job_id, include_items=items)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return progress
+
+
+@app.post("/api/import/{job_id}/resume")
+def resume_import(job_id: str, retry_failed: bool = False):
+    """
+    Resume an interrupted import from its last checkpoint; with
+    ?retry_failed=true songs that failed or weren't found are tried again
+    """
+    try:
+        queued = playlist_importer.resume(job_id, retry_failed=retry_failed)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Import not found")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"job_id": job_id, "queued": queued}
+
+
+@app.post("/api/warmup")
+def warmup():
+    """
+    Explicitly initialize LLM clients and download libraries (e.g. from a
+    readiness probe) so the first real request doesn't pay for it
+    """
+    return {"status": "warm", "timings": warm_up()}
+
+
+@app.get("/api/jobs")
+async def list_jobs(status: Optional[str] = None):
+    """
+    List recent jobs from the shared registry (across all workers)
+    """
+    return {"jobs": shared_store.list_jobs(status=status)}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get a job's status and progress
+    """
+    job = shared_store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# Media type per audio extension
+AUDIO_MEDIA_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.webm': 'audio/webm',
+    '.opus': 'audio/opus',
+    '.ogg': 'audio/ogg',
+}
+
+# Tail-follow streaming: how long to wait for a queued download to start
+# writing, and for a stalled one to write more, before giving up (seconds)
+FOLLOW_START_TIMEOUT = float(os.getenv("FOLLOW_START_TIMEOUT", "60"))
+FOLLOW_IDLE_TIMEOUT = float(os.getenv("FOLLOW_IDLE_TIMEOUT", "30"))
+FOLLOW_POLL_INTERVAL = 0.25
+
+# Let the reverse proxy send finished library files: "x-accel" (nginx
+# X-Accel-Redirect) or "x-sendfile" (Apache/lighttpd); empty serves them
+# from Python. Lookup, access tracking and headers stay in the app.
+FILE_OFFLOAD = os.getenv("FILE_OFFLOAD", "").lower()
+if FILE_OFFLOAD not in ("", "x-accel", "x-sendfile"):
+    print(f"⚠️ Unknown FILE_OFFLOAD '{FILE_OFFLOAD}'; serving files from Python")
+    FILE_OFFLOAD = ""
+
+# nginx internal location that maps to the downloads directory (x-accel only)
+FILE_OFFLOAD_PREFIX = os.getenv("FILE_OFFLOAD_PREFIX", "/_library/")
+
+
+def _offload_response(file_path: Path, media_type: str, headers: dict) -> Optional[Response]:
+    """
+    Empty response telling the reverse proxy which file to send (it handles
+    ranges and conditional requests), or None when offload is off
+    """
+    if not FILE_OFFLOAD:
+        return None
+    
+    if FILE_OFFLOAD == "x-accel":
+        relative = file_path.resolve().relative_to(mp3_downloader.download_path.resolve())
+        target = {"X-Accel-Redirect": FILE_OFFLOAD_PREFIX.rstrip("/") + "/" + quote(relative.as_posix())}
+    else:
+        target = {"X-Sendfile": str(file_path.resolve())}
+    return Response(media_type=media_type, headers={**headers, **target})
+
+
+def _audio_stem(filename: str) -> str:
+    """Library file name without its audio extension (the name may have none)"""
+    path = Path(filename)
+    return path.stem if path.suffix.lower() in AUDIO_EXTENSIONS else filename
+
+
+async def _wait_for_download(stem: str):
+    """
+    Wait until the song's file exists or its download starts writing
+    
+    Returns:
+        (path, still_downloading), or (None, False) on timeout
+    """
+    waited = 0.0
+    while True:
+        existing = mp3_downloader.find_existing(stem)
+        if existing:
+            return existing, False
+        part = mp3_downloader.partial_download(stem)
+        if part and part.exists():
+            return part, True
+        if waited >= FOLLOW_START_TIMEOUT:
+            return None, False
+        await asyncio.sleep(FOLLOW_POLL_INTERVAL)
+        waited += FOLLOW_POLL_INTERVAL
+
+
+async def _open_download(stem: str, part_path: Path):
+    """
+    Open a download found in progress. Its .part file may be gone by now
+    (renamed when the download finished, or not yet recreated by a retry);
+    then open the finished file, or wait for the download to write again.
+    
+    Returns:
+        An open binary file, or None if nothing turned up in time
+    """
+    path = part_path
+    while True:
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            path, _ = await _wait_for_download(stem)
+            if path is None:
+                return None
+
+
+async def _follow_download(stem: str, part_path: Path):
+    """
+    Stream a file that is still being downloaded: send what's on disk, then
+    keep sending as the downloader appends, until the download ends.
+    
+    yt-dlp renames the .part file when it finishes; the open handle keeps
+    reading the same (now complete) file, so nothing is lost. If it was
+    renamed before it could be opened, the finished file is sent instead.
+    """
+    part = await _open_download(stem, part_path)
+    if part is None:
+        print(f"   ⚠️ Download of {stem} disappeared; ending stream")
+        return
+    idle = 0.0
+    with part:
+        while True:
+            chunk = part.read(64 * 1024)
+            if chunk:
+                idle = 0.0
+                yield chunk
+                continue
+            
+            if mp3_downloader.partial_download(stem) is None:
+                # Finished (or failed): drain whatever was written last
+                while chunk := part.read(64 * 1024):
+                    yield chunk
+                return
+            if idle >= FOLLOW_IDLE_TIMEOUT:
+                print(f"   ⚠️ Download of {stem} stalled; ending stream")
+                return
+            await asyncio.sleep(FOLLOW_POLL_INTERVAL)
+            idle += FOLLOW_POLL_INTERVAL
+
+
+async def _locate_audio(filename: str, http_request: Request, follow: bool, proxy: bool):
+    """
+    Find the library file to serve, waiting for (proxy: also starting) its
+    download when asked to
+    
+    Returns:
+        (path, stem), stem set only if the path is a .part still being written
+    """
+    file_path = _library_file(filename)
+    
+    # Windows can't rename a file that is open, so following would break
+    # the download there
+    if file_path.exists() or not (follow or proxy) or os.name == "nt":
+        return file_path, None
+    
+    stem = _audio_stem(filename)
+    if proxy and not mp3_downloader.find_existing(stem):
+        if not start_cache_fill(stem, _client_id(http_request)):
+            print(f"   ❌ No source known for {stem}")
+            raise HTTPException(status_code=404, detail="Song not resolved")
+    found, downloading = await _wait_for_download(stem)
+    if not found:
+        return file_path, None
+    return found, stem if downloading else None
+
+
 @app.get("/api/stream-file/{filename}")
-async def stream_file(filename: str):
+async def stream_file(
+    filename: str,
+    http_request: Request,
+    follow: bool = False,
+    proxy: bool = False
+):
     """
     Stream audio file for in-browser playback
+    
+    With ?follow=true the song may still be downloading (or about to start):
+    the response starts with the bytes written so far and follows the file
+    as it grows, so playback can begin right away. The file extension may
+    be omitted in that case.
+    
+    ?proxy=true also works for songs that were resolved but never queued for
+    download: the audio is fetched from YouTube into the library as it is
+    played, so the first listen starts right away and later ones are served
+    from the library.
     """
     from fastapi.responses import StreamingResponse
     
-    file_path = Path("downloads") / filename
-    
     print(f"\n🎵 Stream request: {filename}")
+    file_path, stem = await _locate_audio(filename, http_request, follow, proxy)
     print(f"   Path: {file_path}")
     print(f"   Exists: {file_path.exists()}")
     
-    if not file_path.exists():
+    # A .part may be renamed any moment; _follow_download copes with that
+    if not stem and not file_path.exists():
         print(f"   ❌ File not found!")
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Determine media type based on extension
-    ext = file_path.suffix.lower()
-    media_types = {
-        '.mp3': 'audio/mpeg',
-        '.m4a': 'audio/mp4',
-        '.webm': 'audio/webm',
-        '.opus': 'audio/opus',
-        '.ogg': 'audio/ogg',
-    }
+    # Determine media type based on extension (of "x.m4a" for "x.m4a.part")
+    audio_path = file_path.with_suffix("") if stem else file_path
+    media_type = AUDIO_MEDIA_TYPES.get(audio_path.suffix.lower(), 'audio/mpeg')
     
-    media_type = media_types.get(ext, 'audio/mpeg')
+    print(f"   📄 Type: {media_type}{' (following download)' if stem else ''}")
     
-    print(f"   📄 Type: {media_type}")
+    if stem:
+        return StreamingResponse(
+            _follow_download(stem, file_path),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f'inline; filename="{audio_path.name}"',
+                "Cache-Control": "no-store",
+                "Access-Control-Allow-Origin": "*"
+            }
+        )
+    
+    storage_manager.record_access(file_path.name)
+    
+    offloaded = _offload_response(file_path, media_type, {
+        "Content-Disposition": f'inline; filename="{file_path.name}"',
+        "Cache-Control": "public, max-age=3600",
+        "Access-Control-Allow-Origin": "*"
+    })
+    if offloaded:
+        return offloaded
     
     # Stream for playback (inline)
     def iterfile():
@@ -218,7 +1187,7 @@ async def stream_file(filename: str):
         iterfile(),
         media_type=media_type,
         headers={
-            "Content-Disposition": f'inline; filename="{filename}"',
+            "Content-Disposition": f'inline; filename="{file_path.name}"',
             "Accept-Ranges": "bytes",
             "Cache-Control": "public, max-age=3600",
             "Access-Control-Allow-Origin": "*"
@@ -227,65 +1196,278 @@ async def stream_file(filename: str):
 
 
 @app.get("/api/download-file/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, http_request: Request, proxy: bool = False):
     """
     Download audio file (forces download, not playback)
+    
+    ?proxy=true fetches a resolved song that isn't in the library yet (see
+    /api/stream-file) and sends it as it arrives.
     """
-    file_path = Path("downloads") / filename
+    from fastapi.responses import StreamingResponse
     
     print(f"\n⬇️ Download request: {filename}")
+    file_path, stem = await _locate_audio(filename, http_request, False, proxy)
     print(f"   Path: {file_path}")
     print(f"   Exists: {file_path.exists()}")
     
-    if not file_path.exists():
+    if not stem and not file_path.exists():
         print(f"   ❌ File not found!")
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Determine media type based on extension
-    ext = file_path.suffix.lower()
-    media_types = {
-        '.mp3': 'audio/mpeg',
-        '.m4a': 'audio/mp4',
-        '.webm': 'audio/webm',
-        '.opus': 'audio/opus',
-        '.ogg': 'audio/ogg',
-    }
+    if stem:
+        audio_path = file_path.with_suffix("")
+        return StreamingResponse(
+            _follow_download(stem, file_path),
+            media_type=AUDIO_MEDIA_TYPES.get(audio_path.suffix.lower(), 'audio/mpeg'),
+            headers={
+                "Content-Disposition": f'attachment; filename="{audio_path.name}"',
+                "Access-Control-Allow-Origin": "*"
+            }
+        )
     
-    media_type = media_types.get(ext, 'audio/mpeg')
+    # Determine media type based on extension
+    media_type = AUDIO_MEDIA_TYPES.get(file_path.suffix.lower(), 'audio/mpeg')
     
     print(f"   📄 Type: {media_type}")
     print(f"   📦 Size: {file_path.stat().st_size / (1024*1024):.2f} MB")
+    storage_manager.record_access(file_path.name)
+    
+    # Proxy requests may name the song without its extension
+    download_name = filename if Path(filename).suffix.lower() in AUDIO_EXTENSIONS else file_path.name
+    
+    offloaded = _offload_response(file_path, media_type, {
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+        "Access-Control-Allow-Origin": "*"
+    })
+    if offloaded:
+        return offloaded
     
     # Force download with attachment header
     return FileResponse(
         path=file_path,
         media_type=media_type,
-        filename=filename,
+        filename=download_name,
         headers={
-            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Disposition": f'attachment; filename="{download_name}"',
             "Access-Control-Allow-Origin": "*"
         }
     )
 
 
-@app.get("/api/list-downloads")
-async def list_downloads():
+@app.get("/api/hls/{filename}")
+def hls_playlist(filename: str):
     """
-    List all downloaded MP3 files
+    HLS version of a library track (HLS_PACKAGING=lazy or eager)
+    
+    Redirects to the track's versioned playlist, whose playlist and segment
+    URLs never change content and can be cached by a CDN indefinitely.
+    Packages the track first if needed; answers 202 (retry shortly) if that
+    takes longer than HLS_WAIT_SECONDS.
     """
-    downloads_path = Path("downloads")
+    if not _hls_enabled():
+        raise HTTPException(status_code=404, detail="HLS packaging is disabled")
     
-    if not downloads_path.exists():
-        return {"files": []}
+    file_path = _library_file(filename)
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # Blocking wait; this endpoint runs in the threadpool
+    package = hls_packager.ensure(file_path, timeout=HLS_WAIT_SECONDS)
+    if not package:
+        return Response(status_code=202, headers={"Retry-After": "2", "Access-Control-Allow-Origin": "*"})
+    
+    storage_manager.record_access(file_path.name)
+    return RedirectResponse(
+        f"/api/hls/v/{package}/index.m3u8",
+        status_code=307,
+        headers={
+            # Short: the track may be replaced, giving a new package
+            "Cache-Control": "public, max-age=60",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+
+@app.get("/api/hls/v/{package}/{name}")
+async def hls_file(package: str, name: str):
+    """Playlist, init segment or media segment of a packaged track (immutable)"""
+    file_path = hls_packager.file(package, name)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="File not found")
     
-    files = [
-        {
-            "filename": f.name,
-            "size": f.stat().st_size,
-            "modified": f.stat().st_mtime
+    media_type = "application/vnd.apple.mpegurl" if name.endswith(".m3u8") else "audio/mp4"
+    return FileResponse(
+        path=file_path,
+        media_type=media_type,
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Access-Control-Allow-Origin": "*"
         }
-        for f in downloads_path.glob("*.mp3")
-    ]
+    )
+
+
+@app.get("/api/library/search")
+async def search_library(q: str, limit: int = 10):
+    """
+    Typo-tolerant search over the downloaded library, ranked by similarity
+    """
+    return {"query": q, "results": library_index.search(q, limit=limit)}
+
+
+@app.get("/api/rate-limit")
+async def rate_limit_stats():
+    """
+    Current state of the adaptive YouTube rate limiter (shared by all workers)
+    """
+    return youtube_rate_limiter.stats()
+
+
+@app.get("/api/scheduler")
+async def scheduler_stats():
+    """
+    Queue depth, running tasks and queue-wait percentiles per priority class,
+    plus the yt-dlp worker processes and task queue backend the tasks run on
+    """
+    return {**scheduler.stats(), "ytdlp_pool": ytdlp_pool.stats(), "task_queue": task_queue.stats()}
+
+
+@app.get("/api/debug/event-loop")
+async def event_loop_stats(since: int = 0):
+    """
+    Event-loop lag in this worker and recent stalls, each with the request
+    and stack that blocked the loop. Pass the last stall id seen as `since`
+    to get only newer stalls.
+    """
+    return loop_monitor.stats(since)
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """
+    Event-loop lag and stall metrics of this worker, in Prometheus text format
+    """
+    return Response(loop_monitor.metrics(), media_type="text/plain; version=0.0.4")
+
+
+def _require_admin(http_request: Request):
+    """Admin endpoints exist only when ADMIN_TOKEN is set, and need it in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = http_request.headers.get("x-admin-token", "")
+    if not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _profile_session(profile_id: int):
+    session = profiler.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return session
+
+
+@app.post("/api/admin/profile")
+async def start_profile(
+    http_request: Request,
+    seconds: Optional[float] = None,
+    requests: Optional[int] = None,
+    tracemalloc: bool = False,
+    job: Optional[str] = None
+):
+    """
+    Start sampling every thread's stack in this worker, for `seconds` or
+    until `requests` more requests have finished (10 seconds if neither is
+    given). With `tracemalloc`, also report for each job (download batch,
+    stream, import or cache fill) started during the run which allocation
+    sites grew while it ran; with `job` too, only for that job id (e.g. an
+    import about to be resumed). Admin only.
+    """
+    _require_admin(http_request)
+    if seconds is None and requests is None:
+        seconds = 10
+    if (seconds is not None and seconds <= 0) or (requests is not None and requests <= 0):
+        raise HTTPException(status_code=400, detail="seconds and requests must be positive")
+    try:
+        session = profiler.start(seconds=seconds, requests=requests, trace_memory=tracemalloc, job=job)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        **session.summary(),
+        "status_url": f"/api/admin/profile/{session.id}",
+        "flamegraph_url": f"/api/admin/profile/{session.id}/collapsed",
+    }
+
+
+@app.post("/api/admin/profile/stop")
+async def stop_profile(http_request: Request):
+    """End the running profile now. Admin only."""
+    _require_admin(http_request)
+    session = profiler.stop()
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profile is running")
+    return {"id": session.id, "status": "stopping"}
+
+
+@app.get("/api/admin/profile/{profile_id}")
+async def profile_summary(profile_id: int, http_request: Request):
+    """
+    Status of a profile, the functions most samples were in and, if memory
+    was traced, the allocation sites that grew the most during each job.
+    Admin only.
+    """
+    _require_admin(http_request)
+    return _profile_session(profile_id).summary()
+
+
+@app.get("/api/admin/profile/{profile_id}/collapsed")
+async def profile_collapsed(profile_id: int, http_request: Request, idle: bool = False):
+    """
+    A profile's samples as collapsed stacks, one "thread;outer;...;inner
+    count" line each, for flamegraph.pl, speedscope or inferno. Threads that
+    were just waiting are left out unless `idle` is set. Admin only.
+    """
+    _require_admin(http_request)
+    session = _profile_session(profile_id)
+    if session.running:
+        raise HTTPException(status_code=409, detail="Profile still running", headers={"Retry-After": "1"})
+    return Response(session.collapsed(include_idle=idle), media_type="text/plain")
+
+
+@app.get("/api/download-backends")
+async def download_backends():
+    """
+    Circuit breaker state and recent health of each download backend
+    """
+    return mp3_downloader.breakers.stats()
+
+
+@app.get("/api/storage")
+async def storage_usage():
+    """
+    Library disk usage and configured quotas
+    """
+    return storage_manager.usage()
+
+
+@app.get("/api/list-downloads")
+async def list_downloads():
+    """
+    List all downloaded MP3 files
+    """
+    # From the library index, which already knows where every file lives
+    files = []
+    for entry in library_index.files():
+        path = Path(entry["path"])
+        if path.suffix.lower() != ".mp3":
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue  # evicted since the index was built
+        files.append({
+            "filename": entry["filename"],
+            "size": stat.st_size,
+            "modified": stat.st_mtime
+        })
     
     return {"files": files}
 
@@ -0,0 +1,93 @@
+"""
+Move a flat audio library (every file directly in downloads/) into the
+sharded layout (downloads/<shard>/<file>, see downloader.library_path).
+
+Safe to re-run and to run while the server is up: each file is hard-linked
+into its shard (which fails rather than overwrite a file that appears there
+meanwhile) before the flat copy is unlinked, and lookups fall back to the
+flat layout for files that haven't moved yet. File names don't change, so
+access times, pins, aliases and fingerprints stay valid; each move is logged
+to the shared store (COORDINATION_DIR) so running workers update their
+library index.
+
+Usage (from the backend directory):
+    python migrate_library.py --dry-run
+    python migrate_library.py
+"""
+import argparse
+import os
+from pathlib import Path
+from typing import Optional
+
+from coordination import SharedStore
+from downloader import AUDIO_EXTENSIONS, library_changed, library_path
+
+
+def migrate(root: Path, dry_run: bool = False, store: Optional[SharedStore] = None) -> dict:
+    """
+    Move every flat library file into its shard
+
+    Args:
+        root: Library root (the downloads directory)
+        dry_run: Only print what would be moved
+        store: Shared store to log the moves to
+
+    Returns:
+        Counts of files moved, skipped (a file of that name is already in
+        the shard) and failed
+    """
+    root = Path(root)
+    counts = {"moved": 0, "skipped": 0, "failed": 0}
+    if not root.exists():
+        return counts
+
+    for f in sorted(root.iterdir()):
+        if not f.is_file() or f.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
+
+        target = library_path(root, f.name, create=not dry_run)
+        if target.exists():
+            print(f"   ⏭️ {f.name}: already in {target.parent.name}/")
+            counts["skipped"] += 1
+            continue
+        if dry_run:
+            print(f"   {f.name} -> {target.parent.name}/")
+            counts["moved"] += 1
+            continue
+
+        try:
+            # Unlike a rename, linking never replaces a file that appeared
+            # in the shard since the check above
+            os.link(f, target)
+        except FileExistsError:
+            print(f"   ⏭️ {f.name}: already in {target.parent.name}/")
+            counts["skipped"] += 1
+            continue
+        except OSError as e:
+            print(f"   ⚠️ Could not move {f.name}: {e}")
+            counts["failed"] += 1
+            continue
+
+        try:
+            f.unlink()
+        except FileNotFoundError:
+            pass
+        library_changed(store, f.name)
+        counts["moved"] += 1
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move a flat audio library into the sharded layout")
+    parser.add_argument("--downloads", default="downloads")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would be moved")
+    args = parser.parse_args()
+
+    print(f"📦 Migrating {args.downloads} to the sharded layout{' (dry run)' if args.dry_run else ''}")
+    result = migrate(Path(args.downloads), dry_run=args.dry_run, store=None if args.dry_run else SharedStore())
+    print(f"✅ Moved {result['moved']}, skipped {result['skipped']}, failed {result['failed']}")
+
+
+if __name__ == "__main__":
+    main()
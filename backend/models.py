@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 class Song(BaseModel):
     """Model for individual song"""
@@ -8,6 +8,7 @@ class Song(BaseModel):
     title: str = Field(description="Song title")
     artist: str = Field(description="Artist name")
     youtube_url: Optional[str] = None
+    duration: Optional[float] = Field(default=None, description="Length in seconds, from the YouTube search")
     download_status: Optional[str] = "pending"
     file_path: Optional[str] = None
 
@@ -16,6 +17,7 @@ class QueryRequest(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
     query: str = Field(description="Natural language query for songs")
+    timeout: Optional[float] = Field(default=None, description="Time budget in seconds for the whole request")
 
 class SongExtractionResponse(BaseModel):
     """Response model after extracting songs from query"""
@@ -31,6 +33,14 @@ class DownloadRequest(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
     songs: List[Song]
+    timeout: Optional[float] = Field(default=None, description="Time budget in seconds for the whole request")
+    quality: Optional[Literal["preview", "standard", "best"]] = Field(
+        default=None, description="Audio quality profile; the server default if omitted"
+    )
+    lazy: bool = Field(
+        default=False,
+        description="Download only the first LIST_PREFETCH songs; the rest on demand (stream endpoint)"
+    )
 
 class DownloadResponse(BaseModel):
     """Response model after download attempt"""
@@ -39,4 +49,11 @@ class DownloadResponse(BaseModel):
     songs: List[Song]
     success_count: int
     failed_count: int
-    message: str
\ No newline at end of file
+    message: str
+
+class ImportRequest(BaseModel):
+    """Request model for a bulk playlist import"""
+    model_config = ConfigDict(from_attributes=True)
+    
+    content: str = Field(description="Playlist as CSV, M3U or 'Artist - Title' lines")
+    format: Optional[str] = Field(default=None, description="'csv', 'm3u' or 'text'; detected if omitted")
\ No newline at end of file
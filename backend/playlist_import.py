@@ -0,0 +1,325 @@
+import csv
+import io
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from pathlib import PurePath
+from typing import Callable, ContextManager, List, Optional, Tuple
+
+from coordination import SharedStore
+from deadline import Deadline, DeadlineExceeded
+from models import Song
+
+# Songs searched/downloaded at the same time per import (the YouTube rate
+# limiter still paces the actual requests)
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+
+# Largest playlist accepted in one import
+IMPORT_MAX_ITEMS = int(os.getenv("IMPORT_MAX_ITEMS", "5000"))
+
+# An import whose job hasn't been updated for this long is considered dead
+# (its worker crashed or restarted) and may be resumed by any worker
+IMPORT_STALE_SECONDS = int(os.getenv("IMPORT_STALE_SECONDS", "600"))
+
+# Longest a resume waits for another worker resuming the same import (seconds)
+RESUME_LOCK_TIMEOUT = 10
+
+# Item states that are final; everything else is picked up again on resume
+DONE_STATES = ["completed", "failed", "not_found", "too_long"]
+
+# Column names (lowercased) recognised in CSV headers
+TITLE_COLUMNS = ("title", "track name", "track", "song", "name")
+ARTIST_COLUMNS = ("artist", "artist name(s)", "artist name", "artists")
+
+
+def _split_line(line: str) -> Optional[Tuple[str, str]]:
+    """Parse one "Artist - Title" line into (artist, title)"""
+    line = re.sub(r"^\d+[.)]\s+", "", line.strip())   # "12. Artist - Title"
+    if not line:
+        return None
+    for separator in (" - ", " – ", " — "):
+        artist, sep, title = line.partition(separator)
+        if sep and artist.strip() and title.strip():
+            return artist.strip(), title.strip()
+    return "", line
+
+
+def _parse_m3u(lines: List[str]) -> List[Tuple[str, str]]:
+    entries = []
+    pending_info = None
+    for line in lines:
+        line = line.strip()
+        if line.upper().startswith("#EXTINF"):
+            # "#EXTINF:215,Artist - Title"
+            pending_info = line.partition(",")[2]
+        elif not line or line.startswith("#"):
+            continue
+        else:
+            # The file path only names the song when there was no #EXTINF
+            name = pending_info or PurePath(line.replace("\\", "/")).stem
+            pending_info = None
+            entry = _split_line(name)
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+def _parse_csv(text: str) -> List[Tuple[str, str]]:
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    title_col = next((header.index(c) for c in TITLE_COLUMNS if c in header), None)
+    artist_col = next((header.index(c) for c in ARTIST_COLUMNS if c in header), None)
+
+    entries = []
+    if title_col is not None:
+        for row in rows[1:]:
+            title = row[title_col].strip() if title_col < len(row) else ""
+            artist = row[artist_col].strip() if artist_col is not None and artist_col < len(row) else ""
+            if title:
+                entries.append((artist, title))
+        return entries
+
+    # No header: "artist,title" rows, or a single "Artist - Title" column
+    for row in rows:
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if len(cells) >= 2:
+            entries.append((cells[0], cells[1]))
+        elif cells:
+            entry = _split_line(cells[0])
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+def detect_format(text: str) -> str:
+    """Guess "m3u", "csv" or "text" from the content"""
+    stripped = text.lstrip("\ufeff").lstrip()
+    if stripped.upper().startswith("#EXTM3U") or "#EXTINF" in stripped.upper():
+        return "m3u"
+    first_line = stripped.split("\n", 1)[0]
+    if "," in first_line and " - " not in first_line:
+        return "csv"
+    return "text"
+
+
+def parse_playlist(text: str, fmt: Optional[str] = None) -> Tuple[List[Song], int]:
+    """
+    Parse a playlist export into songs
+
+    Args:
+        text: CSV (with a title/artist header, or artist,title rows), M3U,
+            or plain "Artist - Title" lines
+        fmt: "csv", "m3u" or "text"; detected from the content if omitted
+
+    Returns:
+        (songs in playlist order, number of duplicate entries dropped)
+    """
+    text = text.lstrip("\ufeff")
+    fmt = (fmt or detect_format(text)).lower()
+
+    if fmt == "m3u":
+        entries = _parse_m3u(text.splitlines())
+    elif fmt == "csv":
+        entries = _parse_csv(text)
+    elif fmt == "text":
+        entries = [e for e in map(_split_line, text.splitlines()) if e and not e[1].startswith("#")]
+    else:
+        raise ValueError(f"Unknown playlist format: {fmt}")
+
+    songs, seen = [], set()
+    for artist, title in entries:
+        key = (" ".join(artist.lower().split()), " ".join(title.lower().split()))
+        if key in seen:
+            continue
+        seen.add(key)
+        songs.append(Song(title=title, artist=artist))
+    return songs, len(entries) - len(songs)
+
+
+class PlaylistImporter:
+    """
+    Runs bulk imports in the background.
+
+    Every song of an import is checkpointed in the shared store as it
+    finishes, so an import interrupted by a crash or restart can be resumed
+    (by any worker) and only the unfinished songs are processed again.
+    Songs run through `process_song` with bounded concurrency.
+    """
+
+    def __init__(
+        self,
+        store: SharedStore,
+        process_song: Callable[[Song, str], Song],
+        on_finished: Optional[Callable[[str], None]] = None,
+        concurrency: Optional[int] = None,
+        track_run: Optional[Callable[[str, str], ContextManager]] = None
+    ):
+        """
+        Args:
+            store: Shared store holding the job and its item checkpoints
+            process_song: Searches/downloads one song for a job id and
+                returns it with its final download_status
+            on_finished: Called with the job id when a run ends
+            concurrency: Songs in flight per import (IMPORT_CONCURRENCY)
+            track_run: Called with the job id and "import" to get a context
+                manager wrapping each run (e.g. a profiler's per-job tracking)
+        """
+        self.store = store
+        self.process_song = process_song
+        self.on_finished = on_finished
+        self.concurrency = concurrency or IMPORT_CONCURRENCY
+        self.track_run = track_run
+        self._lock = threading.Lock()
+        self._active = set()
+
+    def start(self, songs: List[Song], source: Optional[str] = None) -> str:
+        """Checkpoint a new import and start processing it; returns its job id"""
+        if len(songs) > IMPORT_MAX_ITEMS:
+            raise ValueError(f"Playlist has {len(songs)} songs; the limit is {IMPORT_MAX_ITEMS}")
+
+        job_id = uuid.uuid4().hex
+        self.store.register_job(job_id, "import", payload={"total": len(songs), "format": source})
+        self.store.add_import_items(job_id, songs)
+        self._launch(job_id, len(songs))
+        return job_id
+
+    def resume(self, job_id: str, retry_failed: bool = False) -> int:
+        """
+        Continue an interrupted import from its last checkpoint
+
+        Returns:
+            Number of songs queued again
+
+        Raises:
+            KeyError: unknown import
+            RuntimeError: the import is still running (or being resumed) somewhere
+        """
+        # Two workers resuming the same import at once must not both run it
+        try:
+            with self.store.download_lock(f"import:{job_id}", Deadline(RESUME_LOCK_TIMEOUT)):
+                return self._resume_locked(job_id, retry_failed)
+        except DeadlineExceeded:
+            raise RuntimeError("Import is being resumed elsewhere")
+
+    def _resume_locked(self, job_id: str, retry_failed: bool) -> int:
+        job = self.store.get_job(job_id)
+        if not job or job["kind"] != "import":
+            raise KeyError(job_id)
+        if self.is_running(job):
+            raise RuntimeError("Import is still running")
+
+        done = DONE_STATES if not retry_failed else ["completed"]
+        total = job["payload"]["total"]
+        remaining = total - sum(
+            n for status, n in self.store.import_counts(job_id).items() if status in done
+        )
+        if retry_failed:
+            for item in self.store.import_items(job_id, statuses=["failed", "not_found"]):
+                self.store.update_import_item(job_id, item["idx"], "pending")
+
+        self.store.update_job(job_id, status="running")
+        self._launch(job_id, total)
+        return remaining
+
+    def is_running(self, job: dict) -> bool:
+        """Running here, or running elsewhere and still updating its checkpoints"""
+        with self._lock:
+            if job["job_id"] in self._active:
+                return True
+        return job["status"] == "running" and time.time() - job["updated_at"] < IMPORT_STALE_SECONDS
+
+    def _launch(self, job_id: str, total: int):
+        with self._lock:
+            self._active.add(job_id)
+        threading.Thread(target=self._run, args=(job_id, total), daemon=True).start()
+
+    def _run(self, job_id: str, total: int):
+        items = [
+            item for item in self.store.import_items(job_id)
+            if item["status"] not in DONE_STATES
+        ]
+        run = {
+            "total": total,
+            "started_at": time.time(),
+            "done_at_start": total - len(items),
+            "finished_at": None,
+        }
+        self.store.update_job(job_id, result=run)
+        print(f"\n📥 Import {job_id}: {len(items)} of {total} song(s) to process")
+
+        status = "failed"
+        tracked = self.track_run(job_id, "import") if self.track_run else nullcontext()
+        try:
+            with tracked, ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = {pool.submit(self._process_item, job_id, item): item for item in items}
+                for future in as_completed(futures):
+                    future.result()
+                    # Doubles as a heartbeat for is_running()
+                    self.store.update_job(job_id, result=run)
+            counts = self.store.import_counts(job_id)
+            unfinished = sum(n for state, n in counts.items() if state not in DONE_STATES)
+            # Songs that ran out of time are left for a resume
+            status = "incomplete" if unfinished else "completed"
+        except Exception as e:
+            print(f"❌ Import {job_id} stopped: {e}")
+        finally:
+            run["finished_at"] = time.time()
+            self.store.update_job(job_id, status=status, result=run)
+            with self._lock:
+                self._active.discard(job_id)
+            if self.on_finished:
+                self.on_finished(job_id)
+            print(f"📥 Import {job_id} {status}: {self.store.import_counts(job_id)}")
+
+    def _process_item(self, job_id: str, item: dict):
+        song = Song(title=item["title"], artist=item["artist"], youtube_url=item["youtube_url"])
+        self.store.update_import_item(job_id, item["idx"], "running")
+        try:
+            song = self.process_song(song, job_id)
+            status = song.download_status
+        except Exception as e:
+            print(f"❌ Import {job_id}: {song.title} failed: {e}")
+            status = "failed"
+        self.store.update_import_item(job_id, item["idx"], status, song.youtube_url, song.file_path)
+
+    def progress(self, job_id: str, include_items: bool = False) -> Optional[dict]:
+        """Status, per-state counts and throughput of an import"""
+        job = self.store.get_job(job_id)
+        if not job or job["kind"] != "import":
+            return None
+
+        counts = self.store.import_counts(job_id)
+        total = job["payload"]["total"]
+        done = sum(n for status, n in counts.items() if status in DONE_STATES)
+        run = job["result"] or {}
+
+        # Throughput of the current (or last) run, ignoring items finished before it
+        elapsed = ((run.get("finished_at") or time.time()) - run["started_at"]) if run else 0
+        processed = done - run.get("done_at_start", 0)
+        per_minute = processed / elapsed * 60 if elapsed > 0 else 0.0
+        remaining = total - done
+
+        progress = {
+            "job_id": job_id,
+            "status": job["status"],
+            "total": total,
+            "done": done,
+            "counts": counts,
+            "elapsed_seconds": round(elapsed, 1),
+            "songs_per_minute": round(per_minute, 2),
+            "eta_seconds": (
+                round(remaining / per_minute * 60)
+                if job["status"] == "running" and per_minute and remaining else None
+            ),
+            "resumable": remaining > 0 and not self.is_running(job),
+        }
+        if include_items:
+            progress["items"] = self.store.import_items(job_id)
+        return progress
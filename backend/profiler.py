@@ -0,0 +1,295 @@
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional
+
+# Seconds between stack samples while profiling
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+
+# Longest a profile runs, however it is bounded (seconds)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# Frames kept per allocation traceback when tracing memory
+TRACEMALLOC_FRAMES = 15
+
+# Allocation sites reported in a memory diff
+TOP_ALLOCATIONS = 25
+
+# Jobs whose memory one session tracks at most; each job in flight holds a
+# snapshot of the traced heap
+PROFILE_MAX_JOBS = int(os.getenv("PROFILE_MAX_JOBS", "20"))
+
+# Innermost frames of a thread that is just waiting (a parked scheduler
+# worker, the event loop polling for I/O); left out unless asked for
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select")}
+
+
+def _snapshot():
+    """Traced memory, leaving out tracemalloc's own bookkeeping"""
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _frame_name(code) -> str:
+    """Function-level frame label: name (package/file.py:first line)"""
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(";", ":")
+
+
+class ProfileSession:
+    """One profiling run: stack samples of every thread, plus optional per-job memory diffs"""
+
+    def __init__(
+        self,
+        session_id: int,
+        seconds: Optional[float],
+        requests: Optional[int],
+        trace_memory: bool,
+        job: Optional[str] = None
+    ):
+        self.id = session_id
+        self.seconds = seconds
+        self.requests = requests
+        self.trace_memory = trace_memory
+        self.job = job
+        self.started_at = time.time()
+        self.ended_at = None
+        self.stacks = Counter()
+        self.idle_stacks = Counter()
+        self.samples = 0
+        self.requests_seen = 0
+        self.jobs = []
+        self.open_jobs = {}
+        self.stop_requested = False
+
+    @property
+    def running(self) -> bool:
+        return self.ended_at is None
+
+    def collapsed(self, include_idle: bool = False) -> str:
+        """Samples in collapsed-stack format (flamegraph.pl, speedscope, inferno)"""
+        stacks = self.stacks + self.idle_stacks if include_idle else self.stacks
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+    def summary(self, top: int = 20) -> dict:
+        busy = sum(self.stacks.values())
+        # Self time: where the thread actually was, innermost frame
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+        return {
+            "id": self.id,
+            "status": "running" if self.running else "done",
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "requests_seen": self.requests_seen,
+            "job": self.job,
+            "started_at": self.started_at,
+            "duration": round((self.ended_at or time.time()) - self.started_at, 3),
+            "samples": self.samples,
+            "busy_thread_samples": busy,
+            "top_functions": [
+                {"frame": frame, "samples": count, "share": round(count / busy, 4)}
+                for frame, count in own.most_common(top)
+            ],
+            "jobs": self.jobs if self.trace_memory else None,
+        }
+
+
+class SamplingProfiler:
+    """
+    On-demand sampling profiler for the whole process.
+
+    While a session runs, a thread snapshots every other thread's stack
+    every `interval` seconds, so scheduler workers (downloads, LLM calls)
+    and the event loop are all covered without instrumenting any code.
+    A session lasts a number of seconds or until a number of requests have
+    finished, and can trace memory too, reporting for each job (batch,
+    stream, import or cache fill, see track_job) that starts during the
+    session which allocation sites grew between its start and end. Jobs
+    running side by side share the heap, so their diffs overlap; pick one
+    job id to follow it alone. One session runs at a time; the last few are
+    kept for reading back.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or PROFILE_INTERVAL
+        self.sessions = deque(maxlen=5)
+        self._current = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        seconds: Optional[float] = None,
+        requests: Optional[int] = None,
+        trace_memory: bool = False,
+        job: Optional[str] = None
+    ) -> ProfileSession:
+        """
+        Start a session in the background
+
+        Args:
+            seconds: End the session after this long
+            requests: End the session once this many requests have finished
+            trace_memory: Report a memory diff for each job run during the session
+            job: Only track this job id's memory (it must start during the session)
+
+        Raises:
+            RuntimeError: if a session is already running
+        """
+        started_tracing = False
+        with self._lock:
+            if self._current is not None:
+                raise RuntimeError(f"Profile {self._current.id} is still running")
+            if trace_memory:
+                # Jobs take snapshots as soon as the session is current
+                started_tracing = not tracemalloc.is_tracing()
+                if started_tracing:
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+            session = ProfileSession(next(self._ids), seconds, requests, trace_memory, job)
+            self._current = session
+            self.sessions.append(session)
+
+        threading.Thread(target=self._run, args=(session, started_tracing), daemon=True).start()
+        print(f"🔬 Profile {session.id} started"
+              f"{f' for {seconds}s' if seconds else ''}{f' for {requests} requests' if requests else ''}"
+              f"{' with memory tracing' if trace_memory else ''}{f' of job {job}' if job else ''}")
+        return session
+
+    def stop(self) -> Optional[ProfileSession]:
+        """Ask the running session to end now"""
+        session = self._current
+        if session is not None:
+            session.stop_requested = True
+        return session
+
+    def get(self, session_id: int) -> Optional[ProfileSession]:
+        return next((session for session in self.sessions if session.id == session_id), None)
+
+    def request_finished(self):
+        session = self._current
+        if session is not None:
+            session.requests_seen += 1
+
+    @contextmanager
+    def track_job(self, job_id: str, kind: str):
+        """
+        Wrap one run of a job; while a memory-tracing session is running,
+        the allocation sites that grew over the run are reported for it
+        """
+        # Snapshots are taken under the lock so the session can't end (and
+        # stop tracing) halfway through one
+        with self._lock:
+            session = self._current
+            if (
+                session is None or not session.trace_memory
+                or (session.job is not None and session.job != job_id)
+                or len(session.jobs) + len(session.open_jobs) >= PROFILE_MAX_JOBS
+            ):
+                session = None
+            else:
+                session.open_jobs[job_id] = (kind, time.monotonic(), _snapshot())
+        if session is None:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                opened = session.open_jobs.pop(job_id, None)
+                # Still tracing unless the session ended (and reported it) first
+                if opened is not None:
+                    self._job_finished(session, job_id, opened, unfinished=False)
+
+    @staticmethod
+    def _job_finished(session: ProfileSession, job_id: str, opened: tuple, unfinished: bool):
+        kind, started, snapshot = opened
+        session.jobs.append({
+            "job_id": job_id,
+            "kind": kind,
+            "duration": round(time.monotonic() - started, 3),
+            # Still running when the session ended: the diff covers it so far
+            "unfinished": unfinished,
+            **SamplingProfiler._memory_diff(snapshot),
+        })
+
+    def _done(self, session: ProfileSession, elapsed: float) -> bool:
+        if session.stop_requested or elapsed >= PROFILE_MAX_SECONDS:
+            return True
+        if session.seconds is not None and elapsed >= session.seconds:
+            return True
+        return session.requests is not None and session.requests_seen >= session.requests
+
+    def _run(self, session: ProfileSession, started_tracing: bool):
+        own_thread = threading.get_ident()
+        start = time.monotonic()
+        try:
+            while not self._done(session, time.monotonic() - start):
+                self._sample(session, own_thread)
+                time.sleep(self.interval)
+        finally:
+            with self._lock:
+                self._current = None
+                for job_id, opened in session.open_jobs.items():
+                    self._job_finished(session, job_id, opened, unfinished=True)
+                session.open_jobs.clear()
+                if started_tracing:
+                    tracemalloc.stop()
+            session.ended_at = time.time()
+            print(f"🔬 Profile {session.id} finished: {session.samples} samples")
+
+    @staticmethod
+    def _sample(session: ProfileSession, own_thread: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            innermost = frame.f_code
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            stack = tuple(reversed(stack))
+
+            idle = (os.path.basename(innermost.co_filename), innermost.co_name) in IDLE_FRAMES
+            (session.idle_stacks if idle else session.stacks)[stack] += 1
+        session.samples += 1
+
+    @staticmethod
+    def _memory_diff(before) -> dict:
+        changes = _snapshot().compare_to(before, "traceback")
+        return {
+            "size_diff_kb": round(sum(change.size_diff for change in changes) / 1024, 1),
+            "top_allocations": [
+                {
+                    "size_diff_kb": round(change.size_diff / 1024, 1),
+                    "count_diff": change.count_diff,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in change.traceback],
+                }
+                for change in changes[:TOP_ALLOCATIONS]
+            ],
+        }
+
+
+class ProfilerMiddleware:
+    """ASGI middleware counting finished requests, for request-bounded sessions"""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/admin/"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.request_finished()
@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# Messages YouTube / yt-dlp produce when we're being throttled
+THROTTLE_SIGNALS = (
+    "429",
+    "too many requests",
+    "rate limit",
+    "confirm you're not a bot",
+    "confirm you’re not a bot",
+)
+
+
+def is_throttle_error(error: Any) -> bool:
+    """True if an exception or error message looks like rate limiting"""
+    message = str(error).lower()
+    return any(signal in message for signal in THROTTLE_SIGNALS)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts with AIMD.
+
+    Every call takes a token; tokens refill at `rate` per second up to
+    `burst`. Each success raises the rate additively, each throttling signal
+    cuts it multiplicatively and pauses all callers for a cool-down, so
+    throughput settles near the highest rate YouTube tolerates.
+
+    The bucket lives in this process until share() moves it into a
+    SharedStore, after which every worker process on the host draws from
+    (and adapts) the same bucket, so N workers don't send N times the rate.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        min_rate: float = 0.1,
+        max_rate: float = 10.0,
+        burst: float = 3.0,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+        cooldown: float = 5.0,
+        max_cooldown: float = 60.0
+    ):
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self._state = {}
+        self._lock = threading.Lock()
+        self.store = None
+        self.name = None
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "AdaptiveRateLimiter":
+        """Build a limiter configured by {prefix}_RATE, _MIN_RATE, _MAX_RATE and _BURST"""
+        return cls(
+            rate=float(os.getenv(f"{prefix}_RATE", "2.0")),
+            min_rate=float(os.getenv(f"{prefix}_MIN_RATE", "0.1")),
+            max_rate=float(os.getenv(f"{prefix}_MAX_RATE", "10.0")),
+            burst=float(os.getenv(f"{prefix}_BURST", "3")),
+        )
+
+    def share(self, store, name: str = "youtube"):
+        """Keep the bucket in the shared store from now on, under `name`"""
+        self.store = store
+        self.name = name
+
+    def _update(self, change: Callable[[dict], Any]) -> Any:
+        """Apply `change` to the bucket state atomically (wherever it lives)"""
+        def apply(state: dict) -> Any:
+            if not state:
+                state.update(
+                    rate=self.initial_rate,
+                    tokens=self.burst,
+                    last_refill=time.time(),
+                    paused_until=0.0,
+                    consecutive_throttles=0,
+                    successes=0,
+                    throttles=0,
+                )
+            return change(state)
+
+        if self.store is not None:
+            return self.store.cache_update("rate_limit", self.name, apply)
+        with self._lock:
+            return apply(self._state)
+
+    def _refill(self, state: dict, now: float):
+        # Wall-clock time, since other processes share the state; a clock
+        # step backwards must not drain the bucket
+        elapsed = max(0.0, now - state["last_refill"])
+        state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+        state["last_refill"] = now
+
+    def _take(self, state: dict) -> float:
+        """Take a token if one is free; otherwise how long to wait for one"""
+        now = time.time()
+        self._refill(state, now)
+        if now >= state["paused_until"] and state["tokens"] >= 1:
+            state["tokens"] -= 1
+            return 0.0
+        return max(state["paused_until"] - now, (1 - state["tokens"]) / state["rate"])
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until a token is available
+
+        Returns:
+            False if the timeout ran out first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            wait = self._update(self._take)
+            if wait <= 0:
+                return True
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def on_success(self):
+        """Additive increase"""
+        def change(state: dict):
+            state["successes"] += 1
+            state["consecutive_throttles"] = 0
+            state["rate"] = min(self.max_rate, state["rate"] + self.increase)
+
+        self._update(change)
+
+    def on_throttle(self):
+        """Multiplicative decrease plus an exponentially growing pause"""
+        def change(state: dict) -> tuple:
+            state["throttles"] += 1
+            state["consecutive_throttles"] += 1
+            state["rate"] = max(self.min_rate, state["rate"] * self.decrease)
+            state["tokens"] = 0
+
+            pause = min(self.max_cooldown, self.cooldown * 2 ** (state["consecutive_throttles"] - 1))
+            state["paused_until"] = max(state["paused_until"], time.time() + pause)
+            return pause, state["rate"]
+
+        pause, rate = self._update(change)
+        print(f"   🐢 Throttled by YouTube: backing off {pause:.1f}s, rate now {rate:.2f}/s")
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        retries: int = 2,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run fn under the limiter, feeding the outcome back into the rate.
+        Throttled calls are retried (after the back-off) up to `retries` times;
+        any other error is raised unchanged. Raises TimeoutError if no token
+        (including for retries) comes up within `timeout` seconds.
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        attempt = 0
+        while True:
+            wait = None if give_up_at is None else max(0.0, give_up_at - time.monotonic())
+            if not self.acquire(timeout=wait):
+                raise TimeoutError("Timed out waiting for the YouTube rate limiter")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_throttle_error(e):
+                    raise
+                self.on_throttle()
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                continue
+
+            self.on_success()
+            return result
+
+    def stats(self) -> dict:
+        def read(state: dict) -> dict:
+            now = time.time()
+            self._refill(state, now)
+            return {
+                "rate": round(state["rate"], 3),
+                "tokens": round(state["tokens"], 2),
+                "paused_for": round(max(0.0, state["paused_until"] - now), 1),
+                "successes": state["successes"],
+                "throttles": state["throttles"],
+                "shared": self.store is not None,
+            }
+
+        return self._update(read)
+
+
+# One bucket for every YouTube-bound call (search and download); main.py and
+# worker.py share it through the SharedStore so all processes draw from it
+youtube_rate_limiter = AdaptiveRateLimiter.from_env("YOUTUBE")
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from deadline import Deadline, DeadlineExceeded
+
+# Priority classes, most urgent first
+INTERACTIVE = 0   # a single song the user is waiting on
+LIST = 1          # a multi-song request from the UI
+BULK = 2          # playlist imports
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", LIST: "list", BULK: "bulk"}
+
+# Search/download tasks running at once in this process
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+
+# Workers that never take bulk work, so an import can't occupy every worker
+SCHEDULER_RESERVED = int(os.getenv("SCHEDULER_RESERVED", "2"))
+
+
+class _Task:
+    __slots__ = ("fn", "args", "future", "priority", "client", "cost", "queued_at")
+
+    def __init__(self, fn, args, priority, client, cost):
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.priority = priority
+        self.client = client
+        self.cost = cost
+        self.queued_at = time.monotonic()
+
+
+class _FairQueue:
+    """
+    Per-client queues served round-robin, so no client can hog a class.
+    Each client's own tasks come out cheapest first (ties in arrival order).
+    """
+
+    def __init__(self):
+        self.queues: Dict[str, List[tuple]] = {}
+        self.turns: Deque[str] = deque()
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def push(self, task: _Task):
+        if task.client not in self.queues:
+            self.queues[task.client] = []
+            self.turns.append(task.client)
+        heapq.heappush(self.queues[task.client], (task.cost, next(self._seq), task))
+
+    def pop(self) -> Optional[_Task]:
+        while self.turns:
+            client = self.turns.popleft()
+            queue = self.queues[client]
+            task = heapq.heappop(queue)[2]
+            if queue:
+                self.turns.append(client)
+            else:
+                del self.queues[client]
+            if task.future.cancelled():
+                continue
+            return task
+        return None
+
+
+class Scheduler:
+    """
+    Worker pool in front of song search and download.
+
+    Tasks are served by strict priority (interactive, then list, then bulk)
+    and, within a priority class, round-robin across clients, each client's
+    cheapest task (e.g. shortest song) first. A few workers are reserved for
+    non-bulk work, so a single-song request waits at most for one of those
+    to free up even while an import fills the rest.
+    """
+
+    def __init__(self, workers: Optional[int] = None, reserved: Optional[int] = None):
+        self.workers = workers or SCHEDULER_WORKERS
+        self.reserved = min(reserved if reserved is not None else SCHEDULER_RESERVED, self.workers - 1)
+
+        self._queues = {priority: _FairQueue() for priority in PRIORITY_NAMES}
+        self._cond = threading.Condition()
+        self._running = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waits = {priority: deque(maxlen=500) for priority in PRIORITY_NAMES}
+        self._current = threading.local()
+
+        for index in range(self.workers):
+            allow_bulk = index >= self.reserved
+            threading.Thread(target=self._worker, args=(allow_bulk,), daemon=True).start()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        priority: int = BULK,
+        client: str = "anonymous",
+        cost: float = 0.0
+    ) -> Future:
+        """
+        Queue fn(*args); the returned future can be cancelled while still queued.
+        `cost` is an estimate of the work (lower runs sooner within the client).
+        """
+        task = _Task(fn, args, priority, client, cost)
+        with self._cond:
+            self._queues[priority].push(task)
+            self._cond.notify_all()
+        return task.future
+
+    def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        priority: int = BULK,
+        client: str = "anonymous",
+        cost: float = 0.0,
+        deadline: Optional[Deadline] = None
+    ) -> Any:
+        """
+        Run fn(*args) on the pool and wait for its result
+
+        Raises:
+            DeadlineExceeded: if the deadline ran out while the task was
+                still queued (it is then dropped without running)
+        """
+        future = self.submit(fn, *args, priority=priority, client=client, cost=cost)
+        timeout = deadline.remaining() if deadline else None
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise DeadlineExceeded("Deadline exceeded while queued")
+            # Already running; it watches the deadline itself
+            return future.result()
+
+    def _next_task(self, allow_bulk: bool) -> Optional[_Task]:
+        for priority, queue in self._queues.items():
+            if priority == BULK and not allow_bulk:
+                continue
+            task = queue.pop()
+            if task:
+                return task
+        return None
+
+    def _worker(self, allow_bulk: bool):
+        while True:
+            with self._cond:
+                task = self._next_task(allow_bulk)
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task(allow_bulk)
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                self._running[task.priority] += 1
+                self._waits[task.priority].append(time.monotonic() - task.queued_at)
+
+            self._current.priority = task.priority
+            try:
+                task.future.set_result(task.fn(*task.args))
+            except BaseException as e:
+                task.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[task.priority] -= 1
+
+    def current_priority(self, default: int = BULK) -> int:
+        """Priority class of the task running on the calling thread (default off the pool)"""
+        return getattr(self._current, "priority", default)
+
+    @staticmethod
+    def _percentile(values, fraction: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+    def stats(self) -> dict:
+        """Queue depth, running tasks and recent queue-wait percentiles per class"""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "reserved": self.reserved,
+                "classes": {
+                    name: {
+                        "queued": len(self._queues[priority]),
+                        "running": self._running[priority],
+                        "wait_p50": self._percentile(self._waits[priority], 0.5),
+                        "wait_p99": self._percentile(self._waits[priority], 0.99),
+                    }
+                    for priority, name in PRIORITY_NAMES.items()
+                },
+            }
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key onto a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still in flight wait on the same future and get the same result (or
+    exception). Once the call finishes the key is forgotten, so this only
+    deduplicates simultaneous work - caching is left to the caller.
+
+    Waiters can pass `rerun` to reject a shared outcome that doesn't hold for
+    them, e.g. a timeout under the first caller's deadline when their own
+    deadline still has time left; they then run (or join) the call again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[..., Any],
+        *args,
+        rerun: Optional[Callable[[Any], bool]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call for key is already running,
+        in which case wait for that call's result instead.
+
+        Args:
+            rerun: Called by a waiter with the shared result (or exception);
+                returning True makes it try again rather than take it
+        """
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._in_flight[key] = future
+
+            if leader:
+                break
+
+            try:
+                result = future.result()
+            except BaseException as e:
+                if rerun is not None and rerun(e):
+                    continue
+                raise
+            if rerun is not None and rerun(result):
+                continue
+            return result
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Number of keys currently being executed"""
+        with self._lock:
+            return len(self._in_flight)
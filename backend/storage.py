@@ -0,0 +1,166 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from coordination import SharedStore
+from downloader import iter_library, library_changed, locate
+
+
+class StorageManager:
+    """
+    Keeps the downloads directory within a byte quota and a file-count quota.
+
+    Accesses are recorded in the shared store (so every worker sees them) and
+    the least recently used files are evicted first. Files pinned by an
+    in-flight job are never evicted.
+
+    Usage is kept as running totals: the library is scanned once, then only
+    the files in the shared store's library change log (downloads and
+    evictions by any worker) are stat'ed, so checking the quota after each
+    download costs no directory walk.
+    """
+
+    def __init__(
+        self,
+        store: SharedStore,
+        download_path: str = "downloads",
+        max_bytes: Optional[int] = None,
+        max_files: Optional[int] = None
+    ):
+        self.store = store
+        self.download_path = Path(download_path)
+        # 0 (the default) means no limit
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("STORAGE_MAX_BYTES", "0"))
+        self.max_files = max_files if max_files is not None else int(os.getenv("STORAGE_MAX_FILES", "0"))
+
+        self._lock = threading.Lock()
+        # filename -> path, size, mtime and inode of every library file
+        self._files: Dict[str, dict] = {}
+        # inode -> [size, names linking to it]; hard-linked duplicates count once
+        self._inodes: Dict[tuple, list] = {}
+        self._bytes = 0
+        # Last library change applied; None until the first scan
+        self._seq = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_bytes or self.max_files)
+
+    def record_access(self, filename: str):
+        """Mark a library file as just used"""
+        self.store.touch_file(filename)
+
+    def pin(self, filename: str, owner: str):
+        self.store.pin_file(filename, owner)
+
+    def release(self, owner: str):
+        self.store.release_pins(owner)
+
+    def _track(self, path: Path):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return
+        inode = (st.st_dev, st.st_ino)
+        self._files[path.name] = {"path": path, "size": st.st_size, "mtime": st.st_mtime, "inode": inode}
+        if inode not in self._inodes:
+            self._inodes[inode] = [st.st_size, 0]
+            self._bytes += st.st_size
+        self._inodes[inode][1] += 1
+
+    def _untrack(self, filename: str):
+        info = self._files.pop(filename, None)
+        if info is None:
+            return
+        shared = self._inodes[info["inode"]]
+        shared[1] -= 1
+        if not shared[1]:
+            del self._inodes[info["inode"]]
+            self._bytes -= shared[0]
+
+    def _sync(self):
+        """Scan the library on first use, then apply logged changes (call with the lock held)"""
+        changes = self.store.library_changes(self._seq) if self._seq is not None else None
+        if changes is None:
+            self._seq = self.store.library_change_seq()
+            self._files, self._inodes, self._bytes = {}, {}, 0
+            for f in iter_library(self.download_path):
+                self._track(f)
+            # Changes logged during the scan are applied again (harmless)
+            changes = self.store.library_changes(self._seq) or []
+
+        for change in changes:
+            self._untrack(change["filename"])
+            if not change["removed"]:
+                path = locate(self.download_path, change["filename"])
+                if path is not None:
+                    self._track(path)
+            self._seq = change["seq"]
+
+    def usage(self) -> dict:
+        with self._lock:
+            self._sync()
+            return {
+                "bytes": self._bytes,
+                "files": len(self._files),
+                "max_bytes": self.max_bytes,
+                "max_files": self.max_files,
+            }
+
+    def _over_quota(self, total_bytes: int, total_files: int) -> bool:
+        return (
+            (self.max_bytes and total_bytes > self.max_bytes)
+            or (self.max_files and total_files > self.max_files)
+        )
+
+    def enforce_quota(self) -> List[str]:
+        """
+        Evict least recently used files until the library is within quota
+        
+        Returns:
+            Names of the evicted files
+        """
+        if not self.enabled:
+            return []
+
+        with self._lock:
+            self._sync()
+            if not self._over_quota(self._bytes, len(self._files)):
+                return []
+
+            access_times = self.store.file_access_times()
+            pinned = self.store.pinned_files()
+
+            # Files never accessed through the API fall back to their mtime
+            candidates = sorted(
+                (name for name in self._files if name not in pinned),
+                key=lambda name: access_times.get(name, self._files[name]["mtime"])
+            )
+
+            evicted = []
+            for name in candidates:
+                if not self._over_quota(self._bytes, len(self._files)):
+                    break
+                try:
+                    self._files[name]["path"].unlink()
+                except FileNotFoundError:
+                    # Already gone (another worker evicted it); its change is logged
+                    self._untrack(name)
+                    continue
+                except OSError as e:
+                    print(f"   ⚠️ Could not evict {name}: {e}")
+                    continue
+
+                self._untrack(name)
+                library_changed(self.store, name, removed=True)
+                self.store.forget_file(name)
+                evicted.append(name)
+
+            still_over = self._over_quota(self._bytes, len(self._files))
+
+        if evicted:
+            print(f"🧹 Evicted {len(evicted)} file(s) to stay within quota")
+        if still_over:
+            print("   ⚠️ Still over quota: remaining files are pinned by in-flight jobs")
+        return evicted
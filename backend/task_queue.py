@@ -0,0 +1,151 @@
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+from coordination import SharedStore
+from deadline import Deadline, DeadlineExceeded
+
+# Where search and download tasks run: "local" (this process) or "sqlite"
+# (worker.py processes sharing COORDINATION_DIR and the library)
+TASK_QUEUE = os.getenv("TASK_QUEUE", "local").lower()
+
+# How often the API node checks a queued task for its result (seconds)
+TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", "0.25"))
+
+# A worker's claim on a task lapses if not renewed for this long (seconds),
+# after which another worker picks the task up
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "60"))
+
+# Times a task is handed out before it is failed (its workers kept dying)
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+TASK_KINDS = ["search", "download"]
+
+
+def run_task(kind: str, payload: dict, deadline: Deadline, downloader, youtube) -> dict:
+    """
+    Run one task with this process's services. Shared by the local backend
+    and download workers, so both produce the same result.
+
+    Returns:
+        For "search", {'match': search result or None}; for "download", the
+        download_as_mp3 result plus 'artifact' (the library file name) on success
+    """
+    if kind == "search":
+        return {"match": youtube.search(payload["query"], payload.get("limit", 1), deadline)}
+    if kind == "download":
+        result = downloader.download_as_mp3(
+            youtube_url=payload["youtube_url"],
+            song_title=payload["title"],
+            artist=payload["artist"],
+            deadline=deadline,
+            quality=payload.get("quality")
+        )
+        if result.get("file_path"):
+            result["artifact"] = Path(result["file_path"]).name
+        return result
+    raise ValueError(f"Unknown task kind: {kind}")
+
+
+class TaskQueue(ABC):
+    """
+    Where search and download tasks run. The API node's scheduler decides
+    when a task runs and calls run(); the backend decides where.
+    """
+
+    # Results come from another process; download artifacts must be found
+    # in this node's library
+    remote = False
+
+    @abstractmethod
+    def run(
+        self,
+        kind: str,
+        payload: dict,
+        deadline: Optional[Deadline] = None,
+        priority: int = 0,
+        cost: float = 0.0
+    ) -> dict:
+        """
+        Run a task and wait for its result
+
+        Raises:
+            DeadlineExceeded: if the deadline ran out first
+        """
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Backend name and counters for /api/scheduler"""
+
+
+class LocalTaskQueue(TaskQueue):
+    """Runs every task right away on the calling thread (a scheduler worker)"""
+
+    def __init__(self, downloader, youtube):
+        self.downloader = downloader
+        self.youtube = youtube
+
+    def run(self, kind, payload, deadline=None, priority=0, cost=0.0) -> dict:
+        return run_task(kind, payload, deadline or Deadline(), self.downloader, self.youtube)
+
+    def stats(self) -> dict:
+        return {"backend": "local"}
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Queues tasks in the shared store for download workers (worker.py) to
+    claim, most urgent first, and waits for their results. Workers hold a
+    renewable lease on each task, so a task whose worker dies is retried
+    elsewhere. A stand-in for a networked queue: API nodes and workers must
+    share COORDINATION_DIR and the library directory.
+    """
+
+    remote = True
+
+    def __init__(self, store: SharedStore):
+        self.store = store
+
+    def run(self, kind, payload, deadline=None, priority=0, cost=0.0) -> dict:
+        deadline = deadline or Deadline()
+        remaining = deadline.remaining()
+        task_id = uuid.uuid4().hex
+        self.store.enqueue_task(
+            task_id, kind, payload, priority, cost,
+            deadline_at=None if remaining is None else time.time() + remaining
+        )
+
+        try:
+            while True:
+                status, result = self.store.task_result(task_id)
+                if status == "done":
+                    break
+                if status is None:
+                    raise RuntimeError("Task vanished from the queue")
+                if status == "queued" and deadline.expired and self.store.cancel_task(task_id):
+                    raise DeadlineExceeded("Deadline exceeded while queued")
+                # Once claimed, the worker watches the deadline itself
+                time.sleep(TASK_POLL_INTERVAL)
+        finally:
+            self.store.delete_task(task_id)
+
+        if "error" in result:
+            if result.get("timed_out"):
+                raise DeadlineExceeded(result["error"])
+            raise RuntimeError(result["error"])
+        return result["value"]
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", **self.store.task_counts()}
+
+
+def make_task_queue(store: SharedStore, downloader, youtube) -> TaskQueue:
+    """The backend TASK_QUEUE names"""
+    if TASK_QUEUE == "sqlite":
+        return SQLiteTaskQueue(store)
+    if TASK_QUEUE != "local":
+        print(f"⚠️ Unknown TASK_QUEUE '{TASK_QUEUE}'; running tasks in this process")
+    return LocalTaskQueue(downloader, youtube)
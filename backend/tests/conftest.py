@@ -0,0 +1,18 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other by bare name (run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    # main sets up its shared store and library under the working directory,
+    # and is only imported once, so it keeps one directory for the session
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("backend"))
+        patch.setenv("COORDINATION_DIR", ".state")
+        yield importlib.import_module("main")
@@ -0,0 +1,80 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from models import Song
+
+
+def _wait_for_job(main, job_id, timeout=5):
+    end = time.monotonic() + timeout
+    while main.shared_store.get_job(job_id)["status"] == "running":
+        assert time.monotonic() < end, "fill didn't finish"
+        time.sleep(0.01)
+    return main.shared_store.get_job(job_id)
+
+
+def _fill_jobs(main):
+    return [job for job in main.shared_store.list_jobs() if job["kind"] == "fill"]
+
+
+def test_fill_pins_its_file_until_done_and_outlives_the_request(main, monkeypatch):
+    seen = {}
+
+    def download(song, owner=None, deadline=None, quality=None):
+        # Stands in for the real download: the file is pinned to its owner
+        song.file_path = "downloads/Artist - Song.m4a"
+        song.download_status = "completed"
+        main._track_download(song.file_path, owner)
+        seen.update(owner=owner, quality=quality, remaining=deadline.remaining(),
+                    pinned=main.shared_store.pinned_files())
+        return song
+
+    monkeypatch.setattr(main, "download_song", download)
+    monkeypatch.setattr(main, "CACHE_FILL_TIMEOUT", 0)
+    monkeypatch.setattr(main.mp3_downloader, "partial_download", lambda stem: None)
+    song = Song(title="Song", artist="Artist", youtube_url="https://youtu.be/song")
+    stem = main.register_stream_source(song, "best")
+
+    assert main.start_cache_fill(stem, "listener")
+
+    [job] = _fill_jobs(main)
+    job = _wait_for_job(main, job["job_id"])
+    assert job["status"] == "completed"
+    assert job["payload"] == {"stem": stem}
+    assert seen["owner"] == job["job_id"]
+    assert seen["quality"] == "best"
+    assert seen["remaining"] is None
+    assert "Artist - Song.m4a" in seen["pinned"]
+    assert "Artist - Song.m4a" not in main.shared_store.pinned_files()
+
+
+def test_failed_fill_releases_pins(main, monkeypatch):
+    def download(song, owner=None, deadline=None, quality=None):
+        main.storage_manager.pin("Other - Song.m4a", owner)
+        raise RuntimeError("network down")
+
+    monkeypatch.setattr(main, "download_song", download)
+    monkeypatch.setattr(main.mp3_downloader, "partial_download", lambda stem: None)
+    stem = main.register_stream_source(Song(title="Other", artist="Other", youtube_url="https://youtu.be/x"))
+    before = {job["job_id"] for job in _fill_jobs(main)}
+
+    assert main.start_cache_fill(stem, "listener")
+
+    [job] = [job for job in _fill_jobs(main) if job["job_id"] not in before]
+    assert _wait_for_job(main, job["job_id"])["status"] == "failed"
+    assert "Other - Song.m4a" not in main.shared_store.pinned_files()
+
+
+def test_fill_in_progress_isnt_started_again(main, monkeypatch, tmp_path):
+    monkeypatch.setattr(main.mp3_downloader, "partial_download", lambda stem: tmp_path / f"{stem}.m4a.part")
+    stem = main.register_stream_source(Song(title="Busy", artist="Artist", youtube_url="https://youtu.be/busy"))
+    before = len(_fill_jobs(main))
+
+    assert main.start_cache_fill(stem, "listener")
+    assert len(_fill_jobs(main)) == before
+
+
+def test_proxy_stream_of_unresolved_song_is_not_found(main):
+    response = TestClient(main.app).get("/api/stream-file/Nobody - Nothing.m4a?proxy=true")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Song not resolved"
@@ -0,0 +1,57 @@
+import time
+
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker, CircuitBreakerRegistry
+
+BACKENDS = ["ytdlp", "vevioz", "yt1s"]
+
+
+def test_untried_backends_keep_the_given_order():
+    assert CircuitBreakerRegistry().ordered(BACKENDS) == BACKENDS
+
+
+def test_primary_stays_first_after_a_failure():
+    registry = CircuitBreakerRegistry()
+    registry.get("ytdlp").record_failure(1.0)
+    assert registry.ordered(BACKENDS) == BACKENDS
+
+
+def test_open_primary_is_skipped():
+    registry = CircuitBreakerRegistry()
+    for _ in range(5):
+        registry.get("ytdlp").record_failure(1.0)
+    assert registry.get("ytdlp").state == OPEN
+    assert registry.ordered(BACKENDS) == ["vevioz", "yt1s"]
+
+
+def test_fallbacks_ranked_by_success_among_themselves():
+    registry = CircuitBreakerRegistry()
+    registry.get("vevioz").record_failure(1.0)
+    registry.get("yt1s").record_success(1.0)
+    assert registry.ordered(BACKENDS) == ["ytdlp", "yt1s", "vevioz"]
+
+
+def test_equal_success_prefers_faster_fallback():
+    registry = CircuitBreakerRegistry()
+    registry.get("vevioz").record_success(9.0)
+    registry.get("yt1s").record_success(1.0)
+    assert registry.ordered(BACKENDS) == ["ytdlp", "yt1s", "vevioz"]
+
+
+def test_opens_on_failure_rate_and_closes_after_trial():
+    breaker = CircuitBreaker("b", min_calls=4, open_seconds=0.05)
+    for ok in (True, True, False, False):
+        breaker.record_success(0.1) if ok else breaker.record_failure(0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request()       # the half-open trial
+    assert not breaker.allow_request()   # only one at a time
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+
+
+def test_slow_success_counts_as_failure():
+    breaker = CircuitBreaker("b", slow_call_seconds=1)
+    breaker.record_success(5)
+    assert breaker.success_rate() == 0.0
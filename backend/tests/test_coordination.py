@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+import playlist_import
+from coordination import SharedStore
+from deadline import Deadline, DeadlineExceeded
+from downloader import MP3Downloader
+from models import Song
+from playlist_import import PlaylistImporter
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedStore(str(tmp_path / "state"))
+
+
+def test_lock_wait_gives_up_at_the_deadline(store):
+    with store.download_lock("Artist - Song"):
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            with store.download_lock("artist - song", Deadline(0.2)):
+                pass
+        assert 0.15 < time.monotonic() - start < 1
+
+
+def test_waiter_gets_the_lock_once_released(store):
+    held = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with store.download_lock("Artist - Song"):
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait()
+    threading.Timer(0.1, release.set).start()
+    with store.download_lock("Artist - Song", Deadline(5)):
+        assert release.is_set()
+    thread.join()
+
+
+def test_other_keys_dont_wait(store):
+    with store.download_lock("Artist - Song"):
+        with store.download_lock("Artist - Other", Deadline(0)):
+            pass
+
+
+def test_download_waiting_on_another_worker_times_out(tmp_path, store):
+    dl = MP3Downloader(str(tmp_path / "downloads"), store=store)
+    with store.download_lock(dl.variant_name("Artist", "Song", "standard")):
+        result = dl._download_locked("https://youtu.be/x", "Song", "Artist", Deadline(0.1), "standard")
+    assert result["timed_out"]
+    assert not result["success"]
+
+
+def test_resume_while_another_worker_resumes_is_refused(store, monkeypatch):
+    monkeypatch.setattr(playlist_import, "RESUME_LOCK_TIMEOUT", 0.1)
+    importer = PlaylistImporter(store, lambda song, job_id: song)
+    job_id = "import1"
+    store.register_job(job_id, "import", payload={"total": 1}, status="incomplete")
+    store.add_import_items(job_id, [Song(title="Song", artist="Artist")])
+
+    with store.download_lock(f"import:{job_id}"):
+        with pytest.raises(RuntimeError, match="being resumed"):
+            importer.resume(job_id)
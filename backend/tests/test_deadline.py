@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+
+
+def test_unbounded_deadline_never_expires():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired
+    assert deadline.timeout() is None
+    assert deadline.timeout(cap=5) == 5
+
+
+def test_timeout_is_remaining_budget_capped():
+    deadline = Deadline(10)
+    assert 9 < deadline.timeout() <= 10
+    assert deadline.timeout(cap=2) == 2
+
+
+def test_expired_deadline_raises_with_stage():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.expired
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded, match="YouTube search"):
+        deadline.timeout(stage="YouTube search")
+    # Callers catching TimeoutError see it too
+    with pytest.raises(TimeoutError):
+        deadline.check()
+
+
+def test_request_budget_is_capped(monkeypatch):
+    monkeypatch.setattr("deadline.REQUEST_DEADLINE_SECONDS", 60)
+    assert 59 < Deadline.for_request(None).remaining() <= 60
+    assert 9 < Deadline.for_request(10).remaining() <= 10
+    assert 59 < Deadline.for_request(600).remaining() <= 60
+
+    monkeypatch.setattr("deadline.REQUEST_DEADLINE_SECONDS", 0)
+    assert Deadline.for_request(None).remaining() is None
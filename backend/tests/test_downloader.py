@@ -0,0 +1,56 @@
+import downloader
+from deadline import Deadline
+from downloader import MP3Downloader
+
+
+class _Response:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        if self._data is None:
+            raise ValueError("not JSON")
+        return self._data
+
+
+def _probe_with(monkeypatch, response):
+    import requests
+    calls = []
+    monkeypatch.setattr(requests, "get", lambda url, **kwargs: calls.append(url) or response)
+    probe = MP3Downloader._make_probe("https://api.example/convert/{video_id}")
+    return probe(), calls
+
+
+def test_probe_calls_the_api_endpoint(monkeypatch):
+    healthy, calls = _probe_with(monkeypatch, _Response(200, {"dlink": "https://cdn/x.mp3"}))
+    assert healthy
+    assert calls == [f"https://api.example/convert/{downloader.PROBE_VIDEO_ID}"]
+
+
+def test_probe_fails_without_a_download_link(monkeypatch):
+    assert not _probe_with(monkeypatch, _Response(200, {"status": "error"}))[0]
+    assert not _probe_with(monkeypatch, _Response(200, None))[0]
+    assert not _probe_with(monkeypatch, _Response(503, {}))[0]
+
+
+def test_breaker_gets_the_backend_time_not_the_wait(tmp_path, monkeypatch):
+    dl = MP3Downloader(str(tmp_path))
+    recorded = []
+    monkeypatch.setattr(dl.breakers.get("ytdlp"), "record_success", recorded.append)
+
+    def slow_pacing(*args, **kwargs):
+        # A minute of backoff before a two-second download
+        return {'success': True, 'file_path': str(tmp_path / "x.m4a"), 'latency': 2.0}
+
+    monkeypatch.setattr(dl, "_download_with_ytdlp_audio_only", slow_pacing)
+    assert dl._download("https://youtu.be/x", "S", "A", Deadline(), "standard")['success']
+    assert recorded == [2.0]
+
+
+def test_no_quality_alternative_is_unreachable():
+    # yt-dlp takes the first alternative that matches; an unconstrained
+    # "bestaudio" matches whenever any audio does, so nothing may follow it
+    for quality, selector in downloader.QUALITY_PROFILES.items():
+        alternatives = selector.split("/")
+        assert "bestaudio" not in alternatives[:-1], quality
@@ -0,0 +1,62 @@
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from coordination import SharedStore
+from downloader import library_path
+from fingerprint import FingerprintService
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_import_does_not_load_numpy():
+    code = "import sys, fingerprint; print('numpy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+@pytest.fixture
+def service(tmp_path):
+    store = SharedStore(str(tmp_path / "state"))
+    return FingerprintService(store, download_path=str(tmp_path / "downloads"), dedupe_mode="merge")
+
+
+def _song(service, name: str, data: bytes = b"audio") -> Path:
+    path = library_path(service.download_path, name, create=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_merge_skips_pinned_duplicates(service):
+    kept = _song(service, "A - Song.m4a")
+    dupe = _song(service, "A - Song Copy.m4a")
+    service.store.pin_file(dupe.name, "job-1")
+
+    assert service._dedupe_file(dupe, kept, "merge") == "skipped-pinned"
+    assert dupe.exists()
+
+    service.store.release_pins("job-1")
+    assert service._dedupe_file(dupe, kept, "merge") == "merged"
+    assert not dupe.exists()
+    assert service.store.cache_get("alias", dupe.stem) == kept.name
+
+
+def test_matching_runs_off_the_pool_thread(service, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fake-pool")
+    monkeypatch.setattr(service, "_pool", lambda: pool)
+    monkeypatch.setattr("fingerprint.compute_fingerprint", lambda path: ([], []))
+    ran_on = []
+    done = threading.Event()
+
+    def on_fingerprinted(path, future):
+        ran_on.append(threading.current_thread().name)
+        done.set()
+
+    monkeypatch.setattr(service, "_on_fingerprinted", on_fingerprinted)
+    service.submit_new_download(str(_song(service, "A - New.m4a")))
+    assert done.wait(5)
+    assert ran_on[0].startswith("fingerprint-match")
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import hls_packaging
+from coordination import SharedStore
+from downloader import library_path
+from hls_packaging import MANIFEST, HLSPackager, package_id
+
+
+@pytest.fixture
+def packager(tmp_path):
+    return HLSPackager(SharedStore(str(tmp_path / "state")), str(tmp_path / "hls"))
+
+
+@pytest.fixture
+def track(tmp_path):
+    path = tmp_path / "Artist - Song.m4a"
+    path.write_bytes(b"audio")
+    return path
+
+
+@pytest.fixture
+def ffmpeg_runs(monkeypatch):
+    """Stand-in for ffmpeg that writes a two-segment package"""
+    runs = []
+
+    def run(args, **kwargs):
+        runs.append(args)
+        time.sleep(0.1)
+        out = Path(args[-1]).parent
+        (out / "init.mp4").write_bytes(b"init")
+        for index in range(2):
+            (out / f"seg_{index:05d}.m4s").write_bytes(b"segment")
+        (out / MANIFEST).write_text("#EXTM3U\n")
+
+    monkeypatch.setattr(hls_packaging.subprocess, "run", run)
+    return runs
+
+
+def test_package_id_changes_only_with_the_file(track):
+    pid = package_id(track)
+    assert hls_packaging.PACKAGE_ID.match(pid)
+    assert package_id(track) == pid
+
+    track.write_bytes(b"re-downloaded audio")
+    assert package_id(track) != pid
+
+
+def test_package_is_built_once_and_then_found(packager, track, ffmpeg_runs):
+    assert packager.packaged(track) is None
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(packager.ensure(track, timeout=5))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    pid = package_id(track)
+    assert results == [pid] * 3
+    assert len(ffmpeg_runs) == 1
+    assert packager.packaged(track) == pid
+    # Written aside and renamed into place, with its source recorded
+    assert sorted(p.name for p in packager.output_path.iterdir()) == [pid]
+    assert json.loads((packager.output_path / pid / "source.json").read_text()) == {"filename": track.name}
+
+    assert packager.ensure(track) == pid
+    assert len(ffmpeg_runs) == 1
+
+
+def test_failed_packaging_leaves_nothing_behind(packager, track, monkeypatch):
+    def broken(args, **kwargs):
+        Path(args[-1]).write_text("partial")
+        raise subprocess.CalledProcessError(1, args, stderr=b"Invalid data found")
+
+    monkeypatch.setattr(hls_packaging.subprocess, "run", broken)
+    assert packager.ensure(track, timeout=5) is None
+    assert list(packager.output_path.iterdir()) == []
+
+
+def test_only_package_files_are_served(packager, track, ffmpeg_runs):
+    pid = packager.ensure(track, timeout=5)
+
+    assert packager.file(pid, "index.m3u8") == packager.output_path / pid / "index.m3u8"
+    assert packager.file(pid, "seg_00001.m4s").is_file()
+    assert packager.file(pid, "seg_00099.m4s") is None
+    assert packager.file(pid, "source.json") is None
+    assert packager.file(pid, "../index.m3u8") is None
+    assert packager.file("..", "index.m3u8") is None
+    assert packager.file(pid.upper(), "index.m3u8") is None
+
+
+def test_prune_drops_packages_of_deleted_or_replaced_tracks(packager, track, tmp_path, ffmpeg_runs):
+    other = tmp_path / "Artist - Other.m4a"
+    other.write_bytes(b"audio")
+    kept = packager.ensure(track, timeout=5)
+    packager.ensure(other, timeout=5)
+    other.unlink()
+    # A crashed run's leftover, an hour old
+    leftover = packager.output_path / ".0123456789abcdef.1.tmp"
+    leftover.mkdir()
+    os.utime(leftover, (0, 0))
+
+    library = {track.name: track}
+    assert packager.prune(library.get) == 1
+    assert sorted(p.name for p in packager.output_path.iterdir()) == [kept]
+
+    track.write_bytes(b"replaced audio")
+    assert packager.prune(library.get) == 1
+    assert list(packager.output_path.iterdir()) == []
+
+
+@pytest.fixture
+def library_track(main):
+    # main is shared by the whole session, so the file and its package go again afterwards
+    track = library_path(main.mp3_downloader.download_path, "Artist - Song.m4a", create=True)
+    track.write_bytes(b"audio")
+    package = main.hls_packager.output_path / package_id(track)
+    package.mkdir(parents=True)
+    (package / MANIFEST).write_text("#EXTM3U\n")
+    yield track
+    track.unlink()
+    shutil.rmtree(package)
+
+
+def test_hls_endpoints(main, library_track, monkeypatch):
+    client = TestClient(main.app)
+    # Disabled unless HLS_PACKAGING is set and ffmpeg is installed
+    assert client.get("/api/hls/Artist - Song.m4a").status_code == 404
+
+    monkeypatch.setattr(main, "_hls_enabled", lambda: True)
+    pid = package_id(library_track)
+    response = client.get("/api/hls/Artist - Song.m4a", follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == f"/api/hls/v/{pid}/index.m3u8"
+
+    response = client.get(f"/api/hls/v/{pid}/index.m3u8")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apple.mpegurl"
+    assert "immutable" in response.headers["cache-control"]
+
+    assert client.get(f"/api/hls/v/{pid}/source.json").status_code == 404
+    assert client.get("/api/hls/v/not-a-package/index.m3u8").status_code == 404
+    assert client.get("/api/hls/Missing - Song.m4a").status_code == 404
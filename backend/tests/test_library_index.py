@@ -0,0 +1,94 @@
+import pytest
+
+from downloader import library_path
+from library_index import LibraryIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    for name in [
+        "Justin Bieber - What Do You Mean.m4a",
+        "Justin Bieber - Sorry.m4a",
+        "Justin Bieber - Baby.m4a",
+        "Harry Styles - Golden.m4a",
+        "Karan Aujla - Red Eyes.m4a",
+        "Ed Sheeran - Shape of You.m4a",
+        "Justin Bieber - Love Yourself.m4a",
+    ]:
+        library_path(tmp_path, name, create=True).write_bytes(b"")
+    return LibraryIndex(tmp_path)
+
+
+@pytest.mark.parametrize("artist, title", [
+    ("Justin Bieber", "What Do You Want"),
+    ("Justin Bieber", "Sorry Not Sorry"),
+    ("Harry Styles", "Gold"),
+    ("Karan Aujla", "Red"),
+    ("Ed Sheeran", "Perfect"),
+])
+def test_near_miss_titles_are_not_library_hits(index, artist, title):
+    assert index.best_match(artist, title) is None
+
+
+@pytest.mark.parametrize("artist, title, expected", [
+    ("Justin Beiber", "Baby", "Justin Bieber - Baby.m4a"),
+    ("Ed Sheeran", "Shape Of You (Official Video)", "Ed Sheeran - Shape of You.m4a"),
+    ("ed sheeran", "shape of you", "Ed Sheeran - Shape of You.m4a"),
+    ("Justin Bieber", "Love Your Self", "Justin Bieber - Love Yourself.m4a"),
+    ("Justin Bieber", "What Do You Mean?", "Justin Bieber - What Do You Mean.m4a"),
+])
+def test_spelling_variants_still_match(index, artist, title, expected):
+    match = index.best_match(artist, title)
+    assert match is not None and match["filename"] == expected
+
+
+def test_other_artist_with_same_title_is_not_a_hit(index):
+    assert index.best_match("Sabrina Carpenter", "Sorry") is None
+
+
+def test_quality_filter(index):
+    assert index.best_match("Justin Bieber", "Baby", quality="best") is None
+    assert index.best_match("Justin Bieber", "Baby", quality="standard") is not None
+
+
+def test_follows_the_change_log_without_rescanning(tmp_path, monkeypatch):
+    import library_index
+    from coordination import SharedStore
+
+    store = SharedStore(str(tmp_path / "state"))
+    root = tmp_path / "library"
+    library_path(root, "Adele - Hello.m4a", create=True).write_bytes(b"")
+    index = LibraryIndex(root, store=store)
+    assert index.best_match("Adele", "Hello")
+
+    def no_scan(root):
+        raise AssertionError("library rescanned")
+
+    monkeypatch.setattr(library_index, "iter_library", no_scan)
+
+    # Another worker downloads a song and evicts one
+    library_path(root, "Queen - Bohemian Rhapsody.m4a", create=True).write_bytes(b"")
+    store.record_library_change("Queen - Bohemian Rhapsody.m4a")
+    library_path(root, "Adele - Hello.m4a").unlink()
+    store.record_library_change("Adele - Hello.m4a", removed=True)
+
+    assert index.best_match("Queen", "Bohemian Rhapsody")["filename"] == "Queen - Bohemian Rhapsody.m4a"
+    assert index.best_match("Adele", "Hello") is None
+
+
+def test_rescans_when_the_log_was_pruned(tmp_path, monkeypatch):
+    import coordination
+    from coordination import SharedStore
+
+    monkeypatch.setattr(coordination, "LIBRARY_CHANGE_LOG_SIZE", 2)
+    store = SharedStore(str(tmp_path / "state"))
+    root = tmp_path / "library"
+    index = LibraryIndex(root, store=store)
+    index.refresh()
+
+    for name in ("A - One.m4a", "B - Two.m4a", "C - Three.m4a"):
+        library_path(root, name, create=True).write_bytes(b"")
+        store.record_library_change(name)
+
+    assert store.library_changes(0) is None
+    assert {entry["filename"] for entry in index.files()} == {"A - One.m4a", "B - Two.m4a", "C - Three.m4a"}
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from loop_monitor import LoopMonitor
+
+
+def _run_blocked(monitor, seconds):
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(monitor.interval * 3)
+        monitor.track("POST /api/slow")
+        time.sleep(seconds)  # a blocking call on the loop
+        monitor.untrack()
+        await asyncio.sleep(monitor.interval * 3)
+        monitor._ticker.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_blocking_call_is_recorded_as_a_stall():
+    monitor = LoopMonitor(interval=0.02, threshold=0.1)
+    _run_blocked(monitor, 0.3)
+
+    stats = monitor.stats()
+    assert stats["stall_count"] == 1
+    [stall] = stats["stalls"]
+    assert stall["request"] == "POST /api/slow"
+    assert stall["duration"] >= 0.25
+    assert "in scenario: time.sleep(seconds)" in stall["stack"][-1]
+    assert stats["lag_max"] >= 0.25
+    assert "event_loop_stalls_total 1" in monitor.metrics()
+
+
+def test_short_hiccups_are_lag_not_stalls():
+    monitor = LoopMonitor(interval=0.02, threshold=0.2)
+    _run_blocked(monitor, 0.05)
+
+    stats = monitor.stats()
+    assert stats["stall_count"] == 0
+    assert stats["samples"] > 0
+    assert stats["lag_max"] >= 0.03
+
+
+def test_song_extraction_runs_off_the_event_loop(main, monkeypatch):
+    # The LLM call blocks; as an async handler it would stall the loop
+    assert not asyncio.iscoroutinefunction(main.extract_songs)
+
+    def extract(query, deadline=None):
+        time.sleep(0.05)
+        return {"songs": [], "intent": "list", "suggestion": None}
+
+    monkeypatch.setattr(main.song_extraction_agent, "extract_songs", extract)
+    response = TestClient(main.app).post("/api/extract-songs", json={"query": "anything"})
+    assert response.status_code == 200
+    assert response.json()["intent"] == "list"
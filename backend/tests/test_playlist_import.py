@@ -0,0 +1,231 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import playlist_import
+from coordination import SharedStore
+from models import Song
+from playlist_import import DONE_STATES, PlaylistImporter, detect_format, parse_playlist
+
+
+def _pairs(songs):
+    return [(song.artist, song.title) for song in songs]
+
+
+def test_csv_with_spotify_style_header():
+    text = "Track Name,Artist Name(s),Album\nBaby,Justin Bieber,My World\nHello,Adele,25\n"
+    songs, dropped = parse_playlist(text)
+    assert _pairs(songs) == [("Justin Bieber", "Baby"), ("Adele", "Hello")]
+    assert dropped == 0
+
+
+def test_headerless_csv_rows():
+    songs, _ = parse_playlist("Adele,Hello\nQueen,Bohemian Rhapsody\n", fmt="csv")
+    assert _pairs(songs) == [("Adele", "Hello"), ("Queen", "Bohemian Rhapsody")]
+
+
+def test_m3u_uses_extinf_then_file_name():
+    text = "#EXTM3U\n#EXTINF:215,Adele - Hello\nmusic/hello.mp3\nC:\\Music\\Queen - Bohemian Rhapsody.mp3\n"
+    assert detect_format(text) == "m3u"
+    songs, _ = parse_playlist(text)
+    assert _pairs(songs) == [("Adele", "Hello"), ("Queen", "Bohemian Rhapsody")]
+
+
+def test_text_lines_numbering_dashes_and_duplicates():
+    text = "1. Adele - Hello\n2) Queen – Bohemian Rhapsody\n# a comment\nadele -  hello\nJust A Title\n"
+    songs, dropped = parse_playlist(text)
+    assert _pairs(songs) == [("Adele", "Hello"), ("Queen", "Bohemian Rhapsody"), ("", "Just A Title")]
+    assert dropped == 1
+
+
+def _wait_until_stopped(importer, store, job_id):
+    for _ in range(250):
+        if not importer.is_running(store.get_job(job_id)):
+            return
+        time.sleep(0.02)
+    raise AssertionError("import didn't finish")
+
+
+def test_final_states_are_not_processed_again(tmp_path):
+    assert "too_long" in DONE_STATES
+    store = SharedStore(str(tmp_path))
+    processed = []
+
+    def process(song, job_id):
+        processed.append(song.title)
+        song.download_status = "too_long" if song.title == "Long" else "timed_out"
+        return song
+
+    importer = PlaylistImporter(store, process, concurrency=1)
+    job_id = importer.start([Song(title="Long", artist="A"), Song(title="Slow", artist="B")])
+    _wait_until_stopped(importer, store, job_id)
+
+    progress = importer.progress(job_id)
+    assert progress["status"] == "incomplete"
+    assert progress["done"] == 1
+
+    # Only the song that ran out of time is picked up again
+    processed.clear()
+    assert importer.resume(job_id) == 1
+    _wait_until_stopped(importer, store, job_id)
+    assert processed == ["Slow"]
+
+
+def test_each_run_is_wrapped_by_track_run(tmp_path):
+    store = SharedStore(str(tmp_path))
+    runs = []
+
+    @contextmanager
+    def track_run(job_id, kind):
+        runs.append((job_id, kind, "start"))
+        yield
+        runs.append((job_id, kind, "end"))
+
+    def process(song, job_id):
+        runs.append((job_id, song.title, "song"))
+        song.download_status = "completed"
+        return song
+
+    importer = PlaylistImporter(store, process, track_run=track_run)
+    job_id = importer.start([Song(title="One", artist="A")])
+    _wait_until_stopped(importer, store, job_id)
+
+    assert runs == [(job_id, "import", "start"), (job_id, "One", "song"), (job_id, "import", "end")]
+
+
+def _checkpoint_left_by_a_crash(store):
+    """An import whose worker died after one song, in the middle of the second"""
+    store.register_job("crashed", "import", payload={"total": 3, "format": "text"})
+    store.add_import_items("crashed", [Song(title=t, artist="A") for t in ("One", "Two", "Three")])
+    store.update_import_item("crashed", 0, "completed")
+    store.update_import_item("crashed", 1, "running")
+    return "crashed"
+
+
+def _completing(processed):
+    def process(song, job_id):
+        processed.append(song.title)
+        song.download_status = "completed"
+        return song
+    return process
+
+
+def test_stale_import_is_resumed_from_its_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(playlist_import, "IMPORT_STALE_SECONDS", 0)
+    store = SharedStore(str(tmp_path))
+    job_id = _checkpoint_left_by_a_crash(store)
+    processed = []
+
+    # Any worker's importer can pick it up
+    importer = PlaylistImporter(store, _completing(processed), concurrency=1)
+    assert importer.progress(job_id)["resumable"]
+    assert importer.resume(job_id) == 2
+    _wait_until_stopped(importer, store, job_id)
+
+    assert processed == ["Two", "Three"]
+    progress = importer.progress(job_id)
+    assert progress["status"] == "completed"
+    assert progress["counts"] == {"completed": 3}
+    assert not progress["resumable"]
+
+
+def test_running_import_refuses_resume(tmp_path):
+    store = SharedStore(str(tmp_path))
+    # Still updating its checkpoints from another worker
+    job_id = _checkpoint_left_by_a_crash(store)
+    importer = PlaylistImporter(store, _completing([]))
+
+    assert not importer.progress(job_id)["resumable"]
+    with pytest.raises(RuntimeError):
+        importer.resume(job_id)
+    with pytest.raises(KeyError):
+        importer.resume("unknown")
+
+
+def test_import_running_here_refuses_resume(tmp_path):
+    store = SharedStore(str(tmp_path))
+    release = threading.Event()
+
+    def process(song, job_id):
+        release.wait(5)
+        song.download_status = "completed"
+        return song
+
+    importer = PlaylistImporter(store, process)
+    job_id = importer.start([Song(title="One", artist="A")])
+    try:
+        with pytest.raises(RuntimeError):
+            importer.resume(job_id)
+    finally:
+        release.set()
+    _wait_until_stopped(importer, store, job_id)
+
+
+def test_retry_failed_requeues_failed_and_missing_songs(tmp_path):
+    store = SharedStore(str(tmp_path))
+    outcomes = {"One": "completed", "Two": "failed", "Three": "not_found"}
+
+    def process(song, job_id):
+        song.download_status = outcomes[song.title]
+        return song
+
+    importer = PlaylistImporter(store, process)
+    job_id = importer.start([Song(title=t, artist="A") for t in outcomes])
+    _wait_until_stopped(importer, store, job_id)
+    # Failures are final: a plain resume has nothing to do
+    assert importer.progress(job_id)["status"] == "completed"
+    assert not importer.progress(job_id)["resumable"]
+
+    processed = []
+    importer.process_song = _completing(processed)
+    assert importer.resume(job_id, retry_failed=True) == 2
+    _wait_until_stopped(importer, store, job_id)
+    assert sorted(processed) == ["Three", "Two"]
+    assert importer.progress(job_id)["counts"] == {"completed": 3}
+
+
+def test_progress_reports_counts_and_throughput(tmp_path):
+    store = SharedStore(str(tmp_path))
+
+    def process(song, job_id):
+        song.download_status = "completed" if song.title != "Slow" else "timed_out"
+        return song
+
+    importer = PlaylistImporter(store, process)
+    job_id = importer.start([Song(title=t, artist="A") for t in ("One", "Two", "Slow")])
+    _wait_until_stopped(importer, store, job_id)
+
+    progress = importer.progress(job_id, include_items=True)
+    assert progress["total"] == 3
+    assert progress["done"] == 2
+    assert progress["counts"] == {"completed": 2, "timed_out": 1}
+    assert progress["songs_per_minute"] > 0
+    # Only shown while running
+    assert progress["eta_seconds"] is None
+    assert [item["status"] for item in progress["items"]] == ["completed", "completed", "timed_out"]
+    assert importer.progress("unknown") is None
+
+
+def test_import_endpoints(main, monkeypatch):
+    monkeypatch.setattr(main.playlist_importer, "process_song", _completing([]))
+    client = TestClient(main.app)
+
+    response = client.post("/api/import", json={"content": "Adele - Hello\nadele - hello\nQueen - Bohemian Rhapsody\n"})
+    assert response.status_code == 200
+    started = response.json()
+    assert started["total"] == 2
+    assert started["duplicates"] == 1
+
+    job_id = started["job_id"]
+    _wait_until_stopped(main.playlist_importer, main.shared_store, job_id)
+    progress = client.get(f"/api/import/{job_id}").json()
+    assert progress["status"] == "completed"
+    assert progress["done"] == 2
+
+    assert client.post(f"/api/import/{job_id}/resume").json() == {"job_id": job_id, "queued": 0}
+    assert client.get("/api/import/unknown").status_code == 404
+    assert client.post("/api/import/unknown/resume").status_code == 404
+    assert client.post("/api/import", json={"content": "# only a comment\n"}).status_code == 400
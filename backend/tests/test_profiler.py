@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from profiler import SamplingProfiler
+
+
+def _wait_until_done(session, timeout=5):
+    end = time.monotonic() + timeout
+    while session.running:
+        assert time.monotonic() < end, "profile didn't end"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def profiler():
+    profiler = SamplingProfiler(interval=0.005)
+    yield profiler
+    for session in profiler.sessions:
+        session.stop_requested = True
+        _wait_until_done(session)
+
+
+def test_memory_is_reported_per_job(profiler):
+    session = profiler.start(seconds=30, trace_memory=True)
+    kept = []
+    with profiler.track_job("big", "batch"):
+        kept.append(bytearray(2 * 1024 * 1024))
+    with profiler.track_job("small", "stream"):
+        kept.append(bytearray(1024))
+    profiler.stop()
+    _wait_until_done(session)
+
+    jobs = {job["job_id"]: job for job in session.summary()["jobs"]}
+    assert jobs["big"]["kind"] == "batch"
+    assert not jobs["big"]["unfinished"]
+    assert jobs["big"]["size_diff_kb"] >= 2048
+    # The first job's allocation isn't charged to the second
+    assert jobs["small"]["size_diff_kb"] < 1024
+
+
+def test_only_the_chosen_job_is_tracked(profiler):
+    session = profiler.start(seconds=30, trace_memory=True, job="wanted")
+    with profiler.track_job("other", "batch"):
+        pass
+    with profiler.track_job("wanted", "import"):
+        pass
+    profiler.stop()
+    _wait_until_done(session)
+
+    assert [job["job_id"] for job in session.jobs] == ["wanted"]
+    assert session.summary()["job"] == "wanted"
+
+
+def test_job_still_running_at_the_end_is_reported_unfinished(profiler):
+    session = profiler.start(seconds=30, trace_memory=True)
+    with profiler.track_job("long", "import"):
+        profiler.stop()
+        _wait_until_done(session)
+    [job] = session.jobs
+    assert job["job_id"] == "long"
+    assert job["unfinished"]
+
+
+def test_jobs_arent_tracked_without_memory_tracing(profiler):
+    with profiler.track_job("before", "batch"):
+        pass
+    session = profiler.start(seconds=30)
+    with profiler.track_job("during", "batch"):
+        pass
+    profiler.stop()
+    _wait_until_done(session)
+
+    assert session.jobs == []
+    assert session.summary()["jobs"] is None
+
+
+def test_sessions_sample_and_end_on_request_count(profiler):
+    session = profiler.start(requests=2)
+    time.sleep(0.05)
+    profiler.request_finished()
+    profiler.request_finished()
+    _wait_until_done(session)
+
+    assert session.samples > 0
+    assert session.summary()["requests_seen"] == 2
+
+
+def test_one_session_at_a_time(profiler):
+    profiler.start(seconds=30)
+    with pytest.raises(RuntimeError):
+        profiler.start(seconds=30)
@@ -0,0 +1,79 @@
+import pytest
+
+from coordination import SharedStore
+from rate_limiter import AdaptiveRateLimiter, is_throttle_error
+
+
+def test_success_raises_rate_additively_up_to_max():
+    limiter = AdaptiveRateLimiter(rate=1.0, max_rate=1.25, increase=0.1)
+    limiter.on_success()
+    assert limiter.stats()["rate"] == 1.1
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.stats()["rate"] == 1.25
+
+
+def test_throttle_halves_rate_and_pauses_longer_each_time():
+    limiter = AdaptiveRateLimiter(rate=4.0, min_rate=0.5, cooldown=10, max_cooldown=60)
+    limiter.on_throttle()
+    first = limiter.stats()
+    assert first["rate"] == 2.0
+    assert first["tokens"] == 0
+    assert 9 < first["paused_for"] <= 10
+
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.stats()["rate"] == 0.5
+    assert 39 < limiter.stats()["paused_for"] <= 40
+
+
+def test_burst_then_empty_bucket_times_out():
+    limiter = AdaptiveRateLimiter(rate=0.1, burst=2)
+    assert limiter.acquire(timeout=0)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.05)
+
+
+def test_call_retries_throttled_calls_only():
+    limiter = AdaptiveRateLimiter(rate=100, burst=5, cooldown=0.01)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("HTTP Error 429: Too Many Requests")
+        return "ok"
+
+    assert limiter.call(flaky, retries=1) == "ok"
+    assert limiter.stats()["throttles"] == 1
+    assert limiter.stats()["successes"] == 1
+
+    def broken():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+    assert limiter.stats()["throttles"] == 1
+
+
+def test_processes_sharing_a_store_share_one_bucket(tmp_path):
+    # Two limiters on one state dir stand in for two worker processes
+    first = AdaptiveRateLimiter(rate=1.0, burst=2)
+    second = AdaptiveRateLimiter(rate=1.0, burst=2)
+    first.share(SharedStore(str(tmp_path)))
+    second.share(SharedStore(str(tmp_path)))
+
+    assert first.acquire(timeout=0)
+    assert second.acquire(timeout=0)
+    assert not first.acquire(timeout=0)
+    assert not second.acquire(timeout=0)
+
+    second.on_throttle()
+    assert first.stats()["rate"] == 0.5
+    assert first.stats()["throttles"] == 1
+    assert first.stats()["shared"]
+
+
+def test_throttle_signals():
+    assert is_throttle_error("Sign in to confirm you're not a bot")
+    assert not is_throttle_error("Video unavailable")
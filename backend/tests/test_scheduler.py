@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+from fastapi import Request
+
+from deadline import Deadline, DeadlineExceeded
+from scheduler import BULK, INTERACTIVE, LIST, Scheduler
+
+
+def _run_in_order(scheduler, tasks):
+    """Hold the only worker, queue tasks as (name, priority, client, cost), return the run order"""
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.submit(gate.wait, 1)
+    futures = [
+        scheduler.submit(order.append, name, priority=priority, client=client, cost=cost)
+        for name, priority, client, cost in tasks
+    ]
+    gate.set()
+    blocker.result(1)
+    for future in futures:
+        future.result(1)
+    return order
+
+
+def test_shortest_job_first_within_a_client():
+    order = _run_in_order(Scheduler(workers=1, reserved=0), [
+        ("long", LIST, "a", 600),
+        ("short", LIST, "a", 120),
+        ("medium", LIST, "a", 240),
+    ])
+    assert order == ["short", "medium", "long"]
+
+
+def test_priority_beats_cost():
+    order = _run_in_order(Scheduler(workers=1, reserved=0), [
+        ("bulk", BULK, "a", 1),
+        ("list", LIST, "a", 500),
+        ("interactive", INTERACTIVE, "a", 900),
+    ])
+    assert order == ["interactive", "list", "bulk"]
+
+
+def test_clients_take_turns():
+    order = _run_in_order(Scheduler(workers=1, reserved=0), [
+        ("a1", LIST, "a", 1),
+        ("a2", LIST, "a", 2),
+        ("a3", LIST, "a", 3),
+        ("b1", LIST, "b", 9),
+    ])
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_cancelled_tasks_are_skipped():
+    scheduler = Scheduler(workers=1, reserved=0)
+    gate = threading.Event()
+    order = []
+    scheduler.submit(gate.wait, 1)
+    dropped = scheduler.submit(order.append, "dropped", cost=1)
+    kept = scheduler.submit(order.append, "kept", cost=2)
+    assert dropped.cancel()
+    gate.set()
+    kept.result(1)
+    assert order == ["kept"]
+
+
+def test_reserved_workers_never_take_bulk_work():
+    scheduler = Scheduler(workers=2, reserved=1)
+    gate = threading.Event()
+    imports = [scheduler.submit(gate.wait, 5, priority=BULK, client="import") for _ in range(2)]
+    time.sleep(0.05)
+
+    bulk = scheduler.stats()["classes"]["bulk"]
+    assert bulk["running"] == 1
+    assert bulk["queued"] == 1
+    # The reserved worker is still free for a song the user is waiting on
+    assert scheduler.run(lambda: "played", priority=INTERACTIVE, deadline=Deadline(1)) == "played"
+
+    gate.set()
+    for future in imports:
+        assert future.result(1)
+
+
+def test_task_still_queued_at_the_deadline_is_dropped():
+    scheduler = Scheduler(workers=1, reserved=0)
+    gate = threading.Event()
+    ran = []
+    scheduler.submit(gate.wait, 5, priority=INTERACTIVE)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            scheduler.run(ran.append, "late", priority=LIST, deadline=Deadline(0.05))
+    finally:
+        gate.set()
+    # Let the worker drain the queue; the dropped task must not run
+    scheduler.run(lambda: None, deadline=Deadline(1))
+    assert ran == []
+
+
+def test_task_already_running_at_the_deadline_is_waited_for():
+    scheduler = Scheduler(workers=1, reserved=0)
+    # It watches the deadline itself; the scheduler doesn't abandon it
+    assert scheduler.run(lambda: time.sleep(0.1) or "done", deadline=Deadline(0.02)) == "done"
+
+
+def test_tasks_see_their_priority_class():
+    scheduler = Scheduler(workers=2, reserved=1)
+    assert scheduler.run(scheduler.current_priority, priority=INTERACTIVE) == INTERACTIVE
+    assert scheduler.run(scheduler.current_priority, priority=BULK) == BULK
+    # Off the pool, callers get the default
+    assert scheduler.current_priority() == BULK
+    assert scheduler.current_priority(default=LIST) == LIST
+
+
+def test_requests_get_priority_by_size_and_share_by_client(main):
+    one = [main.Song(title="One", artist="A")]
+    assert main._priority(one) == INTERACTIVE
+    assert main._priority(one * 3) == LIST
+
+    def request(headers, client=("10.0.0.1", 1234)):
+        return Request({"type": "http", "headers": headers, "client": client})
+
+    assert main._client_id(request([(b"x-client-id", b"tab-1")])) == "tab-1"
+    assert main._client_id(request([])) == "10.0.0.1"
+    assert main._client_id(request([], client=None)) == "anonymous"
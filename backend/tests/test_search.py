@@ -0,0 +1,36 @@
+from fastapi.testclient import TestClient
+
+
+def test_search_at_a_quality_the_library_lacks_resolves_a_url(main, monkeypatch):
+    # The library only holds the song at the default profile
+    def find_in_library(song, quality=None):
+        if (quality or main.DEFAULT_QUALITY) != main.DEFAULT_QUALITY:
+            return False
+        song.file_path = "downloads/Artist - Song.m4a"
+        song.download_status = "completed"
+        return True
+
+    def resolve(song, deadline=None):
+        song.youtube_url = "https://youtu.be/song"
+        song.download_status = "ready"
+        return song
+
+    monkeypatch.setattr(main, "find_in_library", find_in_library)
+    monkeypatch.setattr(main, "resolve_song", resolve)
+    client = TestClient(main.app)
+    songs = [{"title": "Song", "artist": "Artist"}]
+
+    [hit] = client.post("/api/search-youtube", json=songs).json()["songs"]
+    assert hit["download_status"] == "completed"
+
+    # A song that will be downloaded at "best" needs its URL
+    [best] = client.post("/api/search-youtube?quality=best", json=songs).json()["songs"]
+    assert best["youtube_url"] == "https://youtu.be/song"
+    assert best["download_status"] == "ready"
+
+
+def test_search_rejects_unknown_quality(main):
+    response = TestClient(main.app).post(
+        "/api/search-youtube?quality=lossless", json=[{"title": "Song", "artist": "Artist"}]
+    )
+    assert response.status_code == 422
@@ -0,0 +1,223 @@
+import threading
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from downloader import MP3Downloader
+from singleflight import SingleFlight
+from youtube_service import YouTubeService
+
+
+def _run_leader(flights, started, release, outcome):
+    def slow():
+        started.set()
+        release.wait(1)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def leader():
+        try:
+            flights.do("song", slow)
+        except BaseException:
+            pass
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(1)
+    return thread
+
+
+def test_waiters_share_the_leaders_result():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    leader = _run_leader(flights, started, release, "shared")
+    calls = []
+
+    waiter = threading.Thread(target=lambda: calls.append(flights.do("song", lambda: "own")))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    waiter.join(1)
+    leader.join(1)
+    assert calls == ["shared"]
+    assert flights.in_flight() == 0
+
+
+def test_waiter_reruns_a_timeout_its_own_deadline_allows():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    leader = _run_leader(flights, started, release, DeadlineExceeded("leader ran out"))
+    deadline = Deadline(10)
+    results = []
+
+    def waiter():
+        results.append(flights.do(
+            "song", lambda: "own",
+            rerun=lambda outcome: isinstance(outcome, DeadlineExceeded) and not deadline.expired
+        ))
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    release.set()
+    thread.join(1)
+    leader.join(1)
+    assert results == ["own"]
+
+
+def test_waiter_without_time_left_gets_the_timeout():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    leader = _run_leader(flights, started, release, DeadlineExceeded("leader ran out"))
+    deadline = Deadline(0)
+    errors = []
+
+    def waiter():
+        try:
+            flights.do(
+                "song", lambda: "own",
+                rerun=lambda outcome: isinstance(outcome, DeadlineExceeded) and not deadline.expired
+            )
+        except DeadlineExceeded as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    release.set()
+    thread.join(1)
+    leader.join(1)
+    assert len(errors) == 1
+
+
+def test_leader_exception_propagates():
+    def broken():
+        raise ValueError("boom")
+
+    flights = SingleFlight()
+    with pytest.raises(ValueError):
+        flights.do("song", broken)
+    assert flights.in_flight() == 0
+
+
+def _call_together(first, second):
+    """Run first, then second while first is still in flight; return both results"""
+    results = {}
+    threads = [
+        threading.Thread(target=lambda: results.__setitem__("first", first())),
+        threading.Thread(target=lambda: results.__setitem__("second", second())),
+    ]
+    threads[0].start()
+    time.sleep(0.05)
+    threads[1].start()
+    for thread in threads:
+        thread.join(2)
+    return results["first"], results["second"]
+
+
+def _slow(calls, outcomes):
+    def run(*args):
+        calls.append(args)
+        time.sleep(0.15)
+        return outcomes.pop(0) if outcomes else {"success": True, "n": len(calls)}
+    return run
+
+
+def test_same_video_and_quality_download_once(tmp_path, monkeypatch):
+    dl = MP3Downloader(str(tmp_path))
+    calls = []
+    monkeypatch.setattr(dl, "_download_locked", _slow(calls, []))
+
+    first, second = _call_together(
+        lambda: dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A", quality="standard"),
+        lambda: dl.download_as_mp3("https://www.youtube.com/watch?v=abcdefghijk", "S", "A", quality="standard"),
+    )
+    assert len(calls) == 1
+    assert first == second
+    # Each caller gets its own copy to annotate
+    assert first is not second
+
+
+def test_other_quality_is_a_separate_download(tmp_path, monkeypatch):
+    dl = MP3Downloader(str(tmp_path))
+    calls = []
+    monkeypatch.setattr(dl, "_download_locked", _slow(calls, []))
+
+    _call_together(
+        lambda: dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A", quality="standard"),
+        lambda: dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A", quality="best"),
+    )
+    assert sorted(call[-1] for call in calls) == ["best", "standard"]
+
+
+def test_download_runs_again_once_finished(tmp_path, monkeypatch):
+    # Only simultaneous calls are shared; finished ones aren't cached
+    dl = MP3Downloader(str(tmp_path))
+    calls = []
+    monkeypatch.setattr(dl, "_download_locked", _slow(calls, []))
+
+    dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A")
+    dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A")
+    assert len(calls) == 2
+
+
+def test_download_timed_out_for_the_leader_is_rerun_by_a_waiter(tmp_path, monkeypatch):
+    dl = MP3Downloader(str(tmp_path))
+    calls = []
+    monkeypatch.setattr(dl, "_download_locked", _slow(calls, [{"success": False, "timed_out": True}]))
+
+    first, second = _call_together(
+        lambda: dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A", Deadline(0.1)),
+        lambda: dl.download_as_mp3("https://youtu.be/abcdefghijk", "S", "A", Deadline(10)),
+    )
+    assert first["timed_out"]
+    assert second["success"]
+    assert len(calls) == 2
+
+
+def test_respelled_searches_share_one_youtube_search(monkeypatch):
+    calls = []
+    monkeypatch.setattr(YouTubeService, "_search_video", staticmethod(_slow(calls, [{"url": "https://youtu.be/x"}])))
+
+    first, second = _call_together(
+        lambda: YouTubeService.search("Justin Bieber  Baby"),
+        lambda: YouTubeService.search("justin bieber baby"),
+    )
+    assert len(calls) == 1
+    assert first == second == {"url": "https://youtu.be/x"}
+
+
+def test_respelled_songs_resolve_once(main, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "_resolve_video", _slow(calls, [{"url": "https://youtu.be/x", "duration": 200}]))
+
+    first, second = _call_together(
+        lambda: main.resolve_song(main.Song(title="Baby", artist="Justin Bieber")),
+        lambda: main.resolve_song(main.Song(title="baby ", artist="justin  bieber")),
+    )
+    assert len(calls) == 1
+    assert first.youtube_url == second.youtube_url == "https://youtu.be/x"
+    assert first.download_status == second.download_status == "ready"
+
+
+def test_resolve_timed_out_for_the_leader_is_rerun_by_a_waiter(main, monkeypatch):
+    calls = []
+
+    def resolve(song, deadline):
+        calls.append(song.title)
+        time.sleep(0.15)
+        if len(calls) == 1:
+            raise DeadlineExceeded("search ran out")
+        return {"url": "https://youtu.be/x", "duration": 200}
+
+    monkeypatch.setattr(main, "_resolve_video", resolve)
+
+    first, second = _call_together(
+        lambda: main.resolve_song(main.Song(title="Baby", artist="Justin Bieber"), Deadline(0.1)),
+        lambda: main.resolve_song(main.Song(title="Baby", artist="Justin Bieber"), Deadline(10)),
+    )
+    assert first.download_status == "timed_out"
+    assert second.download_status == "ready"
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("langchain_openai", "yt_dlp", "numpy")
+
+
+def _loaded_after(tmp_path, code):
+    """Run code in a fresh interpreter that imported main; return the heavy modules loaded"""
+    script = f"import json, sys, main\n{code}\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND_DIR),
+        # Relative to the temporary working directory, like downloads/
+        "COORDINATION_DIR": ".state",
+        "WARMUP_ON_STARTUP": "0",
+        # Creating a client needs a key, not a reachable API
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "test"),
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    # main prints progress lines; the module list is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_importing_main_loads_no_heavy_dependencies(tmp_path):
+    assert _loaded_after(tmp_path, "") == []
+
+
+def test_warming_the_download_services_loads_yt_dlp(tmp_path):
+    pytest.importorskip("yt_dlp")
+    loaded = _loaded_after(tmp_path, "main.youtube_service.warm_up(); main.mp3_downloader.warm_up()")
+    assert loaded == ["yt_dlp"]
+
+
+def test_llm_client_is_created_on_first_use(tmp_path):
+    pytest.importorskip("langchain_openai")
+    loaded = _loaded_after(tmp_path, "main.song_extraction_agent.llm")
+    assert "langchain_openai" in loaded
+    assert "yt_dlp" not in loaded
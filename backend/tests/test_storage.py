@@ -0,0 +1,157 @@
+import os
+
+import pytest
+
+import storage
+from coordination import SharedStore
+from downloader import library_path
+from migrate_library import migrate
+from storage import StorageManager
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedStore(str(tmp_path / "state"))
+
+
+def _add(root, store, name, size):
+    path = library_path(root, name, create=True)
+    path.write_bytes(b"x" * size)
+    store.record_library_change(name)
+    return path
+
+
+def test_totals_follow_the_change_log_without_rescanning(tmp_path, store, monkeypatch):
+    root = tmp_path / "library"
+    _add(root, store, "A - One.m4a", 100)
+    manager = StorageManager(store, str(root), max_bytes=250)
+    assert manager.usage()["bytes"] == 100
+
+    def no_scan(root):
+        raise AssertionError("library rescanned")
+
+    monkeypatch.setattr(storage, "iter_library", no_scan)
+    _add(root, store, "B - Two.m4a", 100)
+    assert manager.enforce_quota() == []
+    assert manager.usage() == {"bytes": 200, "files": 2, "max_bytes": 250, "max_files": 0}
+
+
+def test_evicts_least_recently_used_unpinned_files(tmp_path, store):
+    root = tmp_path / "library"
+    for name in ("A - One.m4a", "B - Two.m4a", "C - Three.m4a"):
+        _add(root, store, name, 100)
+    store.touch_file("A - One.m4a")
+    store.touch_file("B - Two.m4a")
+    store.touch_file("C - Three.m4a")
+    store.pin_file("A - One.m4a", "job")
+    manager = StorageManager(store, str(root), max_bytes=200)
+
+    assert manager.enforce_quota() == ["B - Two.m4a"]
+    assert manager.usage()["bytes"] == 200
+    assert not library_path(root, "B - Two.m4a").exists()
+    # Logged for the other workers' totals and indexes
+    assert store.library_changes(3) == [{"seq": 4, "filename": "B - Two.m4a", "removed": True}]
+
+
+def test_hard_linked_duplicates_count_once(tmp_path, store):
+    root = tmp_path / "library"
+    original = _add(root, store, "A - One.m4a", 100)
+    manager = StorageManager(store, str(root), max_files=10)
+    assert manager.usage()["bytes"] == 100
+
+    duplicate = library_path(root, "A - One (Remastered).m4a", create=True)
+    os.link(original, duplicate)
+    store.record_library_change(duplicate.name)
+    assert manager.usage()["bytes"] == 100
+    assert manager.usage()["files"] == 2
+
+
+def test_migrate_never_replaces_a_file_already_in_the_shard(tmp_path, store, monkeypatch):
+    root = tmp_path / "library"
+    root.mkdir()
+    (root / "A - One.m4a").write_bytes(b"flat")
+    (root / "B - Two.m4a").write_bytes(b"flat")
+    sharded = library_path(root, "B - Two.m4a", create=True)
+
+    # The shard copy of B appears between the check and the move
+    real_exists = type(sharded).exists
+    monkeypatch.setattr(
+        type(sharded), "exists",
+        lambda path: False if path == sharded else real_exists(path)
+    )
+    sharded.write_bytes(b"downloaded meanwhile")
+
+    assert migrate(root, store=store) == {"moved": 1, "skipped": 1, "failed": 0}
+    assert sharded.read_bytes() == b"downloaded meanwhile"
+    assert library_path(root, "A - One.m4a").read_bytes() == b"flat"
+    assert not (root / "A - One.m4a").exists()
+    assert [change["filename"] for change in store.library_changes(0)] == ["A - One.m4a"]
+
+
+def test_recent_access_protects_a_file(tmp_path, store):
+    root = tmp_path / "library"
+    for name in ("A - One.m4a", "B - Two.m4a", "C - Three.m4a"):
+        _add(root, store, name, 100)
+    manager = StorageManager(store, str(root), max_bytes=200)
+    for name in ("A - One.m4a", "B - Two.m4a", "C - Three.m4a"):
+        manager.record_access(name)
+    # Playing the oldest file makes B the least recently used
+    manager.record_access("A - One.m4a")
+
+    assert manager.enforce_quota() == ["B - Two.m4a"]
+
+
+def test_file_count_quota_evicts_oldest_first(tmp_path, store):
+    root = tmp_path / "library"
+    names = ["A - One.m4a", "B - Two.m4a", "C - Three.m4a", "D - Four.m4a"]
+    for name in names:
+        _add(root, store, name, 10)
+        store.touch_file(name)
+    manager = StorageManager(store, str(root), max_files=2)
+
+    assert manager.enforce_quota() == names[:2]
+    assert manager.usage()["files"] == 2
+    # Within quota now: nothing more to do
+    assert manager.enforce_quota() == []
+
+
+def test_released_files_become_evictable(tmp_path, store):
+    root = tmp_path / "library"
+    for name in ("A - One.m4a", "B - Two.m4a"):
+        _add(root, store, name, 100)
+        store.touch_file(name)
+    manager = StorageManager(store, str(root), max_bytes=100)
+    manager.pin("A - One.m4a", "job-1")
+    manager.pin("B - Two.m4a", "job-2")
+
+    # Everything is pinned: the library stays over quota
+    assert manager.enforce_quota() == []
+    assert manager.usage()["bytes"] == 200
+
+    manager.release("job-2")
+    assert manager.enforce_quota() == ["B - Two.m4a"]
+
+
+def test_expired_pins_stop_protecting_files(tmp_path, store):
+    root = tmp_path / "library"
+    for name in ("A - One.m4a", "B - Two.m4a"):
+        _add(root, store, name, 100)
+        store.touch_file(name)
+    # Left behind by a worker that crashed before releasing it
+    store.pin_file("A - One.m4a", "crashed-job", ttl=-1)
+    manager = StorageManager(store, str(root), max_bytes=100)
+
+    assert manager.enforce_quota() == ["A - One.m4a"]
+    assert store.pinned_files() == set()
+
+
+def test_files_never_accessed_are_ordered_by_mtime(tmp_path, store):
+    root = tmp_path / "library"
+    old = _add(root, store, "A - One.m4a", 100)
+    _add(root, store, "B - Two.m4a", 100)
+    os.utime(old, (0, 0))
+    # A was never played; its 1970 mtime stands in for the access time
+    store.touch_file("B - Two.m4a")
+    manager = StorageManager(store, str(root), max_bytes=100)
+
+    assert manager.enforce_quota() == ["A - One.m4a"]
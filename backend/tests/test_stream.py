@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def downloads(main, monkeypatch):
+    # Every song resolves; downloads are recorded instead of fetched
+    fetched = []
+
+    def resolve(song, deadline=None):
+        song.youtube_url = f"https://youtu.be/{song.title}"
+        song.duration = 200
+        song.download_status = "ready"
+        return song
+
+    def download(song, owner=None, deadline=None, quality=None):
+        fetched.append(song.title)
+        song.download_status = "completed"
+        return song
+
+    monkeypatch.setattr(main, "resolve_song", resolve)
+    monkeypatch.setattr(main, "download_song", download)
+    monkeypatch.setattr(main, "find_in_library", lambda song, quality=None: False)
+    return fetched
+
+
+def _stream(main, titles, **body):
+    response = TestClient(main.app).post("/api/process-songs/stream", json={
+        "songs": [{"title": title, "artist": "Artist"} for title in titles],
+        **body
+    })
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_lazy_stream_downloads_only_prefetch(main, downloads, monkeypatch):
+    monkeypatch.setattr(main, "LIST_PREFETCH", 3)
+
+    events = _stream(main, "ABCDEF", lazy=True)
+
+    assert len(downloads) == 3
+    completed = [e for e in events if e["event"] == "completed"]
+    assert len(completed) == 3
+    assert all(e["song"]["download_status"] == "completed" for e in completed)
+
+    # The rest stop at "resolved", still ready to be fetched on play
+    fetched = {e["index"] for e in completed}
+    resolved = [e for e in events if e["event"] == "resolved" and e["index"] not in fetched]
+    assert len(resolved) == 3
+    assert all(e["song"]["download_status"] == "ready" for e in resolved)
+
+    done = events[-1]
+    assert done["event"] == "done"
+    assert done["success_count"] == 3
+    assert done["deferred_count"] == 3
+    assert done["failed_count"] == 0
+
+
+def test_lazy_stream_job_counts_deferred_songs(main, downloads, monkeypatch):
+    monkeypatch.setattr(main, "LIST_PREFETCH", 3)
+
+    events = _stream(main, "ABCDEF", lazy=True)
+
+    job = main.shared_store.get_job(events[0]["job_id"])
+    assert job["status"] == "completed"
+    result = job["result"]
+    assert result["processed"] == 3
+    assert result["deferred"] == 3
+    assert result["processed"] + result["deferred"] == result["total"] == 6
+
+
+def test_eager_stream_downloads_everything(main, downloads):
+    events = _stream(main, "ABCD")
+
+    assert sorted(downloads) == list("ABCD")
+    job = main.shared_store.get_job(events[0]["job_id"])
+    assert job["result"]["processed"] == 4
+    assert job["result"]["deferred"] == 0
+
+
+def test_each_song_completes_once(main, downloads):
+    # Searches start before the pipeline looks for songs that came with a
+    # URL; a song resolved in between must not be downloaded twice
+    for _ in range(20):
+        downloads.clear()
+        events = _stream(main, "ABCDEF")
+        assert sorted(downloads) == list("ABCDEF")
+        assert sorted(e["index"] for e in events if e["event"] == "completed") == list(range(6))
+
+
+def test_feed_starts_reports_each_song_then_ends(main, downloads, monkeypatch):
+    # A song already in the library finishes before any search
+    def find_in_library(song, quality=None):
+        if song.title != "A":
+            return False
+        song.file_path = "downloads/Artist - A.m4a"
+        song.download_status = "completed"
+        return True
+
+    monkeypatch.setattr(main, "find_in_library", find_in_library)
+    events = _stream(main, "ABC")
+
+    assert events[0]["event"] == "started"
+    assert events[-1] == {
+        "event": "done", "success_count": 3, "failed_count": 0, "timed_out_count": 0, "deferred_count": 0
+    }
+    for index in range(3):
+        kinds = [e["event"] for e in events if e.get("index") == index]
+        assert kinds == ["resolved", "completed"]
+    # Songs about to be downloaded can be played while they download
+    resolved = {e["index"]: e for e in events if e["event"] == "resolved"}
+    assert "stream_file" not in resolved[0]
+    assert resolved[1]["stream_file"] == "Artist - B"
+    assert sorted(downloads) == ["B", "C"]
@@ -0,0 +1,44 @@
+import asyncio
+
+
+def _follow(main, stem, part_path):
+    async def collect():
+        return b"".join([chunk async for chunk in main._follow_download(stem, part_path)])
+    return asyncio.run(collect())
+
+
+def test_part_renamed_before_open_sends_finished_file(main, monkeypatch, tmp_path):
+    final = tmp_path / "Artist - Song.m4a"
+    final.write_bytes(b"complete audio")
+    monkeypatch.setattr(main.mp3_downloader, "partial_download", lambda stem: None)
+    monkeypatch.setattr(main.mp3_downloader, "find_existing", lambda stem: final)
+
+    assert _follow(main, "Artist - Song", tmp_path / "Artist - Song.m4a.part") == b"complete audio"
+
+
+def test_part_gone_and_nothing_written_ends_stream(main, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "FOLLOW_START_TIMEOUT", 0)
+    monkeypatch.setattr(main.mp3_downloader, "partial_download", lambda stem: None)
+    monkeypatch.setattr(main.mp3_downloader, "find_existing", lambda stem: None)
+
+    assert _follow(main, "Artist - Song", tmp_path / "Artist - Song.m4a.part") == b""
+
+
+def test_follows_part_until_download_ends(main, monkeypatch, tmp_path):
+    part = tmp_path / "Artist - Song.m4a.part"
+    part.write_bytes(b"first ")
+    downloading = [True]
+
+    def partial(stem):
+        # The download appends once more, then finishes
+        if downloading[0]:
+            downloading[0] = False
+            with open(part, "ab") as f:
+                f.write(b"second")
+            return part
+        return None
+
+    monkeypatch.setattr(main, "FOLLOW_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(main.mp3_downloader, "partial_download", partial)
+
+    assert _follow(main, "Artist - Song", part) == b"first second"
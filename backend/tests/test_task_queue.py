@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+import task_queue
+import worker
+from coordination import SharedStore
+from deadline import Deadline, DeadlineExceeded
+from task_queue import SQLiteTaskQueue
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedStore(str(tmp_path))
+
+
+def test_claims_most_urgent_then_cheapest(store):
+    store.enqueue_task("bulk", "download", {}, priority=2, cost=1)
+    store.enqueue_task("long", "download", {}, priority=1, cost=600)
+    store.enqueue_task("short", "download", {}, priority=1, cost=120)
+    store.enqueue_task("search", "search", {}, priority=0)
+
+    claimed = [store.claim_task("w", ["download"], lease=30, max_attempts=3)["task_id"] for _ in range(3)]
+    assert claimed == ["short", "long", "bulk"]
+    assert store.claim_task("w", ["download"], lease=30, max_attempts=3) is None
+
+
+def test_lapsed_lease_moves_task_to_another_worker(store):
+    store.enqueue_task("t", "download", {}, priority=1)
+    assert store.claim_task("dead", ["download"], lease=0.01, max_attempts=3)["attempts"] == 0
+    time.sleep(0.02)
+
+    task = store.claim_task("alive", ["download"], lease=30, max_attempts=3)
+    assert task["task_id"] == "t" and task["attempts"] == 1
+
+    # The first worker lost its lease: it can't renew it or report a result
+    assert not store.renew_task("t", "dead", 30)
+    store.finish_task("t", "dead", {"value": "stale"})
+    assert store.task_result("t") == ("running", None)
+
+    assert store.renew_task("t", "alive", 30)
+    store.finish_task("t", "alive", {"value": "fresh"})
+    assert store.task_result("t") == ("done", {"value": "fresh"})
+
+
+def test_task_fails_after_max_attempts(store):
+    store.enqueue_task("t", "download", {}, priority=1)
+    for _ in range(2):
+        assert store.claim_task("w", ["download"], lease=0.01, max_attempts=2)
+        time.sleep(0.02)
+
+    assert store.claim_task("w", ["download"], lease=0.01, max_attempts=2) is None
+    status, result = store.task_result("t")
+    assert status == "done" and "error" in result
+
+
+def test_released_task_does_not_use_up_an_attempt(store):
+    store.enqueue_task("t", "download", {}, priority=1)
+    store.claim_task("w", ["download"], lease=30, max_attempts=1)
+    store.release_task("t", "w")
+    assert store.claim_task("w", ["download"], lease=30, max_attempts=1)["attempts"] == 0
+
+
+def _serve_one(store, monkeypatch, outcome):
+    def fake_run_task(kind, payload, deadline, downloader, youtube):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(worker, "run_task", fake_run_task)
+    monkeypatch.setattr(task_queue, "TASK_POLL_INTERVAL", 0.01)
+
+    def serve():
+        while not worker.work_one(store, "w", ["search"], None, None):
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    return thread
+
+
+def test_api_node_gets_the_workers_result(store, monkeypatch):
+    thread = _serve_one(store, monkeypatch, {"match": {"url": "https://youtu.be/x"}})
+    result = SQLiteTaskQueue(store).run("search", {"query": "q"}, Deadline(5))
+    thread.join(1)
+    assert result == {"match": {"url": "https://youtu.be/x"}}
+    assert store.task_counts() == {}
+
+
+def test_worker_errors_and_timeouts_reach_the_api_node(store, monkeypatch):
+    thread = _serve_one(store, monkeypatch, ValueError("boom"))
+    with pytest.raises(RuntimeError, match="boom"):
+        SQLiteTaskQueue(store).run("search", {"query": "q"}, Deadline(5))
+    thread.join(1)
+
+    thread = _serve_one(store, monkeypatch, DeadlineExceeded("ran out"))
+    with pytest.raises(DeadlineExceeded):
+        SQLiteTaskQueue(store).run("search", {"query": "q"}, Deadline(5))
+    thread.join(1)
+
+
+def test_unclaimed_task_is_dropped_at_the_deadline(store, monkeypatch):
+    monkeypatch.setattr(task_queue, "TASK_POLL_INTERVAL", 0.01)
+    with pytest.raises(DeadlineExceeded):
+        SQLiteTaskQueue(store).run("search", {"query": "q"}, Deadline(0.05))
+    assert store.task_counts() == {}
+
+
+def test_backends_must_implement_run_and_stats():
+    class Incomplete(task_queue.TaskQueue):
+        def stats(self):
+            return {}
+
+    with pytest.raises(TypeError):
+        Incomplete()
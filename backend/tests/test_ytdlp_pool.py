@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from deadline import DeadlineExceeded
+from ytdlp_pool import YtDlpPool, _call
+
+
+class ExtractorError(Exception):
+    """Stands in for yt-dlp's own exception types"""
+
+
+def fail(message):
+    raise ExtractorError(message)
+
+
+def run_out():
+    raise DeadlineExceeded("Deadline exceeded during download")
+
+
+def crash_once(marker):
+    # The first worker dies mid-task; the retry finds the marker and succeeds
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "ok"
+
+
+def crash():
+    os._exit(1)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = YtDlpPool(processes=1, tasks_per_process=0)
+    yield pool
+    if pool._executor is not None:
+        pool._executor.shutdown()
+
+
+def test_worker_errors_come_back_as_runtime_errors_with_the_message():
+    with pytest.raises(RuntimeError, match="HTTP Error 429"):
+        _call(fail, ("HTTP Error 429: Too Many Requests",))
+
+
+def test_deadline_errors_pass_through_unchanged():
+    with pytest.raises(DeadlineExceeded):
+        _call(run_out, ())
+
+
+def test_disabled_pool_runs_in_process_without_mapping():
+    with pytest.raises(ExtractorError):
+        YtDlpPool(processes=0).run(fail, "Video unavailable")
+
+
+def test_pool_maps_errors_across_processes(pool):
+    with pytest.raises(RuntimeError, match="Video unavailable"):
+        pool.run(fail, "Video unavailable")
+    with pytest.raises(DeadlineExceeded):
+        pool.run(run_out)
+
+
+def test_dead_worker_is_replaced_and_the_task_retried(pool, tmp_path):
+    recycled = pool.stats()["recycled"]
+    assert pool.run(crash_once, str(tmp_path / "crashed")) == "ok"
+    assert pool.stats()["recycled"] == recycled + 1
+
+
+def test_task_that_keeps_killing_workers_fails(pool):
+    recycled = pool.stats()["recycled"]
+    with pytest.raises(RuntimeError, match="worker crashed"):
+        pool.run(crash)
+    assert pool.stats()["recycled"] == recycled + 2
@@ -0,0 +1,74 @@
+"""
+Fails a load test that blocked the backend's event loop.
+
+Notes the last recorded stall, runs the load command given after "--",
+then reads /api/debug/event-loop again and fails if the run caused any stall
+longer than --max-stall seconds, or pushed the p99 lag over --max-p99. Each
+offending stall is printed with the request and stack that blocked the loop.
+
+    python tools/check_loop_lag.py --url http://localhost:8000 -- \\
+        locust -f loadtest.py --headless -u 50 -t 2m --host http://localhost:8000
+
+Without a command it just checks the stalls recorded so far. The numbers
+are per uvicorn worker, so run the backend with one worker while testing.
+Exits non-zero on failure.
+"""
+import argparse
+import subprocess
+import sys
+
+import requests
+
+
+def fetch(url: str, since: int = 0) -> dict:
+    response = requests.get(f"{url}/api/debug/event-loop", params={"since": since}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail a load test that blocked the event loop")
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend base URL")
+    parser.add_argument("--max-stall", type=float, default=0.25, help="Longest acceptable stall (seconds)")
+    parser.add_argument("--max-p99", type=float, default=0.05, help="Highest acceptable p99 lag (seconds)")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Load command, after --")
+    args = parser.parse_args()
+    url = args.url.rstrip("/")
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    before = fetch(url)
+    if not before["running"]:
+        raise SystemExit("The backend's loop monitor is off (LOOP_MONITOR=0)")
+    last_seen = max((stall["id"] for stall in before["stalls"]), default=0) if command else 0
+
+    if command:
+        print(f"Running: {' '.join(command)}")
+        load = subprocess.run(command)
+        if load.returncode:
+            print(f"⚠️ Load command exited with {load.returncode}")
+
+    after = fetch(url, since=last_seen)
+    print(f"Lag p50 {after['lag_p50']}s, p99 {after['lag_p99']}s, max {after['lag_max']}s; "
+          f"{len(after['stalls'])} stall(s) recorded")
+
+    failures = 0
+    for stall in after["stalls"]:
+        # A stall still in progress has no duration yet; judge it by what was seen
+        duration = stall["duration"] if stall["duration"] is not None else stall["blocked_when_seen"]
+        if duration <= args.max_stall:
+            continue
+        failures += 1
+        print(f"\n❌ Loop blocked {duration}s during {stall['request'] or 'no request'}:")
+        for frame in stall["stack"]:
+            print(f"    {frame}")
+
+    if after["lag_p99"] is not None and after["lag_p99"] > args.max_p99:
+        failures += 1
+        print(f"\n❌ p99 lag {after['lag_p99']}s is over {args.max_p99}s")
+
+    print("\nEvent loop OK" if not failures else f"\n{failures} problem(s) found")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
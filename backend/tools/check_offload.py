@@ -0,0 +1,245 @@
+"""
+Checks file offload (FILE_OFFLOAD).
+
+Range and conditional requests on offloaded files are handled entirely by
+the reverse proxy, so the only real test of them is against the proxy
+itself. With --proxy, a library file is requested through /api/stream-file
+and /api/download-file on a real nginx in front of the backend (see README,
+"File Offload"), checking that:
+- full responses match the file byte for byte
+- byte ranges (bounded, open-ended, suffix, unsatisfiable, If-Range) work
+- conditional requests (If-None-Match, If-Modified-Since) answer 304
+- the offload headers never reach the client; app errors (404) pass through
+
+    python tools/check_offload.py --proxy http://localhost:8080
+
+Without a proxy, --standin starts the backend with FILE_OFFLOAD=x-accel (or
+x-sendfile) and checks the app's own side of the contract: an empty
+response whose X-Accel-Redirect / X-Sendfile names the right file, with
+the audio Content-Type, Content-Disposition and CORS headers the proxy
+will pass on, and no attempt to handle ranges itself. It says nothing
+about what the proxy then does with the file:
+    python tools/check_offload.py --standin
+    python tools/check_offload.py --standin --mode x-sendfile
+
+Run from the backend directory. Exits non-zero if any check fails.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote, unquote
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from downloader import iter_library, locate  # noqa: E402
+
+OFFLOAD_HEADERS = ("x-accel-redirect", "x-sendfile")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# nginx internal location the stand-in backend is configured with
+STANDIN_ACCEL_PREFIX = "/_library/"
+
+
+def start_standin(mode: str) -> tuple:
+    """Start the backend with offload on; returns its URL and a stop function"""
+    port = _free_port()
+    env = dict(os.environ, FILE_OFFLOAD=mode, FILE_OFFLOAD_PREFIX=STANDIN_ACCEL_PREFIX)
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    for _ in range(100):
+        try:
+            requests.get(url + "/", timeout=1)
+            break
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    else:
+        backend.terminate()
+        raise SystemExit("Backend did not start")
+
+    def stop():
+        backend.terminate()
+        backend.wait()
+
+    return url, stop
+
+
+def _offload_target(headers, mode: str, downloads: Path) -> Optional[Path]:
+    """The file an offload response tells the proxy to send"""
+    if mode == "x-accel":
+        uri = headers.get("X-Accel-Redirect")
+        prefix = STANDIN_ACCEL_PREFIX.rstrip("/") + "/"
+        if not uri or not uri.startswith(prefix):
+            return None
+        return downloads / unquote(uri[len(prefix):])
+    sendfile = headers.get("X-Sendfile")
+    return Path(sendfile) if sendfile else None
+
+
+def run_app_checks(base_url: str, path: Path, downloads: Path, mode: str) -> int:
+    """Check the backend's offload responses; returns the number of failures"""
+    stream_url = f"{base_url}/api/stream-file/{quote(path.name)}"
+    download_url = f"{base_url}/api/download-file/{quote(path.name)}"
+    header = "X-Accel-Redirect" if mode == "x-accel" else "X-Sendfile"
+    failures = 0
+
+    def check(name: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"  {'✅' if ok else '❌'} {name}{'' if ok else f'  ({detail})'}")
+        failures += 0 if ok else 1
+
+    def check_offloaded(label: str, r, disposition: str):
+        target = _offload_target(r.headers, mode, downloads)
+        check(f"{label}: 200 with an empty body", r.status_code == 200 and not r.content,
+              f"status {r.status_code}, {len(r.content)} bytes")
+        check(f"{label}: {header} names the library file",
+              target is not None and target.is_file() and target.samefile(path),
+              f"{header}: {r.headers.get(header, 'missing')}")
+        check(f"{label}: audio Content-Type", r.headers.get("Content-Type", "").startswith("audio/"),
+              r.headers.get("Content-Type", "missing"))
+        check(f"{label}: {disposition} Content-Disposition with the file name",
+              r.headers.get("Content-Disposition") == f'{disposition}; filename="{path.name}"',
+              r.headers.get("Content-Disposition", "missing"))
+        check(f"{label}: CORS header", r.headers.get("Access-Control-Allow-Origin") == "*",
+              r.headers.get("Access-Control-Allow-Origin", "missing"))
+
+    check_offloaded("stream-file", requests.get(stream_url), "inline")
+    check_offloaded("download-file", requests.get(download_url), "attachment")
+
+    # Ranges and validators are the proxy's job; the app must just offload
+    r = requests.get(stream_url, headers={"Range": "bytes=0-99", "If-None-Match": '"any"'})
+    check("Range/If-None-Match left to the proxy (no 206/304, no Content-Range)",
+          r.status_code == 200 and header in r.headers and "Content-Range" not in r.headers,
+          f"status {r.status_code}, {header}: {r.headers.get(header, 'missing')}")
+
+    r = requests.get(f"{base_url}/api/stream-file/{quote('No Such Artist - No Such Song.m4a')}")
+    check("missing file: 404 and nothing offloaded",
+          r.status_code == 404 and not any(h in r.headers for h in OFFLOAD_HEADERS),
+          f"status {r.status_code}")
+
+    return failures
+
+
+def run_checks(base_url: str, filename: str, data: bytes) -> int:
+    """Run every check against a real proxy; returns the number of failures"""
+    size = len(data)
+    stream_url = f"{base_url}/api/stream-file/{quote(filename)}"
+    download_url = f"{base_url}/api/download-file/{quote(filename)}"
+    failures = 0
+
+    def check(name: str, ok: bool, detail: str = ""):
+        nonlocal failures
+        print(f"  {'✅' if ok else '❌'} {name}{'' if ok else f'  ({detail})'}")
+        failures += 0 if ok else 1
+
+    full = requests.get(stream_url)
+    check("full GET: 200 and identical bytes", full.status_code == 200 and full.content == data,
+          f"status {full.status_code}, {len(full.content)} of {size} bytes")
+    check("offload headers not leaked", not any(h in full.headers for h in OFFLOAD_HEADERS),
+          ", ".join(h for h in OFFLOAD_HEADERS if h in full.headers))
+    check("audio Content-Type kept", full.headers.get("Content-Type", "").startswith("audio/"),
+          full.headers.get("Content-Type", "missing"))
+    check("inline Content-Disposition kept", full.headers.get("Content-Disposition", "").startswith("inline"),
+          full.headers.get("Content-Disposition", "missing"))
+    check("CORS header present", full.headers.get("Access-Control-Allow-Origin") == "*",
+          full.headers.get("Access-Control-Allow-Origin", "missing"))
+
+    ranges = [
+        ("bounded range", "bytes=0-1023", 0, min(1023, size - 1)),
+        ("open-ended range", f"bytes={size // 2}-", size // 2, size - 1),
+        ("suffix range", "bytes=-500", max(0, size - 500), size - 1),
+    ]
+    for name, header, start, end in ranges:
+        r = requests.get(stream_url, headers={"Range": header})
+        check(f"{name}: 206, Content-Range and bytes",
+              r.status_code == 206
+              and r.headers.get("Content-Range") == f"bytes {start}-{end}/{size}"
+              and r.content == data[start:end + 1],
+              f"status {r.status_code}, {r.headers.get('Content-Range')}, {len(r.content)} bytes")
+
+    r = requests.get(stream_url, headers={"Range": f"bytes={size}-"})
+    check("unsatisfiable range: 416", r.status_code == 416, f"status {r.status_code}")
+
+    etag, last_modified = full.headers.get("ETag"), full.headers.get("Last-Modified")
+    check("validators present (ETag, Last-Modified)", bool(etag and last_modified), f"{etag}, {last_modified}")
+    if etag:
+        r = requests.get(stream_url, headers={"If-None-Match": etag})
+        check("If-None-Match: 304 with no body", r.status_code == 304 and not r.content, f"status {r.status_code}")
+        r = requests.get(stream_url, headers={"Range": "bytes=0-99", "If-Range": '"stale"'})
+        check("If-Range with stale ETag: full 200", r.status_code == 200 and len(r.content) == size,
+              f"status {r.status_code}")
+        r = requests.get(stream_url, headers={"Range": "bytes=0-99", "If-Range": etag})
+        check("If-Range with current ETag: 206", r.status_code == 206 and r.content == data[:100],
+              f"status {r.status_code}")
+    if last_modified:
+        r = requests.get(stream_url, headers={"If-Modified-Since": last_modified})
+        check("If-Modified-Since: 304", r.status_code == 304, f"status {r.status_code}")
+
+    r = requests.get(download_url)
+    check("download-file: attachment with identical bytes",
+          r.status_code == 200 and r.content == data
+          and r.headers.get("Content-Disposition", "").startswith("attachment"),
+          f"status {r.status_code}, {r.headers.get('Content-Disposition')}")
+    r = requests.get(download_url, headers={"Range": "bytes=100-199"})
+    check("download-file: range", r.status_code == 206 and r.content == data[100:200], f"status {r.status_code}")
+
+    r = requests.get(f"{base_url}/api/stream-file/{quote('No Such Artist - No Such Song.m4a')}")
+    check("missing file: app's 404 passes through", r.status_code == 404, f"status {r.status_code}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check file offload through a proxy, or the app's offload responses")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--proxy", help="Base URL of the reverse proxy in front of the backend")
+    target.add_argument("--standin", action="store_true",
+                        help="Start the backend with offload on and check its offload responses")
+    parser.add_argument("--mode", choices=["x-accel", "x-sendfile"], default="x-accel",
+                        help="Offload mode for --standin")
+    parser.add_argument("--file", help="Library file to request (default: any)")
+    parser.add_argument("--downloads", default=str(BACKEND_DIR / "downloads"))
+    args = parser.parse_args()
+
+    downloads = Path(args.downloads).resolve()
+    path = locate(downloads, args.file) if args.file else next(iter_library(downloads), None)
+    if path is None:
+        raise SystemExit("No library file to test with; pass --file or download a song first")
+
+    if args.proxy:
+        base_url = args.proxy.rstrip("/")
+        data = path.read_bytes()
+        print(f"Checking {path.name} ({len(data)} bytes) through {base_url}")
+        failures = run_checks(base_url, path.name, data)
+    else:
+        base_url, stop = start_standin(args.mode)
+        print(f"Checking the backend's {args.mode} responses for {path.name} (no proxy: ranges "
+              f"and conditional requests are only tested with --proxy)")
+        try:
+            failures = run_app_checks(base_url, path, downloads, args.mode)
+        finally:
+            stop()
+
+    print("All checks passed" if not failures else f"{failures} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
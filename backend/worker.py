@@ -0,0 +1,105 @@
+"""
+Download worker: claims search and download tasks queued by API nodes
+running with TASK_QUEUE=sqlite, runs them through YouTubeService and
+MP3Downloader, and reports the results (downloads land in the shared
+library; the API node finds them there by file name).
+
+Workers and API nodes must share COORDINATION_DIR and the library directory
+(same host, or a shared volume). Run as many workers as bandwidth allows:
+    python worker.py
+    python worker.py --kinds download --downloads /mnt/library
+
+Run from the backend directory. Ctrl-C hands the current task back.
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+
+from coordination import SharedStore
+from deadline import Deadline, DeadlineExceeded
+from downloader import MP3Downloader
+from rate_limiter import youtube_rate_limiter
+from task_queue import TASK_KINDS, TASK_LEASE_SECONDS, TASK_MAX_ATTEMPTS, run_task
+from youtube_service import YouTubeService
+
+
+def _keep_lease(store: SharedStore, task_id: str, worker: str, done: threading.Event):
+    """Renew the lease on a running task until it finishes"""
+    while not done.wait(TASK_LEASE_SECONDS / 3):
+        if not store.renew_task(task_id, worker, TASK_LEASE_SECONDS):
+            print(f"   ⚠️ Lost the lease on task {task_id}")
+            return
+
+
+def work_one(store: SharedStore, worker: str, kinds: list, downloader: MP3Downloader, youtube: YouTubeService) -> bool:
+    """
+    Claim and run one task
+
+    Returns:
+        False if there was nothing to claim
+    """
+    task = store.claim_task(worker, kinds, TASK_LEASE_SECONDS, TASK_MAX_ATTEMPTS)
+    if task is None:
+        return False
+
+    task_id, payload = task["task_id"], task["payload"]
+    print(f"\n📥 {task['kind']} task {task_id} (priority {task['priority']}, attempt {task['attempts'] + 1})")
+
+    done = threading.Event()
+    threading.Thread(target=_keep_lease, args=(store, task_id, worker, done), daemon=True).start()
+    try:
+        if task["deadline_at"] is not None:
+            deadline = Deadline(task["deadline_at"] - time.time())
+            deadline.check(f"{task['kind']} task")
+        else:
+            deadline = Deadline()
+        outcome = {"value": run_task(task["kind"], payload, deadline, downloader, youtube)}
+    except DeadlineExceeded as e:
+        print(f"   ⏱️ {e}")
+        outcome = {"error": str(e), "timed_out": True}
+    except KeyboardInterrupt:
+        store.release_task(task_id, worker)
+        raise
+    except Exception as e:
+        print(f"   ❌ Task failed: {e}")
+        print(traceback.format_exc())
+        outcome = {"error": str(e)}
+    finally:
+        done.set()
+
+    store.finish_task(task_id, worker, outcome)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued search and download tasks")
+    parser.add_argument("--downloads", default="downloads", help="Library directory (shared with the API nodes)")
+    parser.add_argument("--kinds", default=",".join(TASK_KINDS), help="Task kinds to take, comma-separated")
+    parser.add_argument("--name", default=f"{socket.gethostname()}:{os.getpid()}", help="Worker name")
+    parser.add_argument("--poll", type=float, default=0.5, help="Seconds between polls of an empty queue")
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = set(kinds) - set(TASK_KINDS)
+    if unknown:
+        parser.error(f"unknown task kinds: {', '.join(sorted(unknown))}")
+
+    store = SharedStore()
+    youtube_rate_limiter.share(store)
+    downloader = MP3Downloader(args.downloads, store=store)
+    youtube = YouTubeService()
+
+    print(f"👷 Worker {args.name} taking {', '.join(kinds)} tasks from {store.state_dir}")
+    try:
+        while True:
+            if not work_one(store, args.name, kinds, downloader, youtube):
+                time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print(f"\n👋 Worker {args.name} stopped")
+
+
+if __name__ == "__main__":
+    main()
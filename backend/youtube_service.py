@@ -1,74 +1,132 @@
-import yt_dlp
 from typing import Optional
 import traceback
 import re
 
+from deadline import Deadline, DeadlineExceeded
+from rate_limiter import youtube_rate_limiter
+from singleflight import SingleFlight
+from ytdlp_pool import ytdlp_pool
+
+# Identical searches running at the same time share one yt-dlp lookup
+_search_flights = SingleFlight()
+
+
+def first_search_result(search_url: str, socket_timeout: Optional[float] = None) -> Optional[dict]:
+    """
+    Run a yt-dlp search and return only the first hit's url, title and
+    duration (None if nothing usable came back). Module-level so it can run
+    in a yt-dlp worker process.
+    """
+    import yt_dlp
+    
+    # Configure yt-dlp for searching
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': True,  # Don't download, just get info
+        'skip_download': True,
+    }
+    if socket_timeout is not None:
+        ydl_opts['socket_timeout'] = socket_timeout
+    
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        result = ydl.extract_info(search_url, download=False)
+    
+    if not result or 'entries' not in result:
+        return None
+    
+    # Filter out None entries
+    valid_entries = [e for e in result['entries'] if e is not None]
+    if not valid_entries:
+        return None
+    
+    first_video = valid_entries[0]
+    video_id = first_video.get('id')
+    if video_id:
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+    else:
+        # Try to extract from URL or webpage_url
+        video_url = first_video.get('url') or first_video.get('webpage_url')
+    if not video_url:
+        return None
+    
+    return {
+        'url': video_url,
+        'title': first_video.get('title', 'Unknown'),
+        # Flat search results already carry the length
+        'duration': first_video.get('duration')
+    }
+
 
 class YouTubeService:
     """Service to search YouTube videos using yt-dlp"""
     
     @staticmethod
-    def search_video(query: str, limit: int = 1) -> Optional[str]:
+    def search_video(query: str, limit: int = 1, deadline: Optional[Deadline] = None) -> Optional[str]:
         """
         Search YouTube for a video and return the first result URL using yt-dlp
         
         Args:
             query: Search query string
             limit: Number of results to fetch
+            deadline: Request deadline; the search is given only what is left of it
             
         Returns:
             YouTube video URL or None if not found
+            
+        Raises:
+            DeadlineExceeded: if the deadline ran out before a result was found
         """
+        result = YouTubeService.search(query, limit, deadline)
+        return result['url'] if result else None
+    
+    @staticmethod
+    def search(query: str, limit: int = 1, deadline: Optional[Deadline] = None) -> Optional[dict]:
+        """
+        Like search_video, but returns the first result's url, title and
+        duration (seconds, None if YouTube didn't say), so callers can plan
+        downloads before fetching anything
+        
+        Concurrent calls with the same query are coalesced into one search.
+        """
+        key = f"{limit}:{' '.join(query.lower().split())}"
+        return _search_flights.do(key, YouTubeService._search_video, query, limit, deadline or Deadline())
+    
+    @staticmethod
+    def _search_video(query: str, limit: int, deadline: Deadline) -> Optional[dict]:
+        """Run the actual yt-dlp search (in a yt-dlp worker process, if enabled)"""
+        deadline.check("YouTube search")
+        
         try:
             print(f"\n🔍 Searching YouTube for: '{query}'")
             
-            # Configure yt-dlp for searching
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True,  # Don't download, just get info
-                'skip_download': True,
-            }
+            socket_timeout = deadline.timeout(stage="YouTube search")
+            # Use ytsearch: prefix to search YouTube
+            search_url = f"ytsearch{limit}:{query}"
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Use ytsearch: prefix to search YouTube
-                search_url = f"ytsearch{limit}:{query}"
-                
-                try:
-                    result = ydl.extract_info(search_url, download=False)
-                    
-                    if result and 'entries' in result:
-                        entries = result['entries']
-                        
-                        # Filter out None entries
-                        valid_entries = [e for e in entries if e is not None]
-                        
-                        if valid_entries:
-                            first_video = valid_entries[0]
-                            
-                            # Get video ID
-                            video_id = first_video.get('id')
-                            video_title = first_video.get('title', 'Unknown')
-                            
-                            if video_id:
-                                video_url = f"https://www.youtube.com/watch?v={video_id}"
-                                print(f"✅ Found: '{video_title}'")
-                                print(f"   URL: {video_url}")
-                                return video_url
-                            else:
-                                # Try to extract from URL or webpage_url
-                                url = first_video.get('url') or first_video.get('webpage_url')
-                                if url:
-                                    print(f"✅ Found: '{video_title}'")
-                                    print(f"   URL: {url}")
-                                    return url
+            try:
+                # Paced by the shared YouTube limiter; retried if throttled
+                first_video = youtube_rate_limiter.call(
+                    ytdlp_pool.run, first_search_result, search_url, socket_timeout,
+                    timeout=deadline.remaining()
+                )
                 
-                except Exception as e:
-                    print(f"⚠️ yt-dlp extraction error: {e}")
+                if first_video:
+                    print(f"✅ Found: '{first_video['title']}' ({first_video['duration'] or '?'}s)")
+                    print(f"   URL: {first_video['url']}")
+                    return first_video
+            
+            except Exception as e:
+                print(f"⚠️ yt-dlp extraction error: {e}")
             
+            # A search cut short by the deadline isn't a "no results"
+            deadline.check("YouTube search")
             print(f"❌ No results found for: '{query}'")
             return None
             
+        except DeadlineExceeded:
+            print(f"⏱️ Deadline reached while searching for: '{query}'")
+            raise
         except Exception as e:
             print(f"❌ Error searching YouTube: {e}")
             print(traceback.format_exc())
@@ -90,4 +148,9 @@ class YouTubeService:
             url = YouTubeService.search_video(query)
             results[query] = url
         
-        return results
\ No newline at end of file
+        return results
+    
+    @staticmethod
+    def warm_up():
+        """Import yt-dlp ahead of the first search"""
+        import yt_dlp  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Callable, Optional
+
+from deadline import DeadlineExceeded
+
+# Worker processes for yt-dlp searches and downloads; 0 runs them in the API
+# process (on its threads, sharing the GIL with request handling)
+YTDLP_PROCESSES = int(os.getenv("YTDLP_PROCESSES", "0"))
+
+# Tasks a worker runs before it is replaced, to bound yt-dlp's memory growth
+# (Python 3.11+; 0 keeps workers for good)
+YTDLP_TASKS_PER_PROCESS = int(os.getenv("YTDLP_TASKS_PER_PROCESS", "200"))
+
+
+def _warm_worker():
+    """Load yt-dlp and the YouTube extractors once per worker, before its first task"""
+    from yt_dlp.extractor import get_info_extractor
+    get_info_extractor("Youtube")
+    get_info_extractor("YoutubeSearch")
+
+
+def _call(fn: Callable[..., Any], args: tuple) -> Any:
+    """
+    Run one task in a worker. Errors come back as RuntimeErrors carrying the
+    message (yt-dlp's own exception types don't all survive pickling), which
+    is all callers look at, e.g. to spot throttling.
+    """
+    try:
+        return fn(*args)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
+
+
+class YtDlpPool:
+    """
+    Pool of long-lived processes that run yt-dlp, so extraction (JSON
+    parsing, signature deciphering) uses every core instead of competing
+    with request handling for the API process's GIL.
+
+    Workers are spawned once and keep yt-dlp loaded between tasks. Tasks are
+    plain module-level functions that return small dicts, never yt-dlp's
+    full info dict, to keep the pickled IPC cheap. If a worker dies, the
+    pool is rebuilt and the task retried once. Callers keep rate limiting,
+    deadlines and locking in the API process.
+    """
+
+    def __init__(self, processes: Optional[int] = None, tasks_per_process: Optional[int] = None):
+        self.processes = YTDLP_PROCESSES if processes is None else processes
+        self.tasks_per_process = YTDLP_TASKS_PER_PROCESS if tasks_per_process is None else tasks_per_process
+        self._executor = None
+        self._lock = threading.Lock()
+        self.tasks = 0
+        self.recycled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                options = {}
+                if self.tasks_per_process and sys.version_info >= (3, 11):
+                    options["max_tasks_per_child"] = self.tasks_per_process
+                # spawn: forking a threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=get_context("spawn"),
+                    initializer=_warm_worker,
+                    **options
+                )
+            return self._executor
+
+    def _recycle(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.recycled += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run fn(*args) in a worker and wait for its result (or just call it,
+        if the pool is disabled). fn must be a module-level function and its
+        arguments and result picklable.
+        """
+        if not self.enabled:
+            return fn(*args)
+
+        for attempt in range(2):
+            executor = self._pool()
+            try:
+                future = executor.submit(_call, fn, args)
+                with self._lock:
+                    self.tasks += 1
+                return future.result()
+            except BrokenProcessPool:
+                print("   ♻️ A yt-dlp worker died; restarting the pool")
+                self._recycle(executor)
+                if attempt:
+                    raise RuntimeError("yt-dlp worker crashed")
+
+    def warm_up(self):
+        """Start the workers now instead of on the first search"""
+        if self.enabled:
+            # Each worker warms itself when it starts; a no-op task starts them
+            futures = [self._pool().submit(len, ()) for _ in range(self.processes)]
+            for future in futures:
+                future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "tasks": self.tasks,
+                "recycled": self.recycled,
+            }
+
+
+# One pool per API process, shared by search and download
+ytdlp_pool = YtDlpPool()
@@ -1,10 +1,35 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import requests
+import json
+import uuid
+from requests.adapters import HTTPAdapter
 from pathlib import Path
+from urllib.parse import quote
 
 # API Configuration
 API_BASE_URL = "http://localhost:8000"
 
+# (connect, read) timeouts in seconds for each backend stage
+EXTRACT_TIMEOUT = (5, 60)
+# For the streaming feed the read timeout is the longest gap between two events
+STREAM_TIMEOUT = (5, 300)
+
+# Time budgets (seconds) the backend gets for each stage; when one runs out it
+# stops working and returns what it has. Extraction must finish before our
+# own read timeout gives up on it.
+EXTRACT_DEADLINE = EXTRACT_TIMEOUT[1] - 5
+PROCESS_DEADLINE = 600
+
+# How long stage results stay cached across reruns (seconds)
+RESULT_CACHE_TTL = 3600
+
+# Loader text per intent: (searching, downloading)
+LOADER_TEXT = {
+    "list": ("Finding Songs on YouTube...", "Preparing Downloads..."),
+    "download": ("Scanning Global Audio Databases...", "Converting High-Fidelity Audio..."),
+}
+
 # Page configuration
 st.set_page_config(
     page_title="GetThatSong",
@@ -407,6 +432,311 @@ def render_loader(text):
     </div>
     """
 
+
+# --- BACKEND CLIENT ---
+@st.cache_resource
+def get_api_session():
+    """One pooled HTTP session shared by every rerun and every browser tab"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def api_post(path, payload, timeout):
+    """POST to the backend through the pooled session, raising on non-200 replies"""
+    response = get_api_session().post(f"{API_BASE_URL}{path}", json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+# Stage results are cached by their inputs, so reruns never hit the backend again
+@st.cache_data(show_spinner=False, ttl=RESULT_CACHE_TTL)
+def extract_songs(query):
+    return api_post("/api/extract-songs", {"query": query, "timeout": EXTRACT_DEADLINE}, EXTRACT_TIMEOUT)
+
+
+def stream_songs(songs, lazy=False):
+    """
+    Yield per-song progress events from the backend's NDJSON feed as each song
+    is resolved on YouTube and then downloaded (with lazy=True, only the first
+    few are downloaded; the rest are fetched when played)
+    """
+    with get_api_session().post(
+        f"{API_BASE_URL}/api/process-songs/stream",
+        json={"songs": songs, "timeout": PROCESS_DEADLINE, "lazy": lazy},
+        # Lets the backend share its workers fairly between browser sessions
+        headers={"X-Client-Id": st.session_state.client_id},
+        stream=True,
+        timeout=STREAM_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def run_query(query, loader):
+    """
+    Run extract -> search -> download for a query, rendering each song's card
+    as soon as it changes, and return the outcome to keep in session state
+    """
+    # 1. Extraction with Intent Detection
+    loader.markdown(render_loader("Analyzing Intent & Extracting Songs..."), unsafe_allow_html=True)
+    try:
+        data = extract_songs(query)
+    except requests.HTTPError as e:
+        loader.empty()
+        st.error(f"Error: {e.response.text}")
+        st.stop()
+
+    songs = data.get('songs', [])
+    intent = data.get('intent', 'list')
+
+    if not songs:
+        loader.empty()
+        st.warning("No songs found. Try being more specific!")
+        st.stop()
+
+    search_text, download_text = LOADER_TEXT.get(intent, LOADER_TEXT["download"])
+    loader.empty()
+
+    # 2. Searching + Downloading, one card per song updated as its events arrive
+    prefix = render_heading(intent, len(songs))
+    results = [dict(song, download_status="pending") for song in songs]
+    slots = [st.empty() for _ in results]
+    for idx, song in enumerate(results):
+        render_card(slots[idx], song, f"{prefix}_{idx}", search_text)
+
+    # Cards already playing the download as it arrives; re-rendering them on
+    # completion would reload the player and cut playback off
+    following = set()
+    try:
+        # Browsing a list downloads only what's likely to be played first
+        for event in stream_songs(songs, lazy=(intent == "list")):
+            if event.get('event') in ('resolved', 'completed'):
+                idx = event['index']
+                results[idx] = dict(event['song'], stream_file=event.get('stream_file'))
+                if idx in following and results[idx].get('download_status') == 'completed':
+                    continue
+                if results[idx]['stream_file']:
+                    following.add(idx)
+                render_card(slots[idx], results[idx], f"{prefix}_{idx}", download_text)
+    except requests.HTTPError:
+        st.error("Download failed.")
+        st.stop()
+
+    if not any(song.get('youtube_url') for song in results):
+        st.warning("No songs found on YouTube." if intent == "list" else "No valid sources found.")
+
+    return {
+        "intent": intent,
+        "songs": results,
+        "suggestion": data.get('suggestion'),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def build_player_card(title, artist, fname, audio_id, follow=False):
+    """
+    Player card HTML for a downloaded song (cached, so reruns reuse the markup).
+    With follow=True, fname is a song not downloaded yet: pressing play or
+    download fetches it through the backend's proxy mode (nothing is
+    requested before that).
+    """
+    stream_link = f"{API_BASE_URL}/api/stream-file/{fname}"
+    dl_link = f"{API_BASE_URL}/api/download-file/{fname}"
+    preload = "metadata"
+    if follow:
+        stream_link = f"{API_BASE_URL}/api/stream-file/{quote(fname)}?proxy=true"
+        dl_link = f"{API_BASE_URL}/api/download-file/{quote(fname)}?proxy=true"
+        preload = "none"
+    dl_button = f"""
+            <a href="{dl_link}" download="{fname}" style="background: linear-gradient(90deg, #06b6d4, #3b82f6); color: white; text-decoration: none; padding: 10px 25px; border-radius: 30px; font-size: 14px; font-weight: 600; display: flex; align-items: center; gap: 8px; box-shadow: 0 0 15px rgba(6, 182, 212, 0.4);">
+                ⬇ Download MP3
+            </a>"""
+
+    return f"""
+    <div class="result-card" style="background: rgba(20, 20, 25, 0.6); border: 1px solid rgba(255, 255, 255, 0.1); border-left: 4px solid #06b6d4; border-radius: 12px; padding: 20px 25px; margin-bottom: 15px; display: flex; align-items: center; justify-content: space-between; backdrop-filter: blur(10px);">
+        <div style="flex: 1;">
+            <div style="color: #ffffff; font-size: 18px; font-weight: 700; margin-bottom: 4px;">{title}</div>
+            <div style="color: #94a3b8; font-size: 14px; font-weight: 400;">{artist}</div>
+            
+            <div style="background: rgba(30, 30, 35, 0.8); border-radius: 12px; padding: 15px; margin-top: 10px;">
+                <audio id="{audio_id}" preload="{preload}" style="display: none;">
+                    <source src="{stream_link}" type="audio/mp4">
+                    <source src="{stream_link}" type="audio/mpeg">
+                </audio>
+                
+                <div style="display: flex; align-items: center; gap: 15px;">
+                    <button id="btn_{audio_id}" style="width: 45px; height: 45px; background: linear-gradient(135deg, #06b6d4, #0891b2); border: none; border-radius: 50%; cursor: pointer; display: flex; align-items: center; justify-content: center; box-shadow: 0 4px 15px rgba(6, 182, 212, 0.4);" onclick="togglePlay_{audio_id}()">
+                        <div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>
+                    </button>
+                    
+                    <div style="flex: 1; display: flex; align-items: center; gap: 10px;">
+                        <span id="current_{audio_id}" style="color: #94a3b8; font-size: 12px; min-width: 45px;">0:00</span>
+                        <div id="progressBar_{audio_id}" style="flex: 1; height: 6px; background: rgba(148, 163, 184, 0.3); border-radius: 3px; cursor: pointer; position: relative;" onclick="seek_{audio_id}(event)">
+                            <div id="progress_{audio_id}" style="height: 100%; background: linear-gradient(90deg, #06b6d4, #3b82f6); border-radius: 3px; width: 0%; position: relative;">
+                                <div style="position: absolute; right: -6px; top: 50%; transform: translateY(-50%); width: 12px; height: 12px; background: white; border-radius: 50%; box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);"></div>
+                            </div>
+                        </div>
+                        <span id="duration_{audio_id}" style="color: #94a3b8; font-size: 12px; min-width: 45px;">0:00</span>
+                    </div>
+                    
+                    <span style="color: #94a3b8; cursor: pointer; font-size: 18px;" onclick="toggleMute_{audio_id}()">🔊</span>
+                </div>
+            </div>
+        </div>
+        <div style="display: flex; gap: 10px; align-items: center; margin-left: 20px;">{dl_button}
+        </div>
+    </div>
+    
+    <script>
+    (function() {{
+        const audio = document.getElementById('{audio_id}');
+        const btn = document.getElementById('btn_{audio_id}');
+        const progressBar = document.getElementById('progress_{audio_id}');
+        const currentTime = document.getElementById('current_{audio_id}');
+        const duration = document.getElementById('duration_{audio_id}');
+        
+        function formatTime(seconds) {{
+            const mins = Math.floor(seconds / 60);
+            const secs = Math.floor(seconds % 60);
+            return mins + ':' + (secs < 10 ? '0' : '') + secs;
+        }}
+        
+        window.togglePlay_{audio_id} = function() {{
+            // Pause all other audios
+            document.querySelectorAll('audio').forEach(a => {{
+                if (a.id !== '{audio_id}' && !a.paused) {{
+                    a.pause();
+                    const otherBtn = document.getElementById('btn_' + a.id);
+                    if (otherBtn) {{
+                        otherBtn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
+                    }}
+                }}
+            }});
+            
+            if (audio.paused) {{
+                audio.play();
+                btn.innerHTML = '<div style="display: flex; gap: 4px;"><div style="width: 4px; height: 16px; background: white; border-radius: 2px;"></div><div style="width: 4px; height: 16px; background: white; border-radius: 2px;"></div></div>';
+            }} else {{
+                audio.pause();
+                btn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
+            }}
+        }};
+        
+        window.seek_{audio_id} = function(e) {{
+            const bar = document.getElementById('progressBar_{audio_id}');
+            const rect = bar.getBoundingClientRect();
+            const pos = (e.clientX - rect.left) / rect.width;
+            audio.currentTime = pos * audio.duration;
+        }};
+        
+        window.toggleMute_{audio_id} = function() {{
+            audio.muted = !audio.muted;
+        }};
+        
+        audio.addEventListener('loadedmetadata', function() {{
+            duration.textContent = formatTime(audio.duration);
+        }});
+        
+        audio.addEventListener('timeupdate', function() {{
+            const progress = (audio.currentTime / audio.duration) * 100;
+            progressBar.style.width = progress + '%';
+            currentTime.textContent = formatTime(audio.currentTime);
+        }});
+        
+        audio.addEventListener('ended', function() {{
+            btn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
+        }});
+    }})();
+    </script>
+    """
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def build_failed_card(title, subtitle):
+    return f"""
+    <div class="result-card" style="border-left-color: #ef4444;">
+        <div>
+            <div class="song-title" style="color: #ef4444;">{title}</div>
+            <div class="song-artist">{subtitle}</div>
+        </div>
+        <div style="color: #64748b; font-size: 14px;">Download Failed</div>
+    </div>
+    """
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def build_pending_card(title, artist, status_text):
+    return f"""
+    <div class="result-card" style="border-left-color: #64748b;">
+        <div>
+            <div class="song-title">{title}</div>
+            <div class="song-artist">{artist}</div>
+        </div>
+        <div style="color: #64748b; font-size: 14px;">{status_text}</div>
+    </div>
+    """
+
+
+def render_heading(intent, count):
+    """Render the results heading and return the audio id prefix for this intent"""
+    st.markdown("<br>", unsafe_allow_html=True)
+    if intent == "list":
+        st.markdown(f"### 🎵 Found {count} Songs")
+        st.markdown("<br>", unsafe_allow_html=True)
+        return "audio"
+
+    st.markdown("### ☁️ Ready for Export")
+    return "audio_dl"
+
+
+def render_card(slot, song, audio_id, status_text=""):
+    """
+    Render (or replace) one song's card inside its placeholder. A song that
+    isn't downloaded yet renders as a player on its stream_file, if it has one.
+    """
+    status = song.get('download_status')
+    stream_file = song.get('stream_file')
+    if stream_file and status in ('pending', 'ready'):
+        with slot.container():
+            components.html(
+                build_player_card(song['title'], song['artist'], stream_file, audio_id, follow=True),
+                height=180
+            )
+    elif status == 'completed':
+        fname = Path(song['file_path']).name
+        with slot.container():
+            components.html(build_player_card(song['title'], song['artist'], fname, audio_id), height=180)
+    elif status in ('pending', 'ready'):
+        slot.markdown(build_pending_card(song['title'], song['artist'], status_text), unsafe_allow_html=True)
+    else:
+        slot.markdown(build_failed_card(song['title'], song['artist']), unsafe_allow_html=True)
+
+
+def render_results(outcome):
+    """Render the cards for a stored query outcome"""
+    prefix = render_heading(outcome["intent"], len(outcome["songs"]))
+    for idx, song in enumerate(outcome["songs"]):
+        render_card(st.empty(), song, f"{prefix}_{idx}")
+
+
+# --- SESSION STATE ---
+# Outcomes keyed by normalized query; reruns (play clicks, widget changes) render from here
+if 'results' not in st.session_state:
+    st.session_state.results = {}
+if 'active_query' not in st.session_state:
+    st.session_state.active_query = None
+if 'client_id' not in st.session_state:
+    st.session_state.client_id = uuid.uuid4().hex
+
 # --- HEADER ---
 col_spacer, col_main, col_spacer2 = st.columns([1, 6, 1])
 with col_main:
@@ -428,334 +758,23 @@ with col_main:
             submit = st.form_submit_button("Generate ✨", type="primary")
 
     # --- LOGIC ---
+    rendered = False
     if submit and query:
-        loader = st.empty()
-        final_area = st.container()
+        query_key = normalize_query(query)
+        st.session_state.active_query = query_key
 
-        try:
-            # 1. Extraction with Intent Detection
-            loader.markdown(render_loader("Analyzing Intent & Extracting Songs..."), unsafe_allow_html=True)
-            
-            extract_res = requests.post(f"{API_BASE_URL}/api/extract-songs", json={"query": query})
-            if extract_res.status_code != 200:
-                loader.empty()
-                st.error(f"Error: {extract_res.text}")
-                st.stop()
-            
-            data = extract_res.json()
-            songs = data.get('songs', [])
-            intent = data.get('intent', 'list')
-            suggestion = data.get('suggestion')
-            
-            if not songs:
+        if query_key not in st.session_state.results:
+            loader = st.empty()
+            rendered = True
+            try:
+                st.session_state.results[query_key] = run_query(query, loader)
+            except Exception as e:
                 loader.empty()
-                st.warning("No songs found. Try being more specific!")
-                st.stop()
-            
-            # --- LIST MODE: Show songs with individual download options ---
-            if intent == "list":
-                # Search YouTube for all songs first
-                loader.markdown(render_loader("Finding Songs on YouTube..."), unsafe_allow_html=True)
-                search_res = requests.post(f"{API_BASE_URL}/api/search-youtube", json=songs)
-                
-                if search_res.status_code != 200:
-                    loader.empty()
-                    st.error("Failed to search YouTube")
-                    st.stop()
-                
-                songs_with_links = search_res.json().get('songs', [])
-                
-                # Download all songs automatically
-                loader.markdown(render_loader("Preparing Downloads..."), unsafe_allow_html=True)
-                valid_songs = [s for s in songs_with_links if s.get('youtube_url')]
-                
-                if valid_songs:
-                    dl_res = requests.post(
-                        f"{API_BASE_URL}/api/download-songs",
-                        json={"songs": valid_songs}
-                    )
-                    
-                    if dl_res.status_code == 200:
-                        results = dl_res.json().get('songs', [])
-                        loader.empty()
-                        
-                        with final_area:
-                            st.markdown("<br>", unsafe_allow_html=True)
-                            st.markdown(f"### 🎵 Found {len(results)} Songs")
-                            st.markdown("<br>", unsafe_allow_html=True)
-                            
-                            # Display each song with download link
-                            for idx, song in enumerate(results):
-                                if song['download_status'] == 'completed':
-                                    fname = Path(song['file_path']).name
-                                    stream_link = f"{API_BASE_URL}/api/stream-file/{fname}"
-                                    dl_link = f"{API_BASE_URL}/api/download-file/{fname}"
-                                    audio_id = f"audio_{idx}"
-                                    
-                                    # Use components.html for proper rendering
-                                    import streamlit.components.v1 as components
-                                    
-                                    html_content = f"""
-                                    <div class="result-card" style="background: rgba(20, 20, 25, 0.6); border: 1px solid rgba(255, 255, 255, 0.1); border-left: 4px solid #06b6d4; border-radius: 12px; padding: 20px 25px; margin-bottom: 15px; display: flex; align-items: center; justify-content: space-between; backdrop-filter: blur(10px);">
-                                        <div style="flex: 1;">
-                                            <div style="color: #ffffff; font-size: 18px; font-weight: 700; margin-bottom: 4px;">{song['title']}</div>
-                                            <div style="color: #94a3b8; font-size: 14px; font-weight: 400;">{song['artist']}</div>
-                                            
-                                            <div style="background: rgba(30, 30, 35, 0.8); border-radius: 12px; padding: 15px; margin-top: 10px;">
-                                                <audio id="{audio_id}" preload="metadata" style="display: none;">
-                                                    <source src="{stream_link}" type="audio/mp4">
-                                                    <source src="{stream_link}" type="audio/mpeg">
-                                                </audio>
-                                                
-                                                <div style="display: flex; align-items: center; gap: 15px;">
-                                                    <button id="btn_{audio_id}" style="width: 45px; height: 45px; background: linear-gradient(135deg, #06b6d4, #0891b2); border: none; border-radius: 50%; cursor: pointer; display: flex; align-items: center; justify-content: center; box-shadow: 0 4px 15px rgba(6, 182, 212, 0.4);" onclick="togglePlay_{audio_id}()">
-                                                        <div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>
-                                                    </button>
-                                                    
-                                                    <div style="flex: 1; display: flex; align-items: center; gap: 10px;">
-                                                        <span id="current_{audio_id}" style="color: #94a3b8; font-size: 12px; min-width: 45px;">0:00</span>
-                                                        <div id="progressBar_{audio_id}" style="flex: 1; height: 6px; background: rgba(148, 163, 184, 0.3); border-radius: 3px; cursor: pointer; position: relative;" onclick="seek_{audio_id}(event)">
-                                                            <div id="progress_{audio_id}" style="height: 100%; background: linear-gradient(90deg, #06b6d4, #3b82f6); border-radius: 3px; width: 0%; position: relative;">
-                                                                <div style="position: absolute; right: -6px; top: 50%; transform: translateY(-50%); width: 12px; height: 12px; background: white; border-radius: 50%; box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);"></div>
-                                                            </div>
-                                                        </div>
-                                                        <span id="duration_{audio_id}" style="color: #94a3b8; font-size: 12px; min-width: 45px;">0:00</span>
-                                                    </div>
-                                                    
-                                                    <span style="color: #94a3b8; cursor: pointer; font-size: 18px;" onclick="toggleMute_{audio_id}()">🔊</span>
-                                                </div>
-                                            </div>
-                                        </div>
-                                        <div style="display: flex; gap: 10px; align-items: center; margin-left: 20px;">
-                                            <a href="{dl_link}" download="{fname}" style="background: linear-gradient(90deg, #06b6d4, #3b82f6); color: white; text-decoration: none; padding: 10px 25px; border-radius: 30px; font-size: 14px; font-weight: 600; display: flex; align-items: center; gap: 8px; box-shadow: 0 0 15px rgba(6, 182, 212, 0.4);">
-                                                ⬇ Download MP3
-                                            </a>
-                                        </div>
-                                    </div>
-                                    
-                                    <script>
-                                    (function() {{
-                                        const audio = document.getElementById('{audio_id}');
-                                        const btn = document.getElementById('btn_{audio_id}');
-                                        const progressBar = document.getElementById('progress_{audio_id}');
-                                        const currentTime = document.getElementById('current_{audio_id}');
-                                        const duration = document.getElementById('duration_{audio_id}');
-                                        
-                                        function formatTime(seconds) {{
-                                            const mins = Math.floor(seconds / 60);
-                                            const secs = Math.floor(seconds % 60);
-                                            return mins + ':' + (secs < 10 ? '0' : '') + secs;
-                                        }}
-                                        
-                                        window.togglePlay_{audio_id} = function() {{
-                                            // Pause all other audios
-                                            document.querySelectorAll('audio').forEach(a => {{
-                                                if (a.id !== '{audio_id}' && !a.paused) {{
-                                                    a.pause();
-                                                    const otherBtn = document.getElementById('btn_' + a.id);
-                                                    if (otherBtn) {{
-                                                        otherBtn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
-                                                    }}
-                                                }}
-                                            }});
-                                            
-                                            if (audio.paused) {{
-                                                audio.play();
-                                                btn.innerHTML = '<div style="display: flex; gap: 4px;"><div style="width: 4px; height: 16px; background: white; border-radius: 2px;"></div><div style="width: 4px; height: 16px; background: white; border-radius: 2px;"></div></div>';
-                                            }} else {{
-                                                audio.pause();
-                                                btn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
-                                            }}
-                                        }};
-                                        
-                                        window.seek_{audio_id} = function(e) {{
-                                            const bar = document.getElementById('progressBar_{audio_id}');
-                                            const rect = bar.getBoundingClientRect();
-                                            const pos = (e.clientX - rect.left) / rect.width;
-                                            audio.currentTime = pos * audio.duration;
-                                        }};
-                                        
-                                        window.toggleMute_{audio_id} = function() {{
-                                            audio.muted = !audio.muted;
-                                        }};
-                                        
-                                        audio.addEventListener('loadedmetadata', function() {{
-                                            duration.textContent = formatTime(audio.duration);
-                                        }});
-                                        
-                                        audio.addEventListener('timeupdate', function() {{
-                                            const progress = (audio.currentTime / audio.duration) * 100;
-                                            progressBar.style.width = progress + '%';
-                                            currentTime.textContent = formatTime(audio.currentTime);
-                                        }});
-                                        
-                                        audio.addEventListener('ended', function() {{
-                                            btn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
-                                        }});
-                                    }})();
-                                    </script>
-                                    """
-                                    
-                                    components.html(html_content, height=180)
-                                else:
-                                    st.markdown(f"""
-                                    <div class="result-card" style="border-left-color: #ef4444;">
-                                        <div>
-                                            <div class="song-title" style="color: #ef4444;">{song['title']}</div>
-                                            <div class="song-artist">{song['artist']}</div>
-                                        </div>
-                                        <div style="color: #64748b; font-size: 14px;">Download Failed</div>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                    else:
-                        loader.empty()
-                        st.error("Download failed.")
-                else:
-                    loader.empty()
-                    st.warning("No songs found on YouTube.")
-            
-            # --- DOWNLOAD MODE: Process and download all ---
-            else:  # intent == "download"
-                # 2. Searching
-                loader.markdown(render_loader("Scanning Global Audio Databases..."), unsafe_allow_html=True)
-                search_res = requests.post(f"{API_BASE_URL}/api/search-youtube", json=songs)
-                
-                if search_res.status_code == 200:
-                    songs_with_links = search_res.json().get('songs', [])
-                    valid_songs = [s for s in songs_with_links if s.get('youtube_url')]
-                else:
-                    loader.empty()
-                    st.error("Search failed.")
-                    st.stop()
-
-                # 3. Downloading
-                if valid_songs:
-                    loader.markdown(render_loader("Converting High-Fidelity Audio..."), unsafe_allow_html=True)
-                    dl_res = requests.post(f"{API_BASE_URL}/api/download-songs", json={"songs": valid_songs})
-                    
-                    if dl_res.status_code == 200:
-                        results = dl_res.json().get('songs', [])
-                        loader.empty() 
-                        
-                        with final_area:
-                            st.markdown("<br>", unsafe_allow_html=True)
-                            st.markdown("### ☁️ Ready for Export")
-                            
-                            for idx, song in enumerate(results):
-                                if song['download_status'] == 'completed':
-                                    fname = Path(song['file_path']).name
-                                    stream_link = f"{API_BASE_URL}/api/stream-file/{fname}"
-                                    dl_link = f"{API_BASE_URL}/api/download-file/{fname}"
-                                    audio_id = f"audio_dl_{idx}"
-                                    
-                                    import streamlit.components.v1 as components
-                                    
-                                    html_content = f"""
-                                    <div style="background: rgba(20, 20, 25, 0.6); border: 1px solid rgba(255, 255, 255, 0.1); border-left: 4px solid #06b6d4; border-radius: 12px; padding: 20px 25px; margin-bottom: 15px; display: flex; align-items: center; justify-content: space-between;">
-                                        <div style="flex: 1;">
-                                            <div style="color: #ffffff; font-size: 18px; font-weight: 700; margin-bottom: 4px;">{song['title']}</div>
-                                            <div style="color: #94a3b8; font-size: 14px;">{song['artist']}</div>
-                                            
-                                            <div style="background: rgba(30, 30, 35, 0.8); border-radius: 12px; padding: 15px; margin-top: 10px;">
-                                                <audio id="{audio_id}" preload="metadata" style="display: none;">
-                                                    <source src="{stream_link}" type="audio/mp4">
-                                                    <source src="{stream_link}" type="audio/mpeg">
-                                                </audio>
-                                                
-                                                <div style="display: flex; align-items: center; gap: 15px;">
-                                                    <button id="btn_{audio_id}" style="width: 45px; height: 45px; background: linear-gradient(135deg, #06b6d4, #0891b2); border: none; border-radius: 50%; cursor: pointer; display: flex; align-items: center; justify-content: center; box-shadow: 0 4px 15px rgba(6, 182, 212, 0.4);" onclick="togglePlay_{audio_id}()">
-                                                        <div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>
-                                                    </button>
-                                                    
-                                                    <div style="flex: 1; display: flex; align-items: center; gap: 10px;">
-                                                        <span id="current_{audio_id}" style="color: #94a3b8; font-size: 12px; min-width: 45px;">0:00</span>
-                                                        <div id="progressBar_{audio_id}" style="flex: 1; height: 6px; background: rgba(148, 163, 184, 0.3); border-radius: 3px; cursor: pointer; position: relative;" onclick="seek_{audio_id}(event)">
-                                                            <div id="progress_{audio_id}" style="height: 100%; background: linear-gradient(90deg, #06b6d4, #3b82f6); border-radius: 3px; width: 0%; position: relative;">
-                                                                <div style="position: absolute; right: -6px; top: 50%; transform: translateY(-50%); width: 12px; height: 12px; background: white; border-radius: 50%; box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);"></div>
-                                                            </div>
-                                                        </div>
-                                                        <span id="duration_{audio_id}" style="color: #94a3b8; font-size: 12px; min-width: 45px;">0:00</span>
-                                                    </div>
-                                                    
-                                                    <span style="color: #94a3b8; cursor: pointer; font-size: 18px;" onclick="toggleMute_{audio_id}()">🔊</span>
-                                                </div>
-                                            </div>
-                                        </div>
-                                        <a href="{dl_link}" download="{fname}" style="background: linear-gradient(90deg, #06b6d4, #3b82f6); color: white; text-decoration: none; padding: 10px 25px; border-radius: 30px; font-size: 14px; font-weight: 600; margin-left: 20px; box-shadow: 0 0 15px rgba(6, 182, 212, 0.4);">
-                                            ⬇ Download MP3
-                                        </a>
-                                    </div>
-                                    
-                                    <script>
-                                    (function() {{
-                                        const audio = document.getElementById('{audio_id}');
-                                        const btn = document.getElementById('btn_{audio_id}');
-                                        const progressBar = document.getElementById('progress_{audio_id}');
-                                        const currentTime = document.getElementById('current_{audio_id}');
-                                        const duration = document.getElementById('duration_{audio_id}');
-                                        
-                                        function formatTime(seconds) {{
-                                            const mins = Math.floor(seconds / 60);
-                                            const secs = Math.floor(seconds % 60);
-                                            return mins + ':' + (secs < 10 ? '0' : '') + secs;
-                                        }}
-                                        
-                                        window.togglePlay_{audio_id} = function() {{
-                                            document.querySelectorAll('audio').forEach(a => {{
-                                                if (a.id !== '{audio_id}' && !a.paused) {{
-                                                    a.pause();
-                                                    const otherBtn = document.getElementById('btn_' + a.id);
-                                                    if (otherBtn) otherBtn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
-                                                }}
-                                            }});
-                                            
-                                            if (audio.paused) {{
-                                                audio.play();
-                                                btn.innerHTML = '<div style="display: flex; gap: 4px;"><div style="width: 4px; height: 16px; background: white; border-radius: 2px;"></div><div style="width: 4px; height: 16px; background: white; border-radius: 2px;"></div></div>';
-                                            }} else {{
-                                                audio.pause();
-                                                btn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>';
-                                            }}
-                                        }};
-                                        
-                                        window.seek_{audio_id} = function(e) {{
-                                            const bar = document.getElementById('progressBar_{audio_id}');
-                                            const rect = bar.getBoundingClientRect();
-                                            audio.currentTime = ((e.clientX - rect.left) / rect.width) * audio.duration;
-                                        }};
-                                        
-                                        window.toggleMute_{audio_id} = function() {{ audio.muted = !audio.muted; }};
-                                        
-                                        audio.addEventListener('loadedmetadata', () => duration.textContent = formatTime(audio.duration));
-                                        audio.addEventListener('timeupdate', () => {{
-                                            progressBar.style.width = (audio.currentTime / audio.duration * 100) + '%';
-                                            currentTime.textContent = formatTime(audio.currentTime);
-                                        }});
-                                        audio.addEventListener('ended', () => btn.innerHTML = '<div style="width: 0; height: 0; border-left: 12px solid white; border-top: 8px solid transparent; border-bottom: 8px solid transparent; margin-left: 3px;"></div>');
-                                    }})();
-                                    </script>
-                                    """
-                                    
-                                    components.html(html_content, height=180)
-                                else:
-                                    st.markdown(f"""
-                                    <div class="result-card" style="border-left-color: #ef4444;">
-                                        <div>
-                                            <div class="song-title" style="color: #ef4444;">{song['title']}</div>
-                                            <div class="song-artist">Download Failed</div>
-                                        </div>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                    else:
-                        loader.empty()
-                        st.error("Download failed.")
-                else:
-                    loader.empty()
-                    st.warning("No valid sources found.")
-
-        except Exception as e:
-            loader.empty()
-            st.error(f"System Error: {str(e)}")
+                st.error(f"System Error: {str(e)}")
+
+    outcome = st.session_state.results.get(st.session_state.active_query)
+    if outcome and not rendered:
+        render_results(outcome)
 
 # --- FOOTER ---
 st.markdown("<div style='text-align: center; margin-top: 50px; color: #334155; font-size: 12px;'>SYSTEM v2.1 • INTELLIGENT MUSIC DISCOVERY</div>", unsafe_allow_html=True)
@@ -0,0 +1,171 @@
+import json
+from pathlib import Path
+
+import pytest
+import requests
+
+testing = pytest.importorskip("streamlit.testing.v1")
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+SONGS = [{"title": "Baby", "artist": "Justin Bieber"}, {"title": "Sorry", "artist": "Justin Bieber"}]
+
+
+class FakeResponse:
+    def __init__(self, body=None, lines=()):
+        self.body = body
+        self.lines = [json.dumps(line).encode() for line in lines]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+    def iter_lines(self):
+        yield from self.lines
+
+
+class FakeBackend:
+    """Stands in for the API behind requests.Session.post"""
+
+    def __init__(self, intent="list"):
+        self.intent = intent
+        self.calls = []
+        self.sessions = set()
+
+    def post(self, session, url, json=None, timeout=None, headers=None, stream=False):
+        self.calls.append({"path": url.split("8000", 1)[1], "json": json, "headers": headers or {}})
+        self.sessions.add(id(session))
+        if url.endswith("/api/extract-songs"):
+            return FakeResponse({"songs": SONGS, "intent": self.intent, "message": "", "suggestion": None})
+        return FakeResponse(lines=self.feed)
+
+    @property
+    def feed(self):
+        done = dict(SONGS[0], youtube_url="https://youtu.be/baby", download_status="completed",
+                    file_path="downloads/Justin Bieber - Baby.m4a")
+        ready = dict(SONGS[1], youtube_url="https://youtu.be/sorry", download_status="ready")
+        return [
+            {"event": "started", "job_id": "job"},
+            {"event": "resolved", "index": 1, "song": ready, "stream_file": "Justin Bieber - Sorry"},
+            {"event": "resolved", "index": 0, "song": dict(done, download_status="ready"), "stream_file": "Justin Bieber - Baby"},
+            {"event": "completed", "index": 0, "song": done},
+            {"event": "done", "success_count": 1, "failed_count": 0, "timed_out_count": 0, "deferred_count": 1},
+        ]
+
+    def paths(self):
+        return [call["path"] for call in self.calls]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    import streamlit as st
+
+    # Cached results and the pooled session outlive a single app run
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    fake = FakeBackend()
+    monkeypatch.setattr(requests.Session, "post", lambda session, url, **kwargs: fake.post(session, url, **kwargs))
+    return fake
+
+
+def _search(app, query):
+    app.text_area[0].input(query)
+    app.button[0].click()
+    return app.run()
+
+
+def test_reruns_render_from_session_state_without_backend_calls(backend):
+    app = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(app, "Justin Bieber songs")
+    assert backend.paths() == ["/api/extract-songs", "/api/process-songs/stream"]
+
+    # A play click or widget change reruns the whole script
+    app.run()
+    assert len(backend.calls) == 2
+    assert list(app.session_state.results) == ["justin bieber songs"]
+
+
+def test_respelled_query_is_not_fetched_again(backend):
+    app = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(app, "Justin Bieber songs")
+    _search(app, "  justin   BIEBER songs ")
+    assert len(backend.calls) == 2
+
+
+def test_tabs_share_cached_extraction_and_one_pooled_session(backend):
+    first = testing.AppTest.from_file(APP, default_timeout=30).run()
+    second = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(first, "Justin Bieber songs")
+    _search(second, "Justin Bieber songs")
+
+    # Progress is per tab; the extraction result is shared
+    assert backend.paths() == ["/api/extract-songs", "/api/process-songs/stream", "/api/process-songs/stream"]
+    assert len(backend.sessions) == 1
+
+
+def _players(app):
+    return [frame.proto.srcdoc for frame in app.get("iframe")]
+
+
+def test_list_feed_is_lazy_and_tagged_with_the_tab(backend):
+    app = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(app, "Justin Bieber songs")
+
+    stream = backend.calls[1]
+    assert stream["json"]["lazy"] is True
+    assert stream["json"]["songs"] == SONGS
+    assert stream["headers"]["X-Client-Id"] == app.session_state.client_id
+
+
+def test_download_feed_fetches_everything(backend):
+    backend.intent = "download"
+    app = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(app, "download Baby and Sorry")
+    assert backend.calls[1]["json"]["lazy"] is False
+
+
+def test_cards_follow_the_feed(backend):
+    app = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(app, "Justin Bieber songs")
+
+    # Each card is the last event for its song
+    songs = app.session_state.results["justin bieber songs"]["songs"]
+    assert [song["download_status"] for song in songs] == ["completed", "ready"]
+    assert songs[1]["stream_file"] == "Justin Bieber - Sorry"
+
+    # Resolved songs play through proxy mode; the finished one keeps its
+    # player instead of being reloaded mid-playback
+    baby, sorry = _players(app)
+    assert "stream-file/Justin%20Bieber%20-%20Baby?proxy=true" in baby
+    assert "stream-file/Justin%20Bieber%20-%20Sorry?proxy=true" in sorry
+
+    # Later reruns render the finished song from the library
+    app.run()
+    baby, sorry = _players(app)
+    assert "stream-file/Justin Bieber - Baby.m4a" in baby
+    assert "?proxy=true" in sorry
+
+
+def test_failed_song_gets_a_failed_card(backend, monkeypatch):
+    failed = dict(SONGS[1], download_status="failed")
+    monkeypatch.setattr(FakeBackend, "feed", [
+        {"event": "started", "job_id": "job"},
+        {"event": "resolved", "index": 1, "song": failed},
+        {"event": "completed", "index": 1, "song": failed},
+        *backend.feed[2:],
+    ])
+
+    app = testing.AppTest.from_file(APP, default_timeout=30).run()
+    _search(app, "Justin Bieber songs")
+
+    failed_cards = [md.value for md in app.markdown if "Download Failed" in md.value]
+    assert len(failed_cards) == 1
+    assert "Sorry" in failed_cards[0]